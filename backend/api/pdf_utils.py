@@ -2,11 +2,12 @@
 Utility functions for PDF file handling
 """
 import os
-import glob
 import logging
 from django.conf import settings
 from django.http import FileResponse, HttpResponse, Http404
 import mimetypes
+from files import file_index
+from files.delivery import serve_file
 
 logger = logging.getLogger(__name__)
 
@@ -40,33 +41,30 @@ def find_pdf_file(project_id, file_path):
             year_path = parts[1]
             potential_paths.append(os.path.join(media_root, 'project_files', year_path))
     
-    # 3. Leta i project_files-mappen med exakt filnamn
-    for pdf_file in glob.glob(os.path.join(media_root, 'project_files', '**', file_name), recursive=True):
-        if os.path.isfile(pdf_file):
-            potential_paths.append(pdf_file)
-    
+    # 3. Slå upp filnamnet i filindexet i stället för att söka igenom
+    #    project_files/** och projects/<nr>/** med glob
+    indexed_paths = file_index.lookup_all(file_name)
+
+    # Filer i det angivna projektets mapp prioriteras
+    if project_id and '-' in project_id:
+        # Extrahera projektnummer om det finns
+        parts = project_id.split('-')
+        if parts[-1].isdigit():
+            project_folder = os.path.join(media_root, 'projects', parts[-1]) + os.sep
+            indexed_paths.sort(key=lambda path: not path.startswith(project_folder))
+
+    potential_paths.extend(indexed_paths)
+
     # 4. Leta i mappen uploads om den finns
     uploads_path = os.path.join(media_root, 'uploads', file_name)
     if os.path.isfile(uploads_path):
         potential_paths.append(uploads_path)
-    
+
     # 5. Leta i basic-pdf-manager/uploads om den finns
     basic_pdf_manager_path = os.path.join(settings.BASE_DIR.parent, 'basic-pdf-manager', 'uploads', file_name)
     if os.path.isfile(basic_pdf_manager_path):
         potential_paths.append(basic_pdf_manager_path)
-    
-    # 6. Sök i alla projektmappar
-    if project_id and '-' in project_id:
-        # Extrahera projektnummer om det finns
-        parts = project_id.split('-')
-        if parts[-1].isdigit():
-            project_num = parts[-1]
-            project_folder = os.path.join(media_root, 'projects', project_num)
-            if os.path.exists(project_folder):
-                for pdf_file in glob.glob(os.path.join(project_folder, '**', file_name), recursive=True):
-                    if os.path.isfile(pdf_file):
-                        potential_paths.append(pdf_file)
-    
+
     # Leta igenom alla möjliga sökvägar
     for path in potential_paths:
         if os.path.isfile(path):
@@ -75,7 +73,7 @@ def find_pdf_file(project_id, file_path):
     # Inget hittades
     return None
 
-def serve_pdf_file(file_path, filename=None, as_attachment=False):
+def serve_pdf_file(file_path, filename=None, as_attachment=False, request=None):
     """
     Serverar en PDF-fil med rätt Content-Type och headers
     
@@ -83,6 +81,7 @@ def serve_pdf_file(file_path, filename=None, as_attachment=False):
         file_path (str): Absolut sökväg till PDF-filen
         filename (str, optional): Filnamn att visa för användaren
         as_attachment (bool): Om filen ska laddas ner istället för att visas
+        request (HttpRequest, optional): Används för Range-förfrågningar (206 Partial Content)
         
     Returns:
         FileResponse: Django FileResponse med rätt headers
@@ -91,24 +90,18 @@ def serve_pdf_file(file_path, filename=None, as_attachment=False):
         filename = os.path.basename(file_path)
     
     try:
-        # Öppna filen
-        file_obj = open(file_path, 'rb')
-        
-        # Bestäm content-type
-        content_type = 'application/pdf'
-        
-        # Skapa response
-        response = FileResponse(file_obj, content_type=content_type)
-        
-        # Sätt headers för korrekt visning
-        disposition = 'attachment' if as_attachment else 'inline'
-        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-        response['Content-Length'] = os.path.getsize(file_path)
+        # Skapa response med stöd för Range-förfrågningar
+        response = serve_file(
+            request, file_path,
+            content_type='application/pdf',
+            filename=filename,
+            as_attachment=as_attachment
+        )
         
         # CORS headers
         response['Access-Control-Allow-Origin'] = '*'
         response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization'
+        response['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization, Range, If-Range'
         
         # Ta bort headers som kan störa visning i iframe
         for header in ['X-Frame-Options', 'Content-Security-Policy']:
@@ -119,4 +112,4 @@ def serve_pdf_file(file_path, filename=None, as_attachment=False):
         
     except Exception as e:
         logger.error(f"Failed to serve PDF file {file_path}: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,89 @@
+"""
+Project memberships for permission checks.
+
+memberships(request) returns the user's projects and roles as an in-memory
+mapping. It is loaded once per request (memoized on the request) and shared
+across requests through the Django cache. Each user has a version token in the cache; saving or deleting a
+RoleAccess row replaces the token (see core.signals), so requests after the
+change read fresh rows instead of the stale entry. Bulk updates through
+QuerySet.update() do not send signals and must call invalidate() themselves.
+"""
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY = 'core:memberships:{user}:{version}'
+VERSION_KEY = 'core:memberships_version:{user}'
+
+# Attribute on the HttpRequest holding the memberships for the current request
+REQUEST_ATTRIBUTE = '_project_memberships'
+
+
+class Memberships:
+    """A user's project ids and roles"""
+
+    def __init__(self, roles, user_id=None):
+        self.user_id = user_id
+        self.roles = dict(roles)
+        self.project_ids = frozenset(self.roles)
+
+    def __contains__(self, project_id):
+        return self.has(project_id)
+
+    def has(self, project_id):
+        """True if the user has any role in the project (accepts ids from query params)"""
+        try:
+            return int(project_id) in self.project_ids
+        except (TypeError, ValueError):
+            return False
+
+    def role(self, project_id):
+        try:
+            return self.roles.get(int(project_id))
+        except (TypeError, ValueError):
+            return None
+
+    def with_roles(self, *roles):
+        """Ids of the projects where the user has one of the given roles"""
+        return frozenset(project_id for project_id, role in self.roles.items() if role in roles)
+
+
+def _version(user_id):
+    key = VERSION_KEY.format(user=user_id)
+    version = cache.get(key)
+    if version is None:
+        # A new token (never reset to a counter) so entries cached before an eviction are not reused
+        version = uuid.uuid4().hex
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def _load(user_id):
+    from .models import RoleAccess
+
+    key = CACHE_KEY.format(user=user_id, version=_version(user_id))
+    roles = cache.get(key)
+    if roles is None:
+        roles = dict(RoleAccess.objects.filter(user_id=user_id).values_list('project_id', 'role'))
+        cache.set(key, roles, getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 300))
+    return Memberships(roles, user_id)
+
+
+def memberships(request):
+    """The request user's project memberships, empty for anonymous users"""
+    user = request.user
+    if not user.is_authenticated:
+        return Memberships({})
+    # A DRF Request wraps the HttpRequest, memoize on the latter so both share it
+    http_request = getattr(request, '_request', request)
+    cached = getattr(http_request, REQUEST_ATTRIBUTE, None)
+    if cached is None or cached.user_id != user.pk:
+        cached = _load(user.pk)
+        setattr(http_request, REQUEST_ATTRIBUTE, cached)
+    return cached
+
+
+def invalidate(user_id):
+    """Drop the cached memberships for a user by replacing their version token"""
+    cache.set(VERSION_KEY.format(user=user_id), uuid.uuid4().hex, None)
@@ -85,6 +85,11 @@ class Project(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     users = models.ManyToManyField(User, through=RoleAccess, related_name='projects')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='core_project_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
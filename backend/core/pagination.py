@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), newest first.
+
+    The cursor is opaque and encodes the last created_at seen, so every page
+    is an indexed range scan and deep pages cost the same as the first one.
+    Views with an OrderingFilter paginate on the ordering it selects instead.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
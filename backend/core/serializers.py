@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import User, Project, Task, RoleAccess, TimeReport
 from django.contrib.auth.password_validation import validate_password
+from .summary import SUMMARY_FIELDS
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -39,6 +40,20 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'start_date', 'end_date', 'is_active', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+class ProjectSummarySerializer(serializers.ModelSerializer):
+    """Project with the counts annotated by core.summary.project_summaries()"""
+    tasks_count = serializers.IntegerField(read_only=True)
+    overdue_tasks_count = serializers.IntegerField(read_only=True)
+    files_count = serializers.IntegerField(read_only=True)
+    storage_used = serializers.IntegerField(read_only=True)
+    open_annotations_count = serializers.IntegerField(read_only=True)
+    team_size = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Project
+        fields = ProjectSerializer.Meta.fields + list(SUMMARY_FIELDS)
+        read_only_fields = fields
+
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
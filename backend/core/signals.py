@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import membership
+from .models import RoleAccess
+
+
+@receiver(post_save, sender=RoleAccess)
+@receiver(post_delete, sender=RoleAccess)
+def invalidate_memberships(sender, instance, **kwargs):
+    """A role was added, changed or removed: cached memberships for the user are stale"""
+    user_id = instance.user_id
+    membership.invalidate(user_id)
+    # Again after commit, in case another request cached the old rows before the change was visible
+    transaction.on_commit(lambda: membership.invalidate(user_id))
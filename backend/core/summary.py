@@ -0,0 +1,65 @@
+"""
+Aggregated project summaries.
+
+project_summaries() annotates projects with their task, file, annotation and
+member counts in a single query. Each count is a correlated subquery grouped
+on the project, so the aggregates do not multiply each other as joins over
+several relations would, and the database evaluates them only for the rows
+that are returned. Combined with keyset pagination (core.pagination) a page
+costs the same regardless of how many projects exist. Every subquery is an
+index lookup on the relation's project foreign key.
+"""
+from django.db.models import Count, IntegerField, BigIntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Project, RoleAccess, Task
+
+# Annotation statuses that no longer need attention
+CLOSED_ANNOTATION_STATUSES = ('resolved', 'rejected')
+
+SUMMARY_FIELDS = (
+    'tasks_count', 'overdue_tasks_count', 'files_count', 'storage_used',
+    'open_annotations_count', 'team_size',
+)
+
+
+def _aggregate(queryset, aggregate, output_field):
+    """Per-project aggregate of queryset as a correlated subquery, 0 when there are no rows"""
+    subquery = (
+        queryset.filter(project=OuterRef('pk'))
+        .order_by()
+        .values('project')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(subquery, output_field=output_field), Value(0), output_field=output_field)
+
+
+def project_summaries(queryset=None, today=None):
+    """
+    Projects annotated with the fields in SUMMARY_FIELDS.
+
+    Args:
+        queryset: Projects to summarize (default: all projects)
+        today: Date tasks are overdue against (default: today in the current time zone)
+    """
+    from files.models import File, PDFAnnotation
+
+    if queryset is None:
+        queryset = Project.objects.all()
+    today = today or timezone.localdate()
+    count = Count('pk')
+
+    return queryset.annotate(
+        tasks_count=_aggregate(Task.objects.all(), count, IntegerField()),
+        overdue_tasks_count=_aggregate(
+            Task.objects.filter(due_date__lt=today).exclude(status=Task.DONE), count, IntegerField()
+        ),
+        files_count=_aggregate(File.objects.filter(is_latest=True), count, IntegerField()),
+        # All versions are kept in storage, so older versions count towards the storage used
+        storage_used=_aggregate(File.objects.all(), Sum('size'), BigIntegerField()),
+        open_annotations_count=_aggregate(
+            PDFAnnotation.objects.exclude(status__in=CLOSED_ANNOTATION_STATUSES), count, IntegerField()
+        ),
+        team_size=_aggregate(RoleAccess.objects.all(), count, IntegerField()),
+    )
@@ -0,0 +1,37 @@
+"""
+Test helpers shared by the app test suites.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    """
+    Regression guard for N+1 queries on list endpoints.
+
+    assertConstantQueries() requests the same list endpoint with a small and a
+    larger number of rows and fails if the number of queries differs, i.e. if
+    any query is issued per serialized row. Use it in an APITestCase (or any
+    TestCase with self.client) and pass a callable that creates `count` rows.
+    """
+
+    def _count_list_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(queries)
+
+    def assertConstantQueries(self, url, create_rows, params=None, sizes=(2, 10)):
+        """Fail if the query count of GET url grows with the number of rows"""
+        small, large = sizes
+        create_rows(small)
+        # Unmeasured request first, so per-user caches (core.membership) are warm in both measurements
+        self._count_list_queries(url, params)
+        baseline = self._count_list_queries(url, params)
+        create_rows(large - small)
+        grown = self._count_list_queries(url, params)
+        self.assertEqual(
+            baseline, grown,
+            f"{url} ran {baseline} queries for {small} rows but {grown} for {large} rows"
+        )
+        return grown
@@ -1,8 +1,15 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+from .membership import memberships
 from .models import User, Project, Task, RoleAccess, TimeReport
+from .testing import QueryCountMixin
 
 class CoreModelsTestCase(TestCase):
     """Test cases for core app models"""
@@ -86,4 +93,198 @@ class CoreModelsTestCase(TestCase):
         self.assertEqual(str(self.time_report), "Test Task - testuser2 - 2.5 hours")
         self.assertEqual(TimeReport.objects.count(), 1)
 
+
+class MembershipCacheTestCase(TestCase):
+    """Test cases for the cached project memberships used in permission checks"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="memberuser",
+            email="memberuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Member Project", start_date="2023-01-01")
+        self.other = Project.objects.create(name="Other Project", start_date="2023-01-01")
+        self.role = RoleAccess.objects.create(user=self.user, project=self.project, role=RoleAccess.MEMBER)
+        self.factory = RequestFactory()
+    
+    def _request(self):
+        request = self.factory.get('/')
+        request.user = self.user
+        return request
+    
+    def test_loaded_once_and_shared_across_requests(self):
+        request = self._request()
+        with self.assertNumQueries(1):
+            first = memberships(request)
+            self.assertIs(memberships(request), first)
+        self.assertEqual(first.project_ids, {self.project.id})
+        self.assertTrue(first.has(str(self.project.id)))
+        self.assertFalse(first.has(self.other.id))
+        self.assertFalse(first.has('abc'))
+        self.assertEqual(first.role(self.project.id), RoleAccess.MEMBER)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(memberships(self._request()).project_ids, {self.project.id})
+    
+    def test_role_changes_invalidate(self):
+        memberships(self._request())
+        
+        RoleAccess.objects.create(user=self.user, project=self.other, role=RoleAccess.PROJECT_LEADER)
+        current = memberships(self._request())
+        self.assertEqual(current.project_ids, {self.project.id, self.other.id})
+        self.assertEqual(current.with_roles(RoleAccess.PROJECT_LEADER), {self.other.id})
+        
+        self.role.role = RoleAccess.GUEST
+        self.role.save()
+        self.assertEqual(memberships(self._request()).role(self.project.id), RoleAccess.GUEST)
+        
+        self.role.delete()
+        self.assertEqual(memberships(self._request()).project_ids, {self.other.id})
+    
+    def test_list_permission_checks_without_queries(self):
+        """A warm list request does not query RoleAccess at all"""
+        from workspace.models import FileNode
+        
+        for number in range(20):
+            FileNode.objects.create(name=f"node-{number}", type=FileNode.FILE, project=self.project, created_by=self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('filenode-list')
+        client.get(url)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, {'project': self.project.id})
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertFalse([q['sql'] for q in queries if 'core_roleaccess' in q['sql']])
+
+class ProjectSummaryTestCase(QueryCountMixin, TestCase):
+    """Test cases for the aggregated project summary endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="summaryuser",
+            email="summaryuser@example.com",
+            password="securepassword123"
+        )
+        self.other_user = User.objects.create_user(
+            username="summaryother",
+            email="summaryother@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Summary Project", start_date="2023-01-01")
+        self.hidden = Project.objects.create(name="Hidden Project", start_date="2023-01-01")
+        RoleAccess.objects.create(user=self.user, project=self.project, role=RoleAccess.PROJECT_LEADER)
+        RoleAccess.objects.create(user=self.other_user, project=self.project, role=RoleAccess.MEMBER)
+        RoleAccess.objects.create(user=self.other_user, project=self.hidden, role=RoleAccess.MEMBER)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('project-summary-list')
+    
+    def _login_superuser(self):
+        admin = User.objects.create_superuser(
+            username="summaryadmin", email="summaryadmin@example.com", password="securepassword123"
+        )
+        self.client.force_authenticate(admin)
+    
+    def _task(self, project, status=Task.TODO, due_date=None):
+        return Task.objects.create(
+            title="Task", project=project, created_by=self.user, status=status, due_date=due_date
+        )
+    
+    def _file(self, project, name, size, is_latest=True):
+        from files.models import Directory, File
+        directory, _ = Directory.objects.get_or_create(
+            name="Ritningar", project=project, defaults={'created_by': self.user}
+        )
+        return File.objects.create(
+            name=name, directory=directory, project=project, file=f"project_files/{name}",
+            content_type="application/pdf", size=size, uploaded_by=self.user, is_latest=is_latest
+        )
+    
+    def _annotation(self, project, file, status):
+        from files.models import PDFAnnotation
+        return PDFAnnotation.objects.create(
+            file=file, project=project, x=0, y=0, width=1, height=1, page_number=1,
+            comment="Kontrollera", created_by=self.user, status=status
+        )
+    
+    def test_counts(self):
+        """The summary counts match the project's rows"""
+        today = timezone.localdate()
+        self._task(self.project)
+        self._task(self.project, due_date=today - timedelta(days=1))
+        self._task(self.project, status=Task.DONE, due_date=today - timedelta(days=1))
+        self._task(self.project, due_date=today + timedelta(days=1))
+        self._task(self.hidden, due_date=today - timedelta(days=1))
+        old = self._file(self.project, "plan_v1.pdf", 100, is_latest=False)
+        latest = self._file(self.project, "plan_v2.pdf", 250)
+        self._file(self.hidden, "hidden.pdf", 999)
+        self._annotation(self.project, latest, 'new_comment')
+        self._annotation(self.project, latest, 'action_required')
+        self._annotation(self.project, old, 'resolved')
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([p['id'] for p in results], [self.project.id])
+        summary = results[0]
+        self.assertEqual(summary['tasks_count'], 4)
+        self.assertEqual(summary['overdue_tasks_count'], 1)
+        self.assertEqual(summary['files_count'], 1)
+        self.assertEqual(summary['storage_used'], 350)
+        self.assertEqual(summary['open_annotations_count'], 2)
+        self.assertEqual(summary['team_size'], 2)
+    
+    def test_empty_project_counts_are_zero(self):
+        """Projects without rows get 0 rather than null"""
+        response = self.client.get(self.url)
+        summary = response.json()['results'][0]
+        for field in ('tasks_count', 'overdue_tasks_count', 'files_count', 'storage_used', 'open_annotations_count'):
+            self.assertEqual(summary[field], 0, field)
+        self.assertEqual(summary['team_size'], 2)
+    
+    def test_superuser_sees_all_projects(self):
+        self._login_superuser()
+        response = self.client.get(self.url)
+        self.assertEqual({p['id'] for p in response.json()['results']}, {self.project.id, self.hidden.id})
+    
+    def test_pagination(self):
+        self._login_superuser()
+        for number in range(3):
+            Project.objects.create(name=f"Project {number}", start_date="2023-01-01")
+        response = self.client.get(self.url, {'page_size': 2})
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        seen = [p['id'] for p in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            seen += [p['id'] for p in data['results']]
+        self.assertEqual(sorted(seen), sorted(Project.objects.values_list('id', flat=True)))
+    
+    def test_constant_queries(self):
+        """The counts are part of the page query, not one query per project"""
+        # A superuser, so that new memberships do not reload the membership cache between measurements
+        self._login_superuser()
+        
+        def create_projects(count):
+            for number in range(count):
+                project = Project.objects.create(name=f"Project {number}", start_date="2023-01-01")
+                RoleAccess.objects.create(user=self.other_user, project=project, role=RoleAccess.MEMBER)
+                self._task(project)
+                self._file(project, f"plan{number}.pdf", 10)
+        
+        self.assertConstantQueries(self.url, create_projects)
+    
+    def test_get_all_projects(self):
+        response = self.client.get(reverse('get-all-projects'))
+        self.assertEqual(response.status_code, 200)
+        projects = response.json()
+        self.assertEqual([p['id'] for p in projects], [self.hidden.id, self.project.id])
+        self.assertEqual(projects[0]['start_date'], '2023-01-01')
+        self.assertIsNone(projects[0]['end_date'])
+
 # API Tests will be added when the actual API implementation is completed
@@ -9,7 +9,7 @@ router.register('projects', views.ProjectViewSet)
 router.register('tasks', views.TaskViewSet)
 router.register('roles', views.RoleAccessViewSet)
 router.register('time-reports', views.TimeReportViewSet)
-router.register('project-sample', views.ProjectSampleViewSet, basename='project-sample')
+router.register('project-summary', views.ProjectSummaryViewSet, basename='project-summary')
 
 urlpatterns = [
     # Main API endpoints
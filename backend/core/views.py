@@ -6,11 +6,14 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.db import models
 from django.contrib.auth import authenticate
+from .membership import memberships
 from .models import User, Project, Task, RoleAccess, TimeReport
+from .pagination import CreatedAtCursorPagination
 from .serializers import (
-    UserSerializer, UserCreateSerializer, ProjectSerializer,
+    UserSerializer, UserCreateSerializer, ProjectSerializer, ProjectSummarySerializer,
     TaskSerializer, RoleAccessSerializer, TimeReportSerializer
 )
+from .summary import project_summaries
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -110,50 +113,22 @@ class TimeReportViewSet(viewsets.ModelViewSet):
             models.Q(user=user) | models.Q(task__project__in=leader_projects)
         )
         
-class ProjectSampleViewSet(viewsets.ViewSet):
+class ProjectSummaryViewSet(viewsets.ReadOnlyModelViewSet):
     """
-    ViewSet for providing sample project data for testing and development.
+    Projects with task, file, annotation and team counts, newest first.
+
+    The counts are computed in the same query as the page (see core.summary),
+    and regular users only see the projects they are members of.
     """
+    serializer_class = ProjectSummarySerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated]
-    
-    def list(self, request):
-        """Return a sample list of projects"""
-        sample_data = [
-            {
-                "id": 1,
-                "name": "Office Building A",
-                "description": "10-story office building with underground parking",
-                "start_date": "2025-01-15",
-                "end_date": "2026-07-30",
-                "is_active": True,
-                "tasks_count": 24,
-                "files_count": 15,
-                "team_size": 8
-            },
-            {
-                "id": 2,
-                "name": "Residential Complex B",
-                "description": "Mixed-use residential development with retail spaces",
-                "start_date": "2025-03-10",
-                "end_date": "2027-02-28",
-                "is_active": True,
-                "tasks_count": 36,
-                "files_count": 22,
-                "team_size": 12
-            },
-            {
-                "id": 3,
-                "name": "Hospital Renovation C",
-                "description": "Modernization of existing hospital facilities",
-                "start_date": "2024-11-05",
-                "end_date": "2025-12-15",
-                "is_active": True,
-                "tasks_count": 18,
-                "files_count": 10,
-                "team_size": 6
-            }
-        ]
-        return Response(sample_data)
+
+    def get_queryset(self):
+        queryset = Project.objects.all()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(id__in=memberships(self.request).project_ids)
+        return project_summaries(queryset)
 
 
 class LoginView(APIView):
@@ -3,21 +3,29 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
-from .models import PDFAnnotation, File
+from core.pagination import CreatedAtCursorPagination
+from .models import PDFAnnotation, File, SearchEntry
+from .search_api import FullTextSearchFilter
 from .serializers import PDFAnnotationSerializer
 
 
 class PDFAnnotationViewSet(viewsets.ModelViewSet):
     """ViewSet för att hantera PDF-annotationer"""
     serializer_class = PDFAnnotationSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]  # Tillåt läsning utan autentisering
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['comment', 'status']
+    full_text_search = {SearchEntry.KIND_ANNOTATION: 'id'}
     ordering_fields = ['created_at', 'updated_at', 'page_number']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
 
     def get_queryset(self):
-        queryset = PDFAnnotation.objects.all()
+        # Serializern nästlar fil (med mapp, projekt och uppladdare), projekt och två användare per rad
+        queryset = PDFAnnotation.objects.select_related(
+            'file__directory', 'file__project', 'file__uploaded_by',
+            'project', 'created_by', 'assigned_to'
+        )
         
         # Filtrera efter fil-id om angett
         file_id = self.request.query_params.get('file_id')
@@ -4,9 +4,11 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Directory, File
+from . import file_index
+from .delivery import serve_file
 import os
 import logging
-from django.http import FileResponse, HttpResponse
+from django.http import HttpResponse
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -24,7 +26,7 @@ def serve_project_file(request, project_id, path_info):
             response['Allow'] = 'GET, HEAD, OPTIONS'
             response['Access-Control-Allow-Origin'] = '*'
             response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-            response['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization'
+            response['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization, Range, If-Range'
             return response
             
         print(f"[PDF Debug] Accessing file: project={project_id}, path={path_info}")
@@ -39,13 +41,11 @@ def serve_project_file(request, project_id, path_info):
         # Skapa fullständig sökväg till media-katalogen
         media_dir = settings.MEDIA_ROOT
         
-        # Sök efter filen i media-katalogen med hjälp av glob
-        import glob
-        file_pattern = os.path.join(media_dir, "**", filename)
-        matching_files = glob.glob(file_pattern, recursive=True)
+        # Slå upp filen i filindexet i stället för att söka igenom hela media-katalogen
+        indexed_path = file_index.lookup(filename)
         
-        if matching_files:
-            file_path = matching_files[0]  # Använd första matchande filen
+        if indexed_path:
+            file_path = indexed_path
             print(f"[PDF Debug] Hittade matchande fil: {file_path}")
         else:
             # Fallback till direktsökväg
@@ -55,18 +55,6 @@ def serve_project_file(request, project_id, path_info):
         if os.path.exists(file_path) and os.path.isfile(file_path):
             print(f"[PDF Debug] Found file at: {file_path}")
             
-            # För HEAD-förfrågningar, returnera bara headers
-            if request.method == 'HEAD':
-                response = HttpResponse(content_type='application/pdf')
-                response['Content-Length'] = os.path.getsize(file_path)
-                response['Accept-Ranges'] = 'bytes'
-                response['Content-Disposition'] = f'inline; filename="{filename}"'
-                response['Access-Control-Allow-Origin'] = '*'
-                return response
-                
-            # För GET-förfrågningar, läs in filen och returnera
-            print(f"[PDF Debug] Serving file: {file_path}")
-            
             # Detektera filtyp baserat på filändelse
             content_type = 'application/pdf'  # Standard är PDF
             if file_path.lower().endswith('.jpg') or file_path.lower().endswith('.jpeg'):
@@ -78,17 +66,14 @@ def serve_project_file(request, project_id, path_info):
             elif file_path.lower().endswith('.svg'):
                 content_type = 'image/svg+xml'
                 
-            print(f"[PDF Debug] Content-Type: {content_type}")
-            print(f"[PDF Debug] Content-Length: {os.path.getsize(file_path)}")
-                
-            response = FileResponse(
-                open(file_path, 'rb'),
-                content_type=content_type
-            )
+            print(f"[PDF Debug] Serving file: {file_path} ({content_type})")
             
-            # Lägg till headers för att underlätta visning
-            response['Content-Disposition'] = f'inline; filename="{filename}"'
-            response['Content-Length'] = os.path.getsize(file_path)
+            # Leverera filen med stöd för Range-förfrågningar (och HEAD)
+            response = serve_file(
+                request, file_path,
+                content_type=content_type,
+                filename=filename
+            )
             
             # CORS och caching-kontroll
             response['Access-Control-Allow-Origin'] = '*'
@@ -131,54 +116,16 @@ def delete_directory(request, slug=None):
         
         print(f"Raderar mapp via API: {directory_id} ({slug_to_delete})")
         
-        # Hitta alla undermappar rekursivt
-        def get_all_child_directories(parent_id):
-            child_dirs = Directory.objects.filter(parent_id=parent_id).values_list('id', flat=True)
-            all_dirs = list(child_dirs)
-            
-            for child_id in child_dirs:
-                child_subdirs = get_all_child_directories(child_id)
-                if child_subdirs:
-                    all_dirs.extend(child_subdirs)
-                    
-            return all_dirs
-        
-        # Hitta alla undermappar
-        child_directory_ids = get_all_child_directories(directory_id)
-        print(f"Undermappar som ska raderas: {child_directory_ids}")
-        
-        # Radera alla filer i dessa mappar
-        deleted_files = 0
-        
-        # Ta bort filer i huvudmappen
-        main_folder_files = File.objects.filter(directory_id=directory_id).delete()
-        deleted_files += main_folder_files[0] if main_folder_files[0] else 0
-        
-        # Ta bort filer i undermappar
-        for dir_id in child_directory_ids:
-            files_deleted = File.objects.filter(directory_id=dir_id).delete()
-            deleted_files += files_deleted[0] if files_deleted[0] else 0
-        
-        # Avmarkera is_sidebar_item flaggan för alla mappar före radering
-        Directory.objects.filter(id=directory_id).update(is_sidebar_item=False)
-        if child_directory_ids:
-            Directory.objects.filter(id__in=child_directory_ids).update(is_sidebar_item=False)
-        
-        # Radera alla undermappar
-        deleted_directories = 0
-        if child_directory_ids:
-            delete_result = Directory.objects.filter(id__in=child_directory_ids).delete()
-            deleted_directories = delete_result[0] if delete_result[0] else 0
-        
-        # Radera slutligen huvudmappen
-        instance.delete()
+        # Radera hela delträdet (mappar och filer) med ett fast antal frågor
+        deleted_directories, deleted_files = instance.delete_subtree()
+        print(f"Raderade {deleted_directories} mappar och {deleted_files} filer")
         
         # Returnera detaljerad information om raderingen
         return Response({
             "success": True,
             "message": f"Mappen '{slug_to_delete}' och allt dess innehåll har raderats",
             "details": {
-                "deleted_directories": deleted_directories + 1,  # +1 för huvudmappen
+                "deleted_directories": deleted_directories,
                 "deleted_files": deleted_files,
                 "slug": slug_to_delete,
                 "id": directory_id
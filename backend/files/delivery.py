@@ -0,0 +1,581 @@
+"""
+Gemensam leverans av filer över HTTP.
+
+Alla fil-endpoints går via serve_file(). Django sköter behörighetskontrollen
+och själva överföringen lämnas sedan till den bakände som anges i
+FILE_DELIVERY_BACKEND:
+
+- 'django': filen strömmas av ranged_file_response() som hanterar
+  Range-förfrågningar (206 Partial Content, även multipart/byteranges),
+  If-Range, Accept-Ranges och Content-Range. Hela filer och enskilda
+  intervall lämnas till wsgi.file_wrapper, vilket under gunicorn innebär
+  os.sendfile direkt från disk till socket.
+- 'nginx': svaret innehåller bara X-Accel-Redirect och nginx skickar filen.
+- 'xsendfile': svaret innehåller bara X-Sendfile (Apache mod_xsendfile, lighttpd).
+
+Med de två senare hålls en worker bara under behörighetskontrollen, inte
+under hela överföringen.
+
+aserve_file() är motsvarigheten för asynkrona vyer. Under ASGI (uvicorn)
+strömmas filen med en asynkron generator som läser block med os.pread i en
+trådpool, så händelseloopen aldrig blockeras och en process kan hålla
+tusentals samtidiga långsamma nedladdningar. Under WSGI returneras samma
+FileResponse som från serve_file() så att sendfile fortfarande används.
+
+serve_stored() och aserve_stored() tar ett lagringsnamn i stället för en
+sökväg och går via lagringsdrivern (files.storage): lokala filer som ovan,
+filer i S3 via en förhandssignerad URL eller med Range-GET mot bucketen.
+
+Anges etag/last_modified besvaras If-None-Match och If-Modified-Since med
+304 Not Modified innan någon fil öppnas. Vyerna väljer cachepolicy:
+IMMUTABLE_CACHE_CONTROL för versionsadresserade URL:er (innehållet för en
+viss version ändras aldrig) och REVALIDATE_CACHE_CONTROL för "senaste"-alias.
+"""
+import asyncio
+import os
+import posixpath
+import uuid
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from .storage import blob_storage
+
+# Storlek på block som läses från disk vid strömning
+CHUNK_SIZE = 64 * 1024
+
+# Cachepolicy för versionsadresserade URL:er respektive "senaste"-alias
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+
+# Fler intervall än så i en och samma förfrågan behandlas som en vanlig hämtning
+MAX_RANGES = 32
+
+
+class RangeFile:
+    """
+    Filliknande objekt som bara läser ett intervall ur en öppen fil.
+
+    Exponerar fileno() så att WSGI-servrar med wsgi.file_wrapper (t.ex.
+    gunicorn) kan skicka intervallet med sendfile utan att läsa in det.
+    """
+
+    def __init__(self, file_obj, start, length):
+        self.file_obj = file_obj
+        self.remaining = length
+        self.file_obj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file_obj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file_obj.fileno()
+
+    def close(self):
+        self.file_obj.close()
+
+
+def parse_range_header(header, size):
+    """
+    Tolka en Range-header enligt RFC 7233.
+
+    Returns:
+        None om headern ska ignoreras (saknas, felaktig syntax eller för många
+        intervall), en tom lista om inget intervall går att uppfylla (416),
+        annars en sorterad lista med sammanslagna intervall (start, slut)
+        där slut är inkluderande.
+    """
+    if not header:
+        return None
+
+    unit, _, ranges_spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not ranges_spec.strip():
+        return None
+
+    specs = [spec.strip() for spec in ranges_spec.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        start_str, sep, end_str = spec.partition('-')
+        if not sep:
+            return None
+        start_str, end_str = start_str.strip(), end_str.strip()
+        try:
+            if not start_str:
+                # Suffix-intervall: de sista N byten
+                suffix_length = int(end_str)
+                if suffix_length < 0:
+                    return None
+                if suffix_length == 0 or size == 0:
+                    continue
+                ranges.append((max(size - suffix_length, 0), size - 1))
+                continue
+
+            start = int(start_str)
+            end = int(end_str) if end_str else None
+        except ValueError:
+            return None
+
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start >= size:
+            # Intervallet går inte att uppfylla
+            continue
+        if end is None or end >= size:
+            end = size - 1
+        ranges.append((start, end))
+
+    # Slå ihop överlappande och angränsande intervall
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Kontrollera om If-Range-headern matchar filens nuvarande validator"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # If-Range kräver stark jämförelse
+        return bool(etag) and not if_range.startswith('W/') and if_range == etag
+
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and last_modified is not None and if_range_date == int(last_modified)
+
+
+def _multipart_byteranges(read, ranges, size, content_type, boundary):
+    """Generator som strömmar ett multipart/byteranges-svar, read(start, längd) ger intervallets block"""
+    for start, end in ranges:
+        yield _part_header(boundary, content_type, start, end, size)
+        yield from read(start, end - start + 1)
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode('ascii')
+
+
+def _part_header(boundary, content_type, start, end, size):
+    return (
+        f'--{boundary}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Range: bytes {start}-{end}/{size}\r\n'
+        f'\r\n'
+    ).encode('ascii')
+
+
+def _read_file(path, start, length):
+    """Generator som läser ett intervall ur en fil på disk i block"""
+    with open(path, 'rb') as file_obj:
+        file_obj.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = file_obj.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+async def _aread_file(path, start, length):
+    """Asynkron generator som läser ett intervall ur filen i block utan att blockera händelseloopen"""
+    fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+    try:
+        position, end = start, start + length
+        while position < end:
+            data = await asyncio.to_thread(os.pread, fd, min(CHUNK_SIZE, end - position), position)
+            if not data:
+                break
+            position += len(data)
+            yield data
+    finally:
+        os.close(fd)
+
+
+async def _aiter_in_thread(iterator):
+    """Asynkron generator över en synkron iterator (t.ex. en S3-ström) där varje block hämtas i en tråd"""
+    done = object()
+    try:
+        while True:
+            data = await asyncio.to_thread(next, iterator, done)
+            if data is done:
+                break
+            yield data
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            await asyncio.to_thread(close)
+
+
+async def _amultipart_byteranges(read, ranges, size, content_type, boundary):
+    """Asynkron motsvarighet till _multipart_byteranges()"""
+    for start, end in ranges:
+        yield _part_header(boundary, content_type, start, end, size)
+        async for data in read(start, end - start + 1):
+            yield data
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode('ascii')
+
+
+def _multipart_length(ranges, size, content_type, boundary):
+    """Exakt Content-Length för ett multipart/byteranges-svar"""
+    length = 0
+    for start, end in ranges:
+        length += len(_part_header(boundary, content_type, start, end, size))
+        length += end - start + 1
+        length += 2  # \r\n efter varje del
+    length += len(f'--{boundary}--\r\n')
+    return length
+
+
+def ranged_file_response(request, path, content_type=None, filename=None,
+                         as_attachment=False, etag=None, last_modified=None):
+    """
+    Skapa ett svar för en fil på disk med stöd för Range-förfrågningar.
+
+    Args:
+        request: Django- eller DRF-request (eller None för hela filen)
+        path (str): Absolut sökväg till filen
+        content_type (str, optional): Content-Type, gissas från filändelsen om den saknas
+        filename (str, optional): Filnamn i Content-Disposition
+        as_attachment (bool): Om filen ska laddas ner istället för att visas
+        etag (str, optional): Stark ETag (inklusive citattecken) för If-Range
+        last_modified (float, optional): Tidsstämpel för Last-Modified, annars filens mtime
+
+    Returns:
+        HttpResponse: 200, 206 eller 416
+    """
+    stat = os.stat(path)
+    return _ranged_response(
+        request, stat.st_size, stat.st_mtime, content_type, filename or os.path.basename(path),
+        as_attachment, etag, last_modified, path=path
+    )
+
+
+async def aranged_file_response(request, path, content_type=None, filename=None,
+                                as_attachment=False, etag=None, last_modified=None):
+    """
+    Som ranged_file_response() men kroppen är en asynkron generator, för
+    asynkrona vyer under ASGI. Varken stat eller läsningar blockerar händelseloopen.
+    """
+    stat = await asyncio.to_thread(os.stat, path)
+    return _ranged_response(
+        request, stat.st_size, stat.st_mtime, content_type, filename or os.path.basename(path),
+        as_attachment, etag, last_modified, path=path,
+        read=lambda start, length: _aread_file(path, start, length), asynchronous=True
+    )
+
+
+def stored_file_response(request, name, storage=None, content_type=None, filename=None,
+                         as_attachment=False, etag=None, last_modified=None):
+    """
+    Som ranged_file_response() för en fil i lagringen (lagringsnamn), där
+    byten läses genom drivern, t.ex. med Range-GET mot S3.
+    """
+    storage = storage or blob_storage
+    size = storage.size(name)
+    return _ranged_response(
+        request, size, storage.get_modified_time(name).timestamp(), content_type,
+        filename or posixpath.basename(name), as_attachment, etag, last_modified,
+        read=lambda start, length: storage.iter_range(name, start, length, CHUNK_SIZE)
+    )
+
+
+async def astored_file_response(request, name, storage=None, content_type=None, filename=None,
+                                as_attachment=False, etag=None, last_modified=None):
+    """Asynkron motsvarighet till stored_file_response()"""
+    storage = storage or blob_storage
+    size = await asyncio.to_thread(storage.size, name)
+    modified = await asyncio.to_thread(storage.get_modified_time, name)
+    return _ranged_response(
+        request, size, modified.timestamp(), content_type,
+        filename or posixpath.basename(name), as_attachment, etag, last_modified,
+        read=lambda start, length: _aiter_in_thread(storage.iter_range(name, start, length, CHUNK_SIZE)),
+        asynchronous=True
+    )
+
+
+def _ranged_response(request, size, mtime, content_type, filename, as_attachment, etag,
+                     last_modified, path=None, read=None, asynchronous=False):
+    """
+    Gemensamt svar för filer på disk och i lagringen. Utan read strömmas filen
+    på path med FileResponse (sendfile), annars ger read(start, längd) blocken,
+    som en asynkron generator om asynchronous är satt.
+    """
+    if last_modified is None:
+        last_modified = mtime
+    if content_type is None:
+        content_type = mimetypes.guess_type(path or filename)[0] or 'application/octet-stream'
+
+    # Utan request (t.ex. från hjälpfunktioner) levereras hela filen
+    method = request.method if request is not None else 'GET'
+
+    ranges = None
+    if request is not None and method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    boundary = None
+    if method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    elif read is not None:
+        if not ranges:
+            body = read(0, size)
+        elif len(ranges) == 1:
+            body = read(ranges[0][0], ranges[0][1] - ranges[0][0] + 1)
+        else:
+            boundary = uuid.uuid4().hex
+            multipart = _amultipart_byteranges if asynchronous else _multipart_byteranges
+            body = multipart(read, ranges, size, content_type, boundary)
+        response = StreamingHttpResponse(
+            body,
+            content_type=f'multipart/byteranges; boundary={boundary}' if boundary else content_type,
+            status=206 if ranges else 200,
+        )
+    elif not ranges:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response.block_size = CHUNK_SIZE
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = FileResponse(
+            RangeFile(open(path, 'rb'), start, end - start + 1),
+            content_type=content_type,
+            status=206,
+        )
+        response.block_size = CHUNK_SIZE
+    else:
+        boundary = uuid.uuid4().hex
+        response = StreamingHttpResponse(
+            _multipart_byteranges(lambda start, length: _read_file(path, start, length), ranges, size, content_type, boundary),
+            content_type=f'multipart/byteranges; boundary={boundary}',
+            status=206,
+        )
+
+    if not ranges:
+        response['Content-Length'] = size
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        if boundary is None:
+            boundary = uuid.uuid4().hex
+            response.status_code = 206
+            response['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+        response['Content-Length'] = _multipart_length(ranges, size, content_type, boundary)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response['ETag'] = etag
+
+    # content_disposition_header hanterar även filnamn med å, ä och ö
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def _media_relative_path(path):
+    """Sökväg relativ MEDIA_ROOT, eller None om filen ligger utanför"""
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    abs_path = os.path.abspath(path)
+    if not abs_path.startswith(media_root + os.sep):
+        return None
+    return os.path.relpath(abs_path, media_root).replace(os.sep, '/')
+
+
+def _offload_response(path, content_type, filename, as_attachment, etag):
+    """Gemensamma headers för svar där proxyn skickar själva filen"""
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = HttpResponse(content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(
+        as_attachment, filename or os.path.basename(path)
+    )
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def accel_redirect_response(request, path, content_type=None, filename=None,
+                            as_attachment=False, etag=None, last_modified=None):
+    """
+    Lämna överföringen till nginx via X-Accel-Redirect.
+
+    Kräver en intern location i nginx som pekar på MEDIA_ROOT, t.ex.:
+
+        location /protected-media/ {
+            internal;
+            alias /app/media/;
+        }
+
+    Filer utanför MEDIA_ROOT strömmas av Django som vanligt.
+    """
+    relative_path = _media_relative_path(path)
+    if relative_path is None:
+        return ranged_file_response(request, path, content_type, filename, as_attachment, etag, last_modified)
+
+    response = _offload_response(path, content_type, filename, as_attachment, etag)
+    prefix = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+    response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + relative_path)
+    return response
+
+
+def xsendfile_response(request, path, content_type=None, filename=None,
+                       as_attachment=False, etag=None, last_modified=None):
+    """Lämna överföringen till Apache (mod_xsendfile) eller lighttpd via X-Sendfile"""
+    response = _offload_response(path, content_type, filename, as_attachment, etag)
+    response['X-Sendfile'] = os.path.abspath(path)
+    return response
+
+
+def _conditional_response(request, etag, last_modified):
+    """304/412-svar om förfrågan är villkorad och klientens kopia är aktuell, annars None"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    last_modified = int(last_modified) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None and response.status_code == 304:
+        if etag:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+DELIVERY_BACKENDS = {
+    'django': ranged_file_response,
+    'nginx': accel_redirect_response,
+    'xsendfile': xsendfile_response,
+}
+
+
+def _delivery_backend():
+    backend_name = getattr(settings, 'FILE_DELIVERY_BACKEND', 'django')
+    try:
+        return DELIVERY_BACKENDS[backend_name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Okänd FILE_DELIVERY_BACKEND '{backend_name}', "
+            f"välj en av: {', '.join(DELIVERY_BACKENDS)}"
+        )
+
+
+def serve_file(request, path, content_type=None, filename=None,
+               as_attachment=False, etag=None, last_modified=None):
+    """
+    Leverera en fil med den bakände som anges i FILE_DELIVERY_BACKEND.
+
+    Anropas efter att vyn har kontrollerat behörigheten. Argumenten är
+    desamma som för ranged_file_response(). Med etag eller last_modified
+    returneras 304 (eller 412 för If-Match) när klientens kopia är aktuell.
+    """
+    backend = _delivery_backend()
+    # Utan request (hjälpfunktioner) strömmas filen alltid av Django
+    if request is None:
+        backend = ranged_file_response
+    elif etag or last_modified is not None:
+        response = _conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+    return backend(request, path, content_type, filename, as_attachment, etag, last_modified)
+
+
+async def aserve_file(request, path, content_type=None, filename=None,
+                      as_attachment=False, etag=None, last_modified=None):
+    """
+    serve_file() för asynkrona vyer.
+
+    Under ASGI strömmar Django filen med aranged_file_response(); nginx- och
+    X-Sendfile-svaren innehåller bara headers och skapas som vanligt. Under
+    WSGI (och utan request) används serve_file() så att sendfile behålls.
+    """
+    if not isinstance(request, ASGIRequest):
+        return serve_file(request, path, content_type, filename, as_attachment, etag, last_modified)
+
+    backend = _delivery_backend()
+    if etag or last_modified is not None:
+        response = _conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+    if backend is ranged_file_response or (
+        backend is accel_redirect_response and _media_relative_path(path) is None
+    ):
+        return await aranged_file_response(request, path, content_type, filename, as_attachment, etag, last_modified)
+    return backend(request, path, content_type, filename, as_attachment, etag, last_modified)
+
+
+def _redirect_response(url):
+    """Omdirigering till en förhandssignerad URL, som slutar gälla och därför inte får cachas"""
+    response = HttpResponseRedirect(url)
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def serve_stored(request, name, storage=None, content_type=None, filename=None,
+                 as_attachment=False, etag=None, last_modified=None):
+    """
+    Leverera en fil ur lagringen (lagringsnamn, t.ex. File.file.name) via dess drivrutin.
+
+    Lokala filer levereras med serve_file() och FILE_DELIVERY_BACKEND. Med
+    S3 skickas klienten till en förhandssignerad URL (S3_REDIRECT_DOWNLOADS),
+    annars strömmas filen genom Django med Range-GET mot bucketen. Villkorade
+    förfrågningar besvaras med 304 innan lagringen kontaktas.
+    """
+    storage = storage or blob_storage
+    path = storage.local_path(name)
+    if path is not None:
+        return serve_file(request, path, content_type, filename, as_attachment, etag, last_modified)
+
+    if request is not None and (etag or last_modified is not None):
+        response = _conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+    filename = filename or posixpath.basename(name)
+    url = storage.download_url(name, filename, content_type, as_attachment)
+    if url:
+        return _redirect_response(url)
+    return stored_file_response(request, name, storage, content_type, filename, as_attachment, etag, last_modified)
+
+
+async def aserve_stored(request, name, storage=None, content_type=None, filename=None,
+                        as_attachment=False, etag=None, last_modified=None):
+    """serve_stored() för asynkrona vyer, se aserve_file()"""
+    storage = storage or blob_storage
+    path = storage.local_path(name)
+    if path is not None:
+        return await aserve_file(request, path, content_type, filename, as_attachment, etag, last_modified)
+    if not isinstance(request, ASGIRequest):
+        return serve_stored(request, name, storage, content_type, filename, as_attachment, etag, last_modified)
+
+    if etag or last_modified is not None:
+        response = _conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+    filename = filename or posixpath.basename(name)
+    url = storage.download_url(name, filename, content_type, as_attachment)
+    if url:
+        return _redirect_response(url)
+    return await astored_file_response(request, name, storage, content_type, filename, as_attachment, etag, last_modified)
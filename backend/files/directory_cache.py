@@ -0,0 +1,175 @@
+"""
+Cachad data för mappsidan (web_api.directory_data).
+
+Svaret för en mapp (mappen, föräldern, undermapparna och filerna) byggs med
+tre frågor och cachas per mapp under en versionsnyckel. Signalerna i
+files.signals byter mappens version när den själv, dess förälder, en
+undermapp eller en fil i den ändras, så nästa anrop bygger om svaret. En
+payload som byggdes medan versionen byttes hamnar under den gamla versionen
+och används aldrig.
+
+Varje payload har en ETag så att klienter kan omvalidera med If-None-Match
+och få 304. Hur ofta varje mapp hämtas räknas i cachen, och
+manage.py warm_directory_cache förberäknar de mest besökta mapparna efter en
+deploy. Det kräver en delad cache (t.ex. Redis eller Memcached); med
+LocMemCache har varje process sin egen cache.
+"""
+import hashlib
+import json
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Höjs när payloadens format ändras, så att gamla payloads inte levereras efter en deploy
+FORMAT = 1
+
+SLUG_KEY = 'files:directory_data:slug:{slug}'
+VERSION_KEY = 'files:directory_data:version:{directory}'
+DATA_KEY = 'files:directory_data:{format}:{directory}:{version}'
+VISITS_KEY = 'files:directory_data:visits:{directory}'
+
+
+def _timeout():
+    return getattr(settings, 'DIRECTORY_DATA_CACHE_TIMEOUT', 3600)
+
+
+def _version(directory_id):
+    key = VERSION_KEY.format(directory=directory_id)
+    version = cache.get(key)
+    if version is None:
+        # En ny slumpad version, så att en payload från före en utrensning aldrig återanvänds
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(*directory_ids):
+    """Byt version för mapparna, så att deras cachade payloads inte används igen"""
+    keys = {VERSION_KEY.format(directory=directory_id): uuid.uuid4().hex for directory_id in directory_ids if directory_id}
+    if keys:
+        cache.set_many(keys, None)
+
+
+def build(directory):
+    """
+    Mappens data för frontend med relativa URL:er (tre frågor om föräldern är laddad).
+    """
+    from .models import Directory, File
+    from .rendition_api import thumbnail_url
+
+    subfolders = Directory.objects.filter(parent=directory).values('name', 'slug')
+    files = File.objects.filter(directory=directory, is_latest=True).values(
+        'id', 'name', 'file', 'content_type', 'sha256', 'page_count', 'pdf_metadata', 'created_at'
+    )
+    data = {
+        'id': directory.id,
+        'name': directory.name,
+        'slug': directory.slug,
+        'description': directory.page_description,
+        'page_title': directory.page_title or directory.name,
+        'subfolders': list(subfolders),
+        'files': [{
+            'id': file['id'],
+            'name': file['name'],
+            'file': file['file'],
+            'content_type': file['content_type'],
+            'thumbnail_url': thumbnail_url(file['id'], file['sha256']),
+            'page_count': file['page_count'],
+            'pages': [
+                {'width': page['width'], 'height': page['height'], 'rotation': page['rotation']}
+                for page in file['pdf_metadata'].get('pages', [])
+            ],
+            'uploaded_at': file['created_at']
+        } for file in files],
+    }
+    if directory.parent_id:
+        data['parent_name'] = directory.parent.name
+        data['parent_slug'] = directory.parent.slug
+    return data
+
+
+def _store(directory):
+    # Versionen läses innan payloaden byggs, så att en samtidig ändring inte cachas som aktuell
+    version = _version(directory.id)
+    data = build(directory)
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    entry = {'data': data, 'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"'}
+    cache.set_many({
+        DATA_KEY.format(format=FORMAT, directory=directory.id, version=version): entry,
+        SLUG_KEY.format(slug=directory.slug): directory.id,
+    }, _timeout())
+    return entry
+
+
+def get(slug):
+    """
+    Mappens cachade payload, byggd om den saknas eller är inaktuell.
+
+    Returns:
+        dict: data (med relativa URL:er) och etag, eller None om mappen inte finns
+    """
+    from .models import Directory
+
+    directory_id = cache.get(SLUG_KEY.format(slug=slug))
+    if directory_id is not None:
+        entry = cache.get(DATA_KEY.format(format=FORMAT, directory=directory_id, version=_version(directory_id)))
+        # En omdöpt mapp har kvar sin gamla slug-nyckel tills den går ut
+        if entry is not None and entry['data']['slug'] == slug:
+            return entry
+
+    directory = Directory.objects.select_related('parent').filter(slug=slug).first()
+    if directory is None:
+        return None
+    return _store(directory)
+
+
+def absolute(data, request):
+    """Payloaden med absoluta URL:er för förfrågans värd"""
+    return dict(data, files=[
+        dict(
+            file,
+            file=request.build_absolute_uri(file['file']),
+            thumbnail_url=request.build_absolute_uri(file['thumbnail_url']),
+        )
+        for file in data['files']
+    ])
+
+
+def record_visit(directory_id):
+    """Räkna ett besök, som underlag för warm()"""
+    key = VISITS_KEY.format(directory=directory_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def warm(limit=100, project_id=None):
+    """
+    Förberäkna payloads för de mest besökta mapparna. Saknas besöksstatistik
+    (t.ex. efter att cachen tömts) används sidomenyns mappar.
+
+    Returns:
+        int: Antal mappar vars payload byggdes
+    """
+    from .models import Directory
+
+    directories = Directory.objects.select_related('parent')
+    if project_id is not None:
+        directories = directories.filter(project_id=project_id)
+
+    ids = list(directories.values_list('id', flat=True))
+    visits = cache.get_many([VISITS_KEY.format(directory=directory_id) for directory_id in ids])
+    counts = {
+        directory_id: visits.get(VISITS_KEY.format(directory=directory_id), 0) for directory_id in ids
+    }
+    top = [directory_id for directory_id in sorted(ids, key=counts.get, reverse=True) if counts[directory_id]][:limit]
+    if not top:
+        top = list(directories.filter(is_sidebar_item=True).values_list('id', flat=True)[:limit])
+
+    warmed = 0
+    for directory in directories.filter(id__in=top):
+        _store(directory)
+        warmed += 1
+    return warmed
@@ -0,0 +1,251 @@
+"""
+Index för uppslagning av filnamn -> lagringssökväg.
+
+Tidigare söktes hela MEDIA_ROOT igenom med glob.glob(..., recursive=True) vid
+varje anrop. Indexet byggs i stället upp från File-, FileVersion- och
+PDFDocument-tabellerna samt en engångsgenomsökning av disken, och hålls
+uppdaterat via signaler när filer sparas eller raderas.
+
+Filer i den innehållsadresserade lagringen heter <sha256>.pdf på disk. De
+indexeras därför även under sitt visningsnamn (t.ex. ritning.pdf), så att
+uppslagningar på det namn användaren ser fortsätter att fungera.
+"""
+import os
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Hur många rader som skrivs per bulk_create vid ombyggnad
+BATCH_SIZE = 1000
+
+
+def _index_roots():
+    """Kataloger som genomsöks vid ombyggnad av indexet"""
+    roots = [settings.MEDIA_ROOT]
+    roots.extend(getattr(settings, 'FILE_INDEX_EXTRA_ROOTS', []))
+    return roots
+
+
+def _normalize(storage_path):
+    """Gör sökvägen relativ MEDIA_ROOT om den ligger där, annars absolut"""
+    storage_path = str(storage_path)
+    if os.path.isabs(storage_path):
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        abs_path = os.path.abspath(storage_path)
+        if abs_path.startswith(media_root + os.sep):
+            return os.path.relpath(abs_path, media_root)
+        return abs_path
+    return storage_path.lstrip('/')
+
+
+def absolute_path(storage_path):
+    """Returnera absolut sökväg för en post i indexet"""
+    return os.path.join(settings.MEDIA_ROOT, storage_path)
+
+
+def _filenames(storage_path, display_name=None):
+    """Filnamn som sökvägen ska gå att slå upp under"""
+    filename = os.path.basename(storage_path)
+    filenames = [filename]
+    if display_name:
+        extension = os.path.splitext(filename)[1]
+        alias = os.path.basename(display_name)
+        if extension and not alias.lower().endswith(extension.lower()):
+            alias += extension
+        if alias != filename:
+            filenames.append(alias[:255])
+    return filenames
+
+
+def index_path(storage_path, source, display_name=None):
+    """Lägg till eller uppdatera en sökväg i indexet, även under visningsnamnet"""
+    from .models import FileIndexEntry
+
+    if not storage_path:
+        return
+    storage_path = _normalize(storage_path)
+    for filename in _filenames(storage_path, display_name):
+        FileIndexEntry.objects.update_or_create(
+            filename=filename,
+            storage_path=storage_path,
+            defaults={'source': source}
+        )
+
+
+def index_paths(paths, source):
+    """
+    Som index_path för många sökvägar: en fråga efter befintliga poster,
+    en update och en bulk_create.
+
+    Args:
+        paths: (lagringssökväg, visningsnamn) för varje fil
+    """
+    from .models import FileIndexEntry
+
+    entries = set()
+    for storage_path, display_name in paths:
+        if storage_path:
+            storage_path = _normalize(storage_path)
+            entries.update((filename, storage_path) for filename in _filenames(storage_path, display_name))
+    if not entries:
+        return
+
+    existing = {
+        (filename, storage_path): entry_id
+        for entry_id, filename, storage_path in FileIndexEntry.objects.filter(
+            storage_path__in={storage_path for _, storage_path in entries}
+        ).values_list('id', 'filename', 'storage_path')
+    }
+    FileIndexEntry.objects.filter(
+        id__in=[entry_id for entry, entry_id in existing.items() if entry in entries]
+    ).update(source=source, updated_at=timezone.now())
+    # En samtidig uppladdning av samma innehåll kan hinna skapa posten först
+    FileIndexEntry.objects.bulk_create([
+        FileIndexEntry(filename=filename, storage_path=storage_path, source=source)
+        for filename, storage_path in entries - existing.keys()
+    ], ignore_conflicts=True)
+
+
+def remove_path(storage_path):
+    """Ta bort en sökväg (under alla filnamn) ur indexet"""
+    from .models import FileIndexEntry
+
+    if not storage_path:
+        return
+    FileIndexEntry.objects.filter(storage_path=_normalize(storage_path)).delete()
+
+
+def lookup_all(filename):
+    """
+    Returnera absoluta sökvägar till alla existerande filer med givet filnamn.
+    Poster vars fil inte längre finns på disken rensas bort.
+    """
+    from .models import FileIndexEntry
+
+    entries = FileIndexEntry.objects.filter(
+        filename=os.path.basename(filename)
+    ).order_by('-updated_at').values_list('id', 'storage_path')
+
+    paths = []
+    stale_ids = []
+    for entry_id, storage_path in entries:
+        path = absolute_path(storage_path)
+        if os.path.isfile(path):
+            paths.append(path)
+        else:
+            stale_ids.append(entry_id)
+
+    if stale_ids:
+        logger.debug(f"Filindex: rensar {len(stale_ids)} inaktuella poster för {filename}")
+        FileIndexEntry.objects.filter(id__in=stale_ids).delete()
+
+    return paths
+
+
+def lookup(filename):
+    """Returnera absolut sökväg till en fil med givet filnamn, eller None"""
+    paths = lookup_all(filename)
+    return paths[0] if paths else None
+
+
+def search(fragment, extension='.pdf', limit=100):
+    """
+    Sök efter filer vars namn innehåller fragmentet.
+    Exakt träff på filnamnet används i första hand.
+
+    Returns:
+        list: Tupler (filnamn, relativ sökväg, absolut sökväg)
+    """
+    from .models import FileIndexEntry
+
+    queryset = FileIndexEntry.objects.all()
+    if extension:
+        queryset = queryset.filter(filename__iendswith=extension)
+
+    entries = list(queryset.filter(filename=fragment).values_list('filename', 'storage_path')[:limit])
+    if not entries:
+        entries = list(
+            queryset.filter(filename__icontains=fragment).values_list('filename', 'storage_path')[:limit]
+        )
+
+    return [
+        (filename, storage_path, absolute_path(storage_path))
+        for filename, storage_path in entries
+    ]
+
+
+def _iter_database_paths():
+    """Alla lagringssökvägar som är kända i databasen, med källa och visningsnamn"""
+    from .models import File, FileIndexEntry
+    from workspace.models import FileVersion, PDFDocument
+
+    sources = (
+        (File, 'name', FileIndexEntry.SOURCE_FILE),
+        (FileVersion, 'file_node__name', FileIndexEntry.SOURCE_FILE_VERSION),
+        (PDFDocument, 'title', FileIndexEntry.SOURCE_PDF_DOCUMENT),
+    )
+    for model, name_field, source in sources:
+        rows = model.objects.exclude(file='').exclude(file__isnull=True).values_list('file', name_field)
+        for name, display_name in rows.iterator():
+            yield name, source, display_name
+
+
+def _iter_disk_paths():
+    """Alla filer under indexets rotkataloger"""
+    from .models import FileIndexEntry
+
+    for root in _index_roots():
+        if not os.path.isdir(root):
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                yield os.path.join(dirpath, filename), FileIndexEntry.SOURCE_DISK, None
+
+
+def rebuild(crawl_disk=True):
+    """
+    Bygg om hela indexet från databasen och (valfritt) en genomsökning av disken.
+
+    Returns:
+        dict: Antal indexerade poster per källa
+    """
+    from .models import FileIndexEntry
+
+    counts = {}
+    seen = set()
+    batch = []
+
+    def flush():
+        FileIndexEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        batch.clear()
+
+    sources = [_iter_database_paths()]
+    if crawl_disk:
+        sources.append(_iter_disk_paths())
+
+    with transaction.atomic():
+        FileIndexEntry.objects.all().delete()
+        for iterator in sources:
+            for storage_path, source, display_name in iterator:
+                storage_path = _normalize(storage_path)
+                new_entries = [
+                    FileIndexEntry(filename=filename, storage_path=storage_path, source=source)
+                    for filename in _filenames(storage_path, display_name)
+                    if (filename, storage_path) not in seen
+                ]
+                if not new_entries:
+                    continue
+                for entry in new_entries:
+                    seen.add((entry.filename, storage_path))
+                batch.extend(new_entries)
+                counts[source] = counts.get(source, 0) + 1
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+        if batch:
+            flush()
+
+    logger.info(f"Filindex ombyggt: {counts}")
+    return counts
@@ -0,0 +1,78 @@
+"""
+SHA-256 för lagrade filer.
+
+Hashen används som stark ETag vid filleverans. Den räknas ut från
+uppladdningsströmmen när en ny fil sparas (pre_save) och annars i efterhand
+första gången filen levereras.
+"""
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Storlek på block vid läsning av filer som ska hashas
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_path(path):
+    """SHA-256 (hex) för en fil på disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file_obj:
+        for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_upload(field_file):
+    """
+    SHA-256 (hex) för en fil som ännu inte sparats till lagringen.
+    chunks() spolar tillbaka filen så att lagringen kan läsa den efteråt.
+    """
+    digest = hashlib.sha256()
+    for chunk in field_file.chunks(chunk_size=HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    field_file.seek(0)
+    return digest.hexdigest()
+
+
+def set_upload_hash(instance):
+    """
+    Sätt sha256 på en instans vars fil precis laddats upp (anropas i pre_save).
+    Hashen följer även med uppladdningen till lagringen, så att
+    ContentAddressedStorage inte behöver läsa filen en gång till.
+    """
+    field_file = instance.file
+    if field_file and not getattr(field_file, '_committed', True):
+        instance.sha256 = hash_upload(field_file)
+        field_file.file.sha256 = instance.sha256
+
+
+def ensure_sha256(instance):
+    """
+    Returnera instansens sha256 och räkna ut den från lagringen om den saknas.
+    Värdet sparas med update() så att updated_at och signaler inte påverkas.
+    """
+    from .storage import local_copy
+
+    if instance.sha256:
+        return instance.sha256
+
+    try:
+        with local_copy(instance.file.name, instance.file.storage) as path:
+            instance.sha256 = hash_path(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Kunde inte räkna ut sha256 för {instance.file.name}: {str(e)}")
+        return ''
+
+    type(instance).objects.filter(pk=instance.pk).update(sha256=instance.sha256)
+    # update() skickar inga signaler, och mappsidan visar förhandsbilder med hashen i URL:en
+    if getattr(instance, 'directory_id', None):
+        from .directory_cache import invalidate
+        invalidate(instance.directory_id)
+    return instance.sha256
+
+
+def etag_for(instance):
+    """Stark ETag (med citattecken) baserad på filens innehåll, eller None"""
+    sha256 = ensure_sha256(instance)
+    return f'"{sha256}"' if sha256 else None
@@ -0,0 +1,145 @@
+"""
+Linjärisering (fast web view) av uppladdade PDF:er.
+
+I en icke-linjäriserad PDF ligger korsreferenstabellen sist, så en visare
+som hämtar filen med Range-förfrågningar måste först läsa slutet av filen
+och sedan hoppa runt efter sida 1:s objekt. En linjäriserad PDF har allt som
+behövs för första sidan i början av filen.
+
+Efter uppladdning skrivs en linjäriserad kopia med pikepdf (qpdf) till
+renderingscachen, nycklad på originalets sha256:
+
+    <RENDITION_CACHE_DIR>/<ab>/<sha256>/linearized.pdf
+
+Originalet lämnas orört och levereras vid nedladdning, medan kopian
+levereras för visning. Kopian tas bort tillsammans med övriga renderingar
+när bloben rensas. Filer som redan är linjäriserade eller mindre än
+LINEARIZE_MIN_SIZE hoppas över, eftersom de inte blir snabbare att öppna.
+"""
+import logging
+import os
+import re
+import tempfile
+from django.conf import settings
+from .renditions import cache_dir
+
+logger = logging.getLogger(__name__)
+
+FILENAME = 'linearized.pdf'
+
+# Linjäriseringsordlistan måste ligga inom de första 1024 byten (PDF 1.7, bilaga F)
+_HEADER_SIZE = 1024
+_LINEARIZED_RE = re.compile(rb'/Linearized\s')
+_FIRST_PAGE_END_RE = re.compile(rb'/E\s+(\d+)')
+
+
+def optimized_path(sha256):
+    return os.path.join(cache_dir(sha256), FILENAME)
+
+
+def _read_header(path):
+    with open(path, 'rb') as pdf_file:
+        return pdf_file.read(_HEADER_SIZE)
+
+
+def is_linearized(path):
+    return bool(_LINEARIZED_RE.search(_read_header(path)))
+
+
+def first_page_end(path):
+    """
+    Byte-offset där första sidans data slutar (/E i linjäriseringsordlistan),
+    eller None om filen inte är linjäriserad
+    """
+    header = _read_header(path)
+    if not _LINEARIZED_RE.search(header):
+        return None
+    match = _FIRST_PAGE_END_RE.search(header)
+    return int(match.group(1)) if match else None
+
+
+def needs_linearization(path):
+    """Om en linjäriserad kopia skulle göra filen snabbare att öppna"""
+    min_size = getattr(settings, 'LINEARIZE_MIN_SIZE', 256 * 1024)
+    return os.path.getsize(path) >= min_size and not is_linearized(path)
+
+
+def linearize(sha256, pdf_path):
+    """
+    Skriv en linjäriserad kopia av PDF:en till cachen om den behövs.
+
+    Returns:
+        str: Sökväg till kopian, eller None om filen inte linjäriserades
+    """
+    target = optimized_path(sha256)
+    if os.path.exists(target):
+        return target
+    if not needs_linearization(pdf_path):
+        return None
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    os.close(fd)
+    try:
+        if not write_linearized(pdf_path, temp_path):
+            return None
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return target
+
+
+def write_linearized(pdf_path, target):
+    """Skriv en linjäriserad kopia av pdf_path till target, returnerar False om det inte gick"""
+    try:
+        import pikepdf
+    except ImportError:
+        logger.warning("pikepdf är inte installerat, PDF:er linjäriseras inte")
+        return False
+
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            pdf.save(target, linearize=True)
+        return True
+    except Exception as e:
+        logger.warning(f"Kunde inte linjärisera {pdf_path}: {str(e)}")
+        return False
+
+
+def viewing_file(sha256, pdf_path):
+    """
+    Filen som ska levereras för visning och dess ETag: den linjäriserade
+    kopian om den finns, annars originalet. pdf_path är None när originalet
+    levereras ur lagringen (files.delivery.serve_stored).
+    """
+    if sha256:
+        path = optimized_path(sha256)
+        if os.path.exists(path):
+            return path, f'"{sha256}-linearized"'
+    return pdf_path, f'"{sha256}"' if sha256 else None
+
+
+def linearization_job(instance):
+    """Bakgrundsjobbet (namn, payload, nyckel) som linjäriserar en nyss uppladdad PDF, eller None"""
+    if not getattr(settings, 'LINEARIZE_ON_UPLOAD', True):
+        return None
+    sha256 = getattr(instance, 'sha256', '')
+    field_file = instance.file
+    if not sha256 or not field_file or not field_file.name.lower().endswith('.pdf'):
+        return None
+    if os.path.exists(optimized_path(sha256)):
+        return None
+    return 'files.linearize', {'sha256': sha256, 'name': field_file.name}, f"linearize:{sha256}"
+
+
+def schedule_linearization(instance):
+    """
+    Köa linjärisering av en nyss uppladdad PDF som bakgrundsjobb
+    (anropas i post_save för File, FileVersion och PDFDocument, se files.tasks).
+    """
+    job = linearization_job(instance)
+    if job:
+        from jobs.queue import enqueue
+        name, payload, key = job
+        enqueue(name, payload, key=key)
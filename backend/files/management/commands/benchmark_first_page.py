@@ -0,0 +1,215 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from files import linearize
+from files.hashing import ensure_sha256
+from files.models import File
+
+# pdf.js hämtar filen i block om 64 KiB (rangeChunkSize)
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+
+
+def _object_ranges(reader, size):
+    """Byte-intervall (start, slut) för varje objektnummer, objekt i objektströmmar pekar på strömmen"""
+    offsets = {}
+    for generation in reader.xref.values():
+        offsets.update(generation)
+    bounds = sorted(set(offsets.values()) | {size})
+    ends = dict(zip(bounds, bounds[1:]))
+    ranges = {number: (offset, ends[offset]) for number, offset in offsets.items() if offset in ends}
+    for number, (stream_number, _) in getattr(reader, 'xref_objStm', {}).items():
+        if stream_number in ranges:
+            ranges[number] = ranges[stream_number]
+    return ranges
+
+
+def _references(obj, skip=('/Parent',)):
+    """Indirekta referenser i ett objekt utan att följa dem"""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(obj, IndirectObject):
+        return [obj]
+    refs = []
+    if isinstance(obj, DictionaryObject):
+        for key, value in dict.items(obj):
+            if key not in skip:
+                refs.extend(_references(value, skip))
+    elif isinstance(obj, ArrayObject):
+        for value in list.__iter__(obj):
+            refs.extend(_references(value, skip))
+    return refs
+
+
+def _non_linearized_rounds(path, size):
+    """
+    Byte-intervall som en Range-läsare hämtar i varje rundresa innan sida 1 kan ritas:
+    slutet av filen (korsreferenser), sidträdet ner till sida 1 och sedan sidans objekt nivå för nivå
+    """
+    from pypdf import PdfReader
+
+    with open(path, 'rb') as pdf_file:
+        pdf_file.seek(max(0, size - 1024))
+        match = _STARTXREF_RE.search(pdf_file.read())
+    rounds = [[(int(match.group(1)) if match else max(0, size - 1024), size)]]
+
+    reader = PdfReader(path)
+    ranges = _object_ranges(reader, size)
+    page = reader.pages[0]
+
+    # Katalogen och sidträdet från roten ner till sida 1
+    chain = [reader.trailer.raw_get('/Root')]
+    node, parents = page, []
+    while '/Parent' in node:
+        parents.insert(0, node.raw_get('/Parent'))
+        node = node['/Parent']
+    chain += parents + [page.indirect_reference]
+
+    seen = set()
+    for ref in chain:
+        seen.add(ref.idnum)
+        rounds.append([ranges[ref.idnum]] if ref.idnum in ranges else [])
+
+    # Sidans innehåll, resurser, typsnitt och bilder, en nivå per rundresa
+    level = _references(page, skip=('/Parent', '/Kids'))
+    while level:
+        next_level = []
+        round_ranges = []
+        for ref in level:
+            if ref.idnum in seen:
+                continue
+            seen.add(ref.idnum)
+            if ref.idnum in ranges:
+                round_ranges.append(ranges[ref.idnum])
+            next_level.extend(_references(ref.get_object(), skip=('/Parent', '/Kids')))
+        rounds.append(round_ranges)
+        level = next_level
+    return rounds
+
+
+def _linearized_rounds(path, size):
+    """Första blocket avslöjar /E, resten av första sidans data hämtas i en rundresa till"""
+    end = min(linearize.first_page_end(path) or size, size)
+    rounds = [[(0, min(RANGE_CHUNK_SIZE, size))]]
+    if end > RANGE_CHUNK_SIZE:
+        rounds.append([(RANGE_CHUNK_SIZE, end)])
+    return rounds
+
+
+def first_page_cost(path, latency, bandwidth):
+    """
+    Uppskattad tid till första sidan för en visare som läser med Range-förfrågningar i block.
+
+    Args:
+        latency (float): Rundresetid i sekunder
+        bandwidth (float): Bandbredd i byte per sekund
+
+    Returns:
+        dict: round_trips, bytes och seconds
+    """
+    size = os.path.getsize(path)
+    if linearize.is_linearized(path):
+        rounds = _linearized_rounds(path, size)
+    else:
+        rounds = _non_linearized_rounds(path, size)
+
+    fetched = set()
+    round_trips = 0
+    for round_ranges in rounds:
+        chunks = set()
+        for start, end in round_ranges:
+            chunks.update(range(start // RANGE_CHUNK_SIZE, (max(end, start + 1) - 1) // RANGE_CHUNK_SIZE + 1))
+        chunks -= fetched
+        if chunks:
+            round_trips += 1
+            fetched |= chunks
+    total = min(len(fetched) * RANGE_CHUNK_SIZE, size)
+    return {
+        'round_trips': round_trips,
+        'bytes': total,
+        'seconds': round(round_trips * latency + total / bandwidth, 4),
+    }
+
+
+def _render_seconds(path):
+    """Tid för att öppna PDF:en och rendera sida 1 lokalt med pdfium"""
+    from files.renditions import SIZES, open_pdf, RenditionError
+
+    started = time.perf_counter()
+    try:
+        pdf = open_pdf(path)
+    except RenditionError:
+        return None
+    try:
+        page = pdf[0]
+        page.render(scale=SIZES['large'] / max(*page.get_size(), 1)).to_pil()
+    finally:
+        pdf.close()
+    return round(time.perf_counter() - started, 4)
+
+
+class Command(BaseCommand):
+    help = 'Mäter tid till första sidan för PDF-filer före och efter linjärisering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_ids', nargs='*', type=int, help='Filer att mäta (standard: de största PDF:erna)')
+        parser.add_argument('--limit', type=int, default=10, help='Antal filer om inga id anges')
+        parser.add_argument('--latency', type=float, default=50, help='Rundresetid i millisekunder')
+        parser.add_argument('--bandwidth', type=float, default=20, help='Bandbredd i Mbit/s')
+        parser.add_argument('--json', action='store_true', help='Skriv resultatet som JSON')
+
+    def handle(self, *args, **options):
+        files = File.objects.filter(is_latest=True, file__iendswith='.pdf')
+        if options['file_ids']:
+            files = files.filter(id__in=options['file_ids'])
+        else:
+            files = files.order_by('-size')[:options['limit']]
+        if not files:
+            raise CommandError("Inga PDF-filer hittades")
+
+        latency = options['latency'] / 1000
+        bandwidth = options['bandwidth'] * 1_000_000 / 8
+        temp_dir = tempfile.mkdtemp()
+        results = []
+        try:
+            for file_obj in files:
+                sha256 = ensure_sha256(file_obj)
+                if not sha256:
+                    continue
+                original = file_obj.file.storage.local_path(file_obj.file.name)
+                if original is None:
+                    # Fjärrlagring: mät en lokal kopia av originalet
+                    original = os.path.join(temp_dir, f"{sha256}-original.pdf")
+                    file_obj.file.storage.download_to(file_obj.file.name, original)
+                optimized = linearize.optimized_path(sha256)
+                if not os.path.exists(optimized):
+                    # Mät även filer som ännu inte linjäriserats, utan att skriva till cachen
+                    optimized = os.path.join(temp_dir, f"{sha256}.pdf")
+                    if not linearize.write_linearized(original, optimized):
+                        continue
+                results.append({
+                    'id': file_obj.id,
+                    'name': file_obj.name,
+                    'size': os.path.getsize(original),
+                    'before': dict(first_page_cost(original, latency, bandwidth), render_seconds=_render_seconds(original)),
+                    'after': dict(first_page_cost(optimized, latency, bandwidth), render_seconds=_render_seconds(optimized)),
+                })
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            before, after = result['before'], result['after']
+            self.stdout.write(
+                f"{result['name']} ({result['size']} byte): "
+                f"{before['seconds']:.3f}s / {before['round_trips']} rundresor / {before['bytes']} byte -> "
+                f"{after['seconds']:.3f}s / {after['round_trips']} rundresor / {after['bytes']} byte"
+            )
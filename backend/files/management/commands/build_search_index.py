@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from files import search
+
+
+class Command(BaseCommand):
+    help = 'Indexerar namn, beskrivningar, kommentarer och PDF-text för fulltextsökning'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reextract',
+            action='store_true',
+            help='Extrahera om texten även för PDF:er som redan finns i indexet',
+        )
+
+    def handle(self, *args, **options):
+        counts = search.rebuild(reextract=options['reextract'])
+        for kind, count in sorted(counts.items()):
+            self.stdout.write(f"  {kind}: {count}")
+        self.stdout.write(self.style.SUCCESS("Sökindexet är uppdaterat"))
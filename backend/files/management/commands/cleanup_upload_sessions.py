@@ -0,0 +1,28 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from files.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Tar bort utgångna återupptagbara uppladdningar och deras temporära filer'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=settings.RESUMABLE_UPLOAD_EXPIRY_HOURS)
+        expired = UploadSession.objects.filter(file__isnull=True, updated_at__lt=cutoff)
+
+        removed = 0
+        for session in expired.iterator():
+            if os.path.exists(session.temp_path):
+                os.remove(session.temp_path)
+            removed += 1
+        expired.delete()
+
+        # Slutförda sessioner behövs inte längre när filen väl är skapad
+        finished = UploadSession.objects.filter(file__isnull=False, updated_at__lt=cutoff).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tog bort {removed} utgångna och {finished} slutförda uppladdningar"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from files.models import File
+from files.pdf_metadata import ensure_metadata
+
+
+class Command(BaseCommand):
+    help = 'Läser sidantal, sidstorlekar och bokmärken för befintliga PDF-filer som saknar dem'
+
+    def handle(self, *args, **options):
+        updated = failed = 0
+        for file_obj in File.objects.filter(page_count__isnull=True, file__iendswith='.pdf').iterator():
+            if ensure_metadata(file_obj):
+                updated += 1
+            else:
+                self.stderr.write(f"  {file_obj.name}: kunde inte läsas")
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Läste metadata för {updated} filer ({failed} misslyckades)"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from files import renditions
+from files.hashing import ensure_sha256
+from files.models import File
+from files.storage import local_copy
+
+
+class Command(BaseCommand):
+    help = 'Renderar förhandsbilder för befintliga PDF-filer som saknar dem'
+
+    def handle(self, *args, **options):
+        rendered = failed = 0
+        for file_obj in File.objects.filter(is_latest=True, file__iendswith='.pdf').iterator():
+            sha256 = ensure_sha256(file_obj)
+            if not sha256:
+                failed += 1
+                continue
+            try:
+                with local_copy(file_obj.file.name, file_obj.file.storage) as pdf_path:
+                    rendered += renditions.generate(sha256, pdf_path, settings.RENDITION_MAX_PAGES)
+            except (renditions.RenditionError, OSError) as e:
+                self.stderr.write(f"  {file_obj.name}: {str(e)}")
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"Renderade {rendered} sidor ({failed} filer misslyckades)"))
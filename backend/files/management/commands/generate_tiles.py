@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from files import renditions, tiles
+from files.hashing import ensure_sha256
+from files.models import File
+from files.storage import local_copy
+
+
+class Command(BaseCommand):
+    help = 'Bygger tile-pyramider för djupzoom av stora PDF-ritningar (kan återupptas om den avbryts)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_ids', nargs='+', type=int, help='Id för filerna som ska byggas')
+        parser.add_argument('--page', type=int, action='append', dest='pages',
+                            help='Bygg bara vissa sidor (kan anges flera gånger)')
+        parser.add_argument('--workers', type=int, help='Antal processer (standard TILE_WORKERS eller antal kärnor)')
+
+    def handle(self, *args, **options):
+        files = File.objects.filter(id__in=options['file_ids'])
+        if not files:
+            raise CommandError("Inga filer hittades")
+
+        for file_obj in files:
+            sha256 = ensure_sha256(file_obj)
+            if not sha256:
+                self.stderr.write(f"  {file_obj.name}: filen saknas på disken")
+                continue
+            try:
+                with local_copy(file_obj.file.name, file_obj.file.storage) as pdf_path:
+                    rendered = tiles.generate_pyramid(
+                        sha256, pdf_path, pages=options['pages'], workers=options['workers']
+                    )
+            except (renditions.RenditionError, OSError) as e:
+                self.stderr.write(f"  {file_obj.name}: {str(e)}")
+                continue
+            self.stdout.write(self.style.SUCCESS(f"{file_obj.name}: renderade {rendered} tile-block"))
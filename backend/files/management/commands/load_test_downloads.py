@@ -0,0 +1,144 @@
+import asyncio
+import json
+import ssl
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+
+# Block som varje långsam klient läser åt gången
+READ_SIZE = 16 * 1024
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * percent / 100))], 4)
+
+
+async def _open(url, timeout):
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+        timeout
+    )
+    target = parts.path or '/'
+    if parts.query:
+        target += f'?{parts.query}'
+    writer.write(
+        f'GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n'.encode('latin-1')
+    )
+    await writer.drain()
+    return reader, writer
+
+
+async def _slow_download(url, read_delay, timeout, stats):
+    """En klient som läser svaret långsamt, som en nedladdning över en dålig förbindelse"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await _open(url, timeout)
+    except (OSError, asyncio.TimeoutError):
+        stats['errors'] += 1
+        return
+    try:
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        stats['first_byte'].append(time.perf_counter() - started)
+        if b' 200 ' not in status_line and b' 206 ' not in status_line:
+            stats['errors'] += 1
+            return
+        while True:
+            data = await asyncio.wait_for(reader.read(READ_SIZE), timeout)
+            if not data:
+                break
+            stats['bytes'] += len(data)
+            await asyncio.sleep(read_delay)
+        stats['completed'] += 1
+    except (OSError, asyncio.TimeoutError):
+        stats['errors'] += 1
+    finally:
+        writer.close()
+
+
+async def _probe(url, timeout, stop, latencies):
+    """Snabba förfrågningar under lasten: hur länge får en ny besökare vänta på servern?"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            reader, writer = await _open(url, timeout)
+            await asyncio.wait_for(reader.read(), timeout)
+            writer.close()
+            latencies.append(time.perf_counter() - started)
+        except (OSError, asyncio.TimeoutError):
+            latencies.append(timeout)
+        await asyncio.sleep(0.2)
+
+
+async def run_load_test(url, concurrency, read_delay, probe_url, timeout):
+    """
+    Starta concurrency samtidiga långsamma nedladdningar av url och mät
+    samtidigt svarstiden för probe_url.
+
+    Returns:
+        dict: completed, errors, bytes, seconds, first_byte_p50/p95 och probe_p50/p95 (sekunder)
+    """
+    stats = {'completed': 0, 'errors': 0, 'bytes': 0, 'first_byte': []}
+    latencies = []
+    stop = asyncio.Event()
+    started = time.perf_counter()
+    probe = asyncio.create_task(_probe(probe_url, timeout, stop, latencies))
+    await asyncio.gather(*(_slow_download(url, read_delay, timeout, stats) for _ in range(concurrency)))
+    stop.set()
+    await probe
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'completed': stats['completed'],
+        'errors': stats['errors'],
+        'bytes': stats['bytes'],
+        'seconds': round(time.perf_counter() - started, 3),
+        'first_byte_p50': _percentile(stats['first_byte'], 50),
+        'first_byte_p95': _percentile(stats['first_byte'], 95),
+        'probe_p50': _percentile(latencies, 50),
+        'probe_p95': _percentile(latencies, 95),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Lasttest med många samtidiga långsamma nedladdningar mot en körande server, '
+        't.ex. en asynkron fil-URL under uvicorn jämfört med samma fil via en synkron vy eller gunicorn'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Fil-URL:er att testa, var och en för sig')
+        parser.add_argument('--concurrency', type=int, default=500, help='Samtidiga nedladdningar')
+        parser.add_argument('--read-delay', type=float, default=0.05,
+                            help='Sekunder mellan varje läst block om 16 KiB (långsam klient)')
+        parser.add_argument('--probe-url', help='URL som mäts under lasten (standard: /api/status/ på samma server)')
+        parser.add_argument('--timeout', type=float, default=60, help='Timeout per läsning i sekunder')
+        parser.add_argument('--json', action='store_true', help='Skriv resultatet som JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise CommandError(f"Ogiltig URL: {url}")
+            probe_url = options['probe_url'] or f"{parts.scheme}://{parts.netloc}/api/status/"
+            results.append(asyncio.run(run_load_test(
+                url, options['concurrency'], options['read_delay'], probe_url, options['timeout']
+            )))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f"{result['url']}: {result['completed']}/{result['concurrency']} klara, "
+                f"{result['errors']} fel, {result['seconds']}s, "
+                f"första byte p50/p95 {result['first_byte_p50']}/{result['first_byte_p95']}s, "
+                f"svarstid under last p50/p95 {result['probe_p50']}/{result['probe_p95']}s"
+            )
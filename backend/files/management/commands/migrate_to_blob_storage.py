@@ -0,0 +1,79 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from files import file_index
+from files.hashing import hash_path
+from files.models import File
+from files.storage import blob_name, blob_storage, is_blob_name, acquire_blob
+from workspace.models import FileVersion, PDFDocument
+
+
+class Command(BaseCommand):
+    help = 'Flyttar befintliga filer till den innehållsadresserade lagringen och slår ihop dubbletter'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Visa vad som skulle flyttas utan att ändra något',
+        )
+
+    def handle(self, *args, **options):
+        if blob_storage.local_path('') is None:
+            raise CommandError("Flytten görs på disk och kräver FILE_STORAGE_DRIVER='local'")
+        dry_run = options['dry_run']
+        moved = 0
+        saved_bytes = 0
+        # Gamla sökvägar som redan flyttats: namn -> (blob, sha256, storlek)
+        migrated = {}
+
+        for model in (File, FileVersion, PDFDocument):
+            rows = model.objects.exclude(file='').exclude(file__isnull=True).values_list('pk', 'file')
+            for pk, name in rows.iterator():
+                if is_blob_name(name):
+                    continue
+                if name in migrated:
+                    # Flera rader pekade på samma gamla fil
+                    target, sha256, size = migrated[name]
+                    if not dry_run:
+                        with transaction.atomic():
+                            model.objects.filter(pk=pk).update(file=target, sha256=sha256)
+                            acquire_blob(target, size)
+                    continue
+                path = blob_storage.path(name)
+                if not os.path.isfile(path):
+                    self.stdout.write(self.style.WARNING(f"  Saknas på disk: {name}"))
+                    continue
+
+                sha256 = hash_path(path)
+                size = os.path.getsize(path)
+                target = blob_name(sha256, os.path.splitext(name)[1])
+                duplicate = blob_storage.exists(target)
+                migrated[name] = (target, sha256, size)
+                self.stdout.write(f"  {name} -> {target}{' (dubblett)' if duplicate else ''}")
+                if dry_run:
+                    continue
+
+                if duplicate:
+                    saved_bytes += size
+                else:
+                    os.makedirs(os.path.dirname(blob_storage.path(target)), exist_ok=True)
+                    os.replace(path, blob_storage.path(target))
+
+                with transaction.atomic():
+                    # update() så att updated_at och signalerna inte påverkas
+                    model.objects.filter(pk=pk).update(file=target, sha256=sha256)
+                    acquire_blob(target, size)
+
+                # Dubbletten behövs inte längre när raden pekar på bloben
+                if duplicate and os.path.exists(path):
+                    os.remove(path)
+                moved += 1
+
+        if moved and not dry_run:
+            # Sökvägarna har ändrats, så indexet byggs om från grunden
+            file_index.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Flyttade {moved} filer till blob-lagringen, {saved_bytes} byte frigjorda genom deduplicering"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from files import file_index
+
+
+class Command(BaseCommand):
+    help = 'Bygger om indexet filnamn -> lagringssökväg från databasen och media-katalogen'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-disk',
+            action='store_true',
+            help='Hoppa över genomsökningen av disken och indexera endast kända filer i databasen',
+        )
+
+    def handle(self, *args, **options):
+        counts = file_index.rebuild(crawl_disk=not options['no_disk'])
+        total = sum(counts.values())
+        for source, count in sorted(counts.items()):
+            self.stdout.write(f"  {source}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Filindexet innehåller nu {total} sökvägar"))
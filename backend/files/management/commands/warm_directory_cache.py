@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from files import directory_cache
+
+
+class Command(BaseCommand):
+    help = 'Förberäknar mappsidans data för de mest besökta mapparna, t.ex. efter en deploy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Antal mappar som förberäknas')
+        parser.add_argument('--project', type=int, help='Bara mappar i detta projekt')
+
+    def handle(self, *args, **options):
+        warmed = directory_cache.warm(options['limit'], options['project'])
+        self.stdout.write(self.style.SUCCESS(f"Förberäknade data för {warmed} mappar"))
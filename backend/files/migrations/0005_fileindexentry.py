@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_auto_20250521_2120'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(db_index=True, max_length=255)),
+                ('storage_path', models.CharField(max_length=500, unique=True)),
+                ('source', models.CharField(choices=[('file', 'File'), ('file_version', 'FileVersion'), ('pdf_document', 'PDFDocument'), ('disk', 'Disk')], default='disk', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'File index entries',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:47
+
+import files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('storage_name', models.CharField(max_length=500, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(storage=files.storage.ContentAddressedStorage(), upload_to='project_files/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='fileindexentry',
+            name='storage_path',
+            field=models.CharField(db_index=True, max_length=500),
+        ),
+        migrations.AlterUniqueTogether(
+            name='fileindexentry',
+            unique_together={('filename', 'storage_path')},
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+def build_tree_paths(apps, schema_editor):
+    """Fyll i tree_path och depth för befintliga mappar, nivå för nivå från roten"""
+    Directory = apps.get_model('files', 'Directory')
+    children = {}
+    for directory_id, parent_id in Directory.objects.values_list('id', 'parent_id'):
+        children.setdefault(parent_id, []).append(directory_id)
+
+    queue = [(directory_id, f"/{directory_id}/", 0) for directory_id in children.get(None, [])]
+    while queue:
+        directory_id, tree_path, depth = queue.pop()
+        Directory.objects.filter(id=directory_id).update(tree_path=tree_path, depth=depth)
+        for child_id in children.get(directory_id, []):
+            queue.append((child_id, f"{tree_path}{child_id}/", depth + 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='directory',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='directory',
+            name='tree_path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=1000),
+        ),
+        migrations.RunPython(build_tree_paths, migrations.RunPython.noop),
+    ]
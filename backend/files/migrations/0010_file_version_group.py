@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:55
+
+import uuid
+from django.db import migrations, models
+
+
+def build_version_groups(apps, schema_editor):
+    """Ge varje befintlig versionskedja en egen version_group, från kedjans första version"""
+    File = apps.get_model('files', 'File')
+    previous = dict(File.objects.values_list('id', 'previous_version_id'))
+
+    roots = {}
+
+    def root_of(file_id):
+        chain = []
+        while file_id not in roots and previous.get(file_id) is not None and file_id not in chain:
+            chain.append(file_id)
+            file_id = previous[file_id]
+        root = roots.get(file_id, file_id)
+        for item in chain + [file_id]:
+            roots[item] = root
+        return root
+
+    groups = {}
+    for file_id in previous:
+        groups.setdefault(root_of(file_id), []).append(file_id)
+
+    for file_ids in groups.values():
+        File.objects.filter(id__in=file_ids).update(version_group=uuid.uuid4())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_directory_tree_path'),
+    ]
+
+    operations = [
+        # Läggs till som nullable först, annars får alla befintliga rader samma uuid
+        migrations.AddField(
+            model_name='file',
+            name='version_group',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(build_version_groups, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='file',
+            name='version_group',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['version_group', 'version'], name='files_file_version_group_idx'),
+        ),
+    ]
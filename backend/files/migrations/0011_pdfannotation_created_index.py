@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('files', '0010_file_version_group'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdfannotation',
+            index=models.Index(fields=['file', 'created_at'], name='files_annotation_created_idx'),
+        ),
+    ]
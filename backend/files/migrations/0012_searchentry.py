@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_pdfannotation_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('page', 'PDF-sida'), ('file', 'File'), ('pdf_document', 'PDFDocument'), ('annotation', 'PDFAnnotation')], max_length=20)),
+                ('key', models.CharField(max_length=64)),
+                ('page_number', models.PositiveIntegerField(default=0)),
+                ('text', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Search entries',
+                'unique_together': {('kind', 'key', 'page_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0012_searchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='pdf_metadata',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:46
+
+import files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0013_file_pdf_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(storage=files.storage.get_blob_storage, upload_to='project_files/%Y/%m/%d/'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+FTS_TABLE = 'files_searchentry_fts'
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='files_searchentry', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS files_searchentry_ai AFTER INSERT ON files_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS files_searchentry_ad AFTER DELETE ON files_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS files_searchentry_au AFTER UPDATE ON files_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    # Indexera rader som redan finns i SearchEntry
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS files_searchentry_ai",
+    "DROP TRIGGER IF EXISTS files_searchentry_ad",
+    "DROP TRIGGER IF EXISTS files_searchentry_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE files_searchentry ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED",
+    "CREATE INDEX IF NOT EXISTS files_searchentry_vector_idx ON files_searchentry USING GIN (search_vector)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS files_searchentry_vector_idx",
+    "ALTER TABLE files_searchentry DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def install_fulltext(apps, schema_editor):
+    """FTS5-tabell med triggers (SQLite) eller tsvector-kolumn med GIN-index (PostgreSQL)"""
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def remove_fulltext(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0014_file_storage_driver'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_fulltext, remove_fulltext),
+    ]
@@ -1,8 +1,14 @@
-from django.db import models
+import os
+import uuid
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils.text import slugify
 from django.urls import reverse
 from core.models import Project
+from .storage import get_blob_storage
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -21,6 +27,11 @@ class Directory(models.Model):
     page_description = models.TextField(blank=True, null=True)
     has_page = models.BooleanField(default=True)  # Om en webbsida ska skapas för mappen
     
+    # Materialiserad sökväg med id:n från roten till och med mappen själv, t.ex. "/1/5/12/".
+    # Gör att hela delträd kan hämtas, räknas och raderas med tree_path__startswith.
+    tree_path = models.CharField(max_length=1000, db_index=True, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)  # 0 för mappar utan förälder
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -45,16 +56,98 @@ class Directory(models.Model):
                 self.page_title = self.name
         
         # Fortsätt med normal save
+        parent_path = self._parent_tree_path()
+        if self.parent_id and self.tree_path and parent_path.startswith(self.tree_path):
+            raise ValidationError("En mapp kan inte flyttas in i sin egen undermapp.")
         super(Directory, self).save(*args, **kwargs)
+        self._update_tree_path(parent_path)
+    
+    def _parent_tree_path(self):
+        if not self.parent_id:
+            return '/'
+        return Directory.objects.filter(id=self.parent_id).values_list('tree_path', flat=True).first() or '/'
+    
+    def _update_tree_path(self, parent_path=None):
+        """
+        Håll tree_path och depth uppdaterade för mappen och, vid flytt,
+        för alla undermappar (en update-fråga oavsett delträdets storlek).
+        """
+        if parent_path is None:
+            parent_path = self._parent_tree_path()
+        new_path = f"{parent_path}{self.id}/"
+        if new_path == self.tree_path:
+            return
+        
+        old_path = self.tree_path
+        new_depth = new_path.count('/') - 2
+        
+        with transaction.atomic():
+            Directory.objects.filter(id=self.id).update(tree_path=new_path, depth=new_depth)
+            if old_path:
+                # Flytta hela delträdet: byt ut prefixet på alla undermappars sökväg
+                Directory.objects.filter(tree_path__startswith=old_path).exclude(id=self.id).update(
+                    tree_path=Concat(Value(new_path), Substr('tree_path', len(old_path) + 1)),
+                    depth=F('depth') + (new_depth - self.depth)
+                )
+        self.tree_path = new_path
+        self.depth = new_depth
+    
+    def _require_tree_path(self):
+        """Säkerställ att tree_path är satt innan den används för att avgränsa ett delträd"""
+        if not self.tree_path and self.id:
+            self._update_tree_path()
     
     def __str__(self):
         return self.name
     
+    def get_ancestor_ids(self):
+        """Id:n för alla överordnade mappar, från roten och nedåt"""
+        return [int(part) for part in self.tree_path.strip('/').split('/')[:-1] if part]
+    
+    def get_ancestors(self):
+        """Alla överordnade mappar (en fråga), från roten och nedåt"""
+        ancestors = {directory.id: directory for directory in Directory.objects.filter(id__in=self.get_ancestor_ids())}
+        return [ancestors[directory_id] for directory_id in self.get_ancestor_ids() if directory_id in ancestors]
+    
+    def get_descendants(self, include_self=False):
+        """Alla undermappar på alla nivåer (en fråga)"""
+        self._require_tree_path()
+        queryset = Directory.objects.filter(tree_path__startswith=self.tree_path)
+        if not include_self:
+            queryset = queryset.exclude(id=self.id)
+        return queryset
+    
+    def get_subtree_files(self):
+        """Alla filer i mappen och dess undermappar (en fråga)"""
+        self._require_tree_path()
+        return File.objects.filter(directory__tree_path__startswith=self.tree_path)
+    
+    def delete_subtree(self):
+        """
+        Radera mappen med alla undermappar och filer.
+        Filerna raderas via ORM:en så att signalerna (filindex, blob-referenser) körs.
+        
+        Returns:
+            tuple: (antal raderade mappar, antal raderade filer)
+        """
+        with transaction.atomic():
+            files = self.get_subtree_files()
+            deleted_files = files.count()
+            files.delete()
+            
+            # Avmarkera is_sidebar_item före radering så att mapparna försvinner ur sidomenyn
+            subtree = self.get_descendants(include_self=True)
+            subtree.update(is_sidebar_item=False)
+            deleted_directories = subtree.count()
+            subtree.delete()
+        return deleted_directories, deleted_files
+    
     def get_path(self):
         """Return the full path of the directory"""
-        if self.parent:
-            return f"{self.parent.get_path()}/{self.name}"
-        return self.name
+        self._require_tree_path()
+        names = [directory.name for directory in self.get_ancestors()]
+        names.append(self.name)
+        return '/'.join(names)
         
     def get_absolute_url(self):
         """Returnera URL:en till mappsidan"""
@@ -65,24 +158,43 @@ class Directory(models.Model):
         return self.files.filter(
             content_type='application/pdf',
             is_latest=True
-        )
+        ).select_related('uploaded_by')
 
 class File(models.Model):
     """File model for storing file data with versioning"""
     name = models.CharField(max_length=255)
     directory = models.ForeignKey(Directory, on_delete=models.CASCADE, related_name='files', null=True, blank=True)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='files')
-    file = models.FileField(upload_to='project_files/%Y/%m/%d/')
+    file = models.FileField(upload_to='project_files/%Y/%m/%d/', storage=get_blob_storage)
     content_type = models.CharField(max_length=100)
     size = models.BigIntegerField()  # Size in bytes
     version = models.PositiveIntegerField(default=1)
     previous_version = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='next_versions')
     is_latest = models.BooleanField(default=True)
+    # Gemensam nyckel för alla versioner av samma fil, så att historiken hämtas med en fråga
+    version_group = models.UUIDField(default=uuid.uuid4, editable=False)
+    sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)  # Innehållshash, används som ETag
     description = models.TextField(blank=True, null=True)  # Beskrivning av filen, visas på mappsidan
+    # Sidantal, sidstorlekar, bokmärken m.m. som läses vid uppladdning (se files.pdf_metadata)
+    page_count = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    pdf_metadata = models.JSONField(default=dict, blank=True, editable=False)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploaded_files')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['version_group', 'version'], name='files_file_version_group_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        """En ny version ärver versionsgruppen från den version den ersätter"""
+        if self._state.adding and self.previous_version_id:
+            group = File.objects.filter(id=self.previous_version_id).values_list('version_group', flat=True).first()
+            if group:
+                self.version_group = group
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.name
     
@@ -101,15 +213,140 @@ class File(models.Model):
         if self.file:
             return self.file.url
         return None
+    
+    def get_thumbnail_url(self, size='medium', page=1):
+        """Returnera URL:en till en förhandsbild av en sida"""
+        from .rendition_api import thumbnail_url
+        return thumbnail_url(self.id, self.sha256, page, size)
+    
+    def get_versions(self):
+        """Alla versioner av filen, äldst först (en fråga)"""
+        return File.objects.filter(version_group=self.version_group).order_by('version', 'created_at')
+    
+    def get_latest_version(self):
+        """Returnera den senaste versionen av filen (en fråga)"""
+        return File.objects.filter(version_group=self.version_group).order_by('-version', '-created_at').first() or self
 
 
 # Signal för att uppdatera tidigare versioners is_latest-flagga när ny version skapas
 @receiver(post_save, sender=File)
 def update_previous_version_is_latest(sender, instance, **kwargs):
-    if instance.previous_version and instance.is_latest:
-        # Om denna fil är den senaste versionen, sätt is_latest=False på alla tidigare versioner
-        instance.previous_version.is_latest = False
-        instance.previous_version.save()
+    if instance.previous_version_id and instance.is_latest:
+        # Om denna fil är den senaste versionen, sätt is_latest=False på alla tidigare versioner (en update-fråga)
+        File.objects.filter(
+            version_group=instance.version_group,
+            is_latest=True
+        ).exclude(id=instance.id).update(is_latest=False)
+
+
+class Blob(models.Model):
+    """
+    En fil i den innehållsadresserade lagringen (se files.storage).
+    ref_count är antalet File-, FileVersion- och PDFDocument-rader som pekar på filen.
+    """
+    sha256 = models.CharField(max_length=64, db_index=True)
+    storage_name = models.CharField(max_length=500, unique=True)  # blobs/ab/cd/<sha256>.pdf
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.storage_name} ({self.ref_count} referenser)"
+
+
+class FileIndexEntry(models.Model):
+    """
+    Index från filnamn till lagringssökväg.
+    Ersätter rekursiva glob-sökningar i MEDIA_ROOT vid uppslagning av PDF-filer.
+    """
+    SOURCE_FILE = 'file'
+    SOURCE_FILE_VERSION = 'file_version'
+    SOURCE_PDF_DOCUMENT = 'pdf_document'
+    SOURCE_DISK = 'disk'
+
+    SOURCE_CHOICES = (
+        (SOURCE_FILE, 'File'),
+        (SOURCE_FILE_VERSION, 'FileVersion'),
+        (SOURCE_PDF_DOCUMENT, 'PDFDocument'),
+        (SOURCE_DISK, 'Disk'),
+    )
+
+    filename = models.CharField(max_length=255, db_index=True)  # Basnamn, t.ex. ritning.pdf
+    storage_path = models.CharField(max_length=500, db_index=True)  # Relativ MEDIA_ROOT (eller absolut)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default=SOURCE_DISK)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'File index entries'
+        unique_together = ('filename', 'storage_path')  # Blobs indexeras även under visningsnamnet
+
+    def __str__(self):
+        return f"{self.filename} -> {self.storage_path}"
+
+
+class SearchEntry(models.Model):
+    """
+    Text som fulltextindexeras, se files.search.
+
+    PDF-text lagras per sida och nyckel är filens sha256, så att samma innehåll
+    bara extraheras och indexeras en gång oavsett hur många filer som pekar på
+    det. Namn, beskrivningar och kommentarer lagras som en rad per objekt.
+    """
+    KIND_PAGE = 'page'
+    KIND_FILE = 'file'
+    KIND_PDF_DOCUMENT = 'pdf_document'
+    KIND_ANNOTATION = 'annotation'
+
+    KIND_CHOICES = (
+        (KIND_PAGE, 'PDF-sida'),
+        (KIND_FILE, 'File'),
+        (KIND_PDF_DOCUMENT, 'PDFDocument'),
+        (KIND_ANNOTATION, 'PDFAnnotation'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    key = models.CharField(max_length=64)  # sha256 för sidor, annars objektets id
+    page_number = models.PositiveIntegerField(default=0)  # 1-baserat för sidor, 0 för övriga
+    text = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Search entries'
+        unique_together = ('kind', 'key', 'page_number')
+
+    def __str__(self):
+        return f"{self.kind}:{self.key} ({self.page_number})"
+
+
+class UploadSession(models.Model):
+    """
+    Pågående återupptagbar uppladdning (tus 1.0.0).
+    Byten skrivs till en temporär fil och File-objektet skapas först vid finalize.
+    """
+    upload_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    filename = models.CharField(max_length=255)  # Ursprungligt filnamn från Upload-Metadata
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default='')
+    directory = models.ForeignKey(Directory, on_delete=models.CASCADE, related_name='upload_sessions')
+    length = models.BigIntegerField()  # Upload-Length i byte
+    offset = models.BigIntegerField(default=0)  # Antal mottagna byte
+    sha256 = models.CharField(max_length=64, blank=True, default='')  # Sätts vid finalize
+    file = models.OneToOneField(File, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.length
+
+    @property
+    def temp_path(self):
+        """Sökväg till den temporära filen som byten skrivs till"""
+        return os.path.join(settings.RESUMABLE_UPLOAD_DIR, f"{self.upload_id}.part")
 
 
 class PDFAnnotation(models.Model):
@@ -150,6 +387,9 @@ class PDFAnnotation(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['file', 'created_at'], name='files_annotation_created_idx'),
+        ]
     
     def __str__(self):
         return f"Annotation på {self.file.name} (sida {self.page_number})"
@@ -0,0 +1,176 @@
+"""
+Strukturell metadata för PDF-filer.
+
+Sidantal, sidstorlekar (mediabox/cropbox och rotation), bokmärken och
+producentinformation läses en gång när filen laddas upp (pre_save) och
+sparas på File. Klienter kan då lägga upp sidorna utan att först hämta och
+tolka PDF:en, och annotationers sidnummer och koordinater kan valideras
+utan att filen öppnas.
+
+Format för File.pdf_metadata:
+
+    {
+        "version": "1.7", "producer": "...", "creator": "...", "title": "...",
+        "pages": [{"width": 595.3, "height": 841.9, "rotation": 0,
+                   "media_box": [0, 0, 595.3, 841.9], "crop_box": [...]}, ...],
+        "outline": [{"title": "Plan 1", "page": 1, "children": [...]}, ...]
+    }
+
+width och height är den synliga sidans storlek i punkter efter rotation,
+alltså samma koordinatsystem som annotationer ritas i.
+"""
+import logging
+from .storage import local_copy
+
+logger = logging.getLogger(__name__)
+
+# Max antal bokmärken som sparas, så att en PDF med enorma innehållsförteckningar inte blåser upp raden
+MAX_OUTLINE_ITEMS = 500
+
+# Tolerans i punkter när annotationens koordinater jämförs med sidans storlek
+COORDINATE_TOLERANCE = 1.0
+
+
+def _box(box):
+    return [round(float(value), 2) for value in (box.left, box.bottom, box.right, box.top)]
+
+
+def _page_info(page):
+    crop_box = _box(page.cropbox)
+    width = round(crop_box[2] - crop_box[0], 2)
+    height = round(crop_box[3] - crop_box[1], 2)
+    rotation = (page.rotation or 0) % 360
+    if rotation in (90, 270):
+        width, height = height, width
+    return {
+        'width': width,
+        'height': height,
+        'rotation': rotation,
+        'media_box': _box(page.mediabox),
+        'crop_box': crop_box,
+    }
+
+
+def _outline(reader, items, budget):
+    """Bokmärkesträdet med sidnummer (1-baserade), högst budget[0] poster totalt"""
+    result = []
+    for item in items:
+        if budget[0] <= 0:
+            break
+        if isinstance(item, list):
+            # En lista efter ett bokmärke är dess underrubriker
+            if result:
+                result[-1]['children'] = _outline(reader, item, budget)
+            continue
+        try:
+            page_index = reader.get_destination_page_number(item)
+        except Exception:
+            page_index = None
+        budget[0] -= 1
+        result.append({
+            'title': str(getattr(item, 'title', '') or ''),
+            'page': page_index + 1 if page_index is not None and page_index >= 0 else None,
+            'children': [],
+        })
+    return result
+
+
+def extract(source):
+    """
+    Läs strukturell metadata ur en PDF.
+
+    Args:
+        source: Sökväg eller öppen, sökbar binär ström
+
+    Returns:
+        dict: Metadata enligt formatet ovan, eller None om filen inte går att läsa
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf är inte installerat, PDF-metadata läses inte")
+        return None
+
+    try:
+        reader = PdfReader(source)
+        info = reader.metadata or {}
+        metadata = {
+            'version': reader.pdf_header.replace('%PDF-', ''),
+            'producer': str(info.get('/Producer', '') or ''),
+            'creator': str(info.get('/Creator', '') or ''),
+            'title': str(info.get('/Title', '') or ''),
+            'pages': [_page_info(page) for page in reader.pages],
+        }
+        try:
+            metadata['outline'] = _outline(reader, reader.outline, [MAX_OUTLINE_ITEMS])
+        except Exception as e:
+            # Trasiga bokmärken ska inte hindra att sidorna sparas
+            logger.warning(f"Kunde inte läsa bokmärken: {str(e)}")
+            metadata['outline'] = []
+        return metadata
+    except Exception as e:
+        logger.warning(f"Kunde inte läsa PDF-metadata: {str(e)}")
+        return None
+
+
+def set_upload_metadata(instance):
+    """
+    Läs metadata för en ny eller nyss uppladdad PDF (anropas i pre_save).
+    Filer som redan har metadata läses inte om.
+    """
+    field_file = instance.file
+    if instance.page_count is not None or not field_file or not field_file.name.lower().endswith('.pdf'):
+        return
+
+    if not getattr(field_file, '_committed', True):
+        # Uppladdningen är inte skriven till lagringen än, läs från strömmen och spola tillbaka
+        field_file.seek(0)
+        metadata = extract(field_file.file)
+        field_file.seek(0)
+    elif instance._state.adding:
+        try:
+            with local_copy(field_file.name, field_file.storage) as path:
+                metadata = extract(path)
+        except (OSError, ValueError):
+            return
+    else:
+        return
+
+    if metadata is not None:
+        instance.page_count = len(metadata['pages'])
+        instance.pdf_metadata = metadata
+
+
+def ensure_metadata(instance):
+    """
+    Läs och spara metadata för en befintlig fil som saknar den.
+    Värdet sparas med update() så att updated_at och signaler inte påverkas.
+    """
+    if instance.page_count is not None:
+        return True
+    try:
+        with local_copy(instance.file.name, instance.file.storage) as path:
+            metadata = extract(path)
+    except (OSError, ValueError):
+        return False
+    if metadata is None:
+        return False
+
+    instance.page_count = len(metadata['pages'])
+    instance.pdf_metadata = metadata
+    type(instance).objects.filter(pk=instance.pk).update(
+        page_count=instance.page_count, pdf_metadata=metadata
+    )
+    # update() skickar inga signaler, så mappsidans cachade sidstorlekar rensas här
+    if getattr(instance, 'directory_id', None):
+        from .directory_cache import invalidate
+        invalidate(instance.directory_id)
+    return True
+
+
+def page_size(instance, page_number):
+    """Synlig storlek (bredd, höjd) i punkter för en sida, eller None om den är okänd"""
+    pages = (instance.pdf_metadata or {}).get('pages') or []
+    if 1 <= page_number <= len(pages):
+        return pages[page_number - 1]['width'], pages[page_number - 1]['height']
+    return None
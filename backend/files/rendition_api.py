@@ -0,0 +1,130 @@
+import os
+from contextlib import contextmanager
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from .delivery import serve_file, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from .hashing import ensure_sha256
+from .models import File
+from .storage import local_copy
+from . import renditions, tiles
+
+# Antal tecken av sha256 som används som cache-nyckel (?v=) i URL:en
+VERSION_KEY_LENGTH = 12
+
+
+def thumbnail_url(file_id, sha256, page=1, size='medium'):
+    """
+    URL till en förhandsbild. Med filens hash i ?v= kan svaret cachas som
+    oföränderligt, eftersom en ny uppladdning ger en ny URL.
+    """
+    url = reverse('file_rendition', args=[file_id, page, size])
+    return f"{url}?v={sha256[:VERSION_KEY_LENGTH]}" if sha256 else url
+
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([AllowAny])
+def file_rendition(request, file_id, page, size):
+    """
+    Förhandsbild (WebP) av en sida i en PDF-fil.
+    Bilden hämtas från cachen och renderas om den saknas.
+    """
+    file_obj = get_object_or_404(File, id=file_id)
+    if size not in renditions.SIZES:
+        return Response({"error": f"Okänd storlek, välj en av: {', '.join(renditions.SIZES)}"}, status=400)
+
+    sha256 = ensure_sha256(file_obj)
+    if not sha256 or not _exists(file_obj.file):
+        return Response({"error": "Filen hittades inte på disken"}, status=404)
+
+    try:
+        with _local_pdf(file_obj.file, renditions.rendition_path(sha256, page, size)) as pdf_path:
+            path = renditions.get_or_render(sha256, pdf_path, page, size)
+    except renditions.RenditionError as e:
+        return Response({"error": str(e)}, status=404)
+
+    return _cached_image_response(request, path, f'"{sha256}-{page}-{size}"', sha256)
+
+
+def _cached_image_response(request, path, etag, sha256):
+    """Leverera en bild ur renderingscachen, oföränderlig om URL:en har rätt ?v="""
+    response = serve_file(request, path, content_type=renditions.CONTENT_TYPE, etag=etag)
+    pinned = request.query_params.get('v') == sha256[:VERSION_KEY_LENGTH]
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if pinned else REVALIDATE_CACHE_CONTROL
+    return response
+
+
+def _exists(field_file):
+    return bool(field_file) and field_file.storage.exists(field_file.name)
+
+
+@contextmanager
+def _local_pdf(field_file, cached_path):
+    """
+    Sökväg till PDF:en på disk för rendering, eller None om resultatet redan
+    finns i cachen. Med en fjärrlagring hämtas filen alltså bara vid cachemiss.
+    """
+    if os.path.exists(cached_path):
+        yield None
+        return
+    with local_copy(field_file.name, field_file.storage) as path:
+        yield path
+
+
+def _tile_source(source, object_id):
+    """Filen eller PDF-dokumentet som tiles hämtas för, med sha256 och det lagrade filfältet"""
+    from workspace.models import PDFDocument
+
+    model = PDFDocument if source == 'pdf-documents' else File
+    instance = get_object_or_404(model, id=object_id)
+    return ensure_sha256(instance), instance.file
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def tile_info(request, object_id, page, source='files'):
+    """
+    Tile-pyramidens geometri för en sida (bredd, höjd, tile_size, max_zoom och
+    antal tiles per nivå) samt en URL-mall för tiles som {z}/{x}/{y}.
+    """
+    sha256, field_file = _tile_source(source, object_id)
+    if not sha256 or not _exists(field_file):
+        return Response({"error": "Filen hittades inte på disken"}, status=404)
+    try:
+        with _local_pdf(field_file, tiles._info_path(sha256, page)) as pdf_path:
+            layout = tiles.get_layout(sha256, pdf_path, page)
+    except renditions.RenditionError as e:
+        return Response({"error": str(e)}, status=404)
+
+    name = 'pdf_document_tile' if source == 'pdf-documents' else 'file_tile'
+    # build_absolute_uri kodar om klamrar, så platshållarna sätts in efteråt
+    template = request.build_absolute_uri(reverse(name, args=[object_id, page, 0, 0, 0]))
+    template = template[:-len('0/0/0/')] + '{z}/{x}/{y}/'
+    return Response({
+        'width': layout['width'],
+        'height': layout['height'],
+        'tile_size': layout['tile_size'],
+        'max_zoom': layout['max_zoom'],
+        'levels': [
+            {'width': level['width'], 'height': level['height'], 'columns': level['columns'], 'rows': level['rows']}
+            for level in layout['levels']
+        ],
+        'tile_url': f"{template}?v={sha256[:VERSION_KEY_LENGTH]}",
+    })
+
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([AllowAny])
+def tile(request, object_id, page, z, x, y, source='files'):
+    """En tile (WebP) ur sidans pyramid, renderas om den saknas i cachen"""
+    sha256, field_file = _tile_source(source, object_id)
+    if not sha256 or not _exists(field_file):
+        return Response({"error": "Filen hittades inte på disken"}, status=404)
+    try:
+        with _local_pdf(field_file, tiles.tile_path(sha256, page, z, x, y)) as pdf_path:
+            path = tiles.get_or_render_tile(sha256, pdf_path, page, z, x, y)
+    except renditions.RenditionError as e:
+        return Response({"error": str(e)}, status=404)
+    return _cached_image_response(request, path, f'"{sha256}-{page}-{z}-{x}-{y}"', sha256)
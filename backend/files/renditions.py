@@ -0,0 +1,163 @@
+"""
+Förhandsbilder (renditions) av PDF-sidor.
+
+Miniatyrer renderas med pypdfium2 och sparas i en cache under
+RENDITION_CACHE_DIR, nycklad på filens sha256:
+
+    <RENDITION_CACHE_DIR>/<ab>/<sha256>/p<sida>-<storlek>.webp
+
+Samma innehåll renderas alltså bara en gång oavsett hur många filer eller
+versioner som pekar på det, och en cachad bild blir aldrig inaktuell. Efter
+uppladdning renderas första sidan i alla storlekar och övriga sidor i den
+minsta storleken. Saknas en bild när den efterfrågas renderas den direkt.
+"""
+import logging
+import os
+import shutil
+import tempfile
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Längsta sida i pixlar för varje storlek
+SIZES = {
+    'small': 160,
+    'medium': 320,
+    'large': 800,
+}
+
+# Storlek som renderas för alla sidor direkt efter uppladdning
+PAGE_SIZE = 'small'
+
+FORMAT = 'webp'
+CONTENT_TYPE = 'image/webp'
+
+
+class RenditionError(Exception):
+    """Sidan kunde inte renderas (saknad fil, ogiltig sida eller trasig PDF)"""
+
+
+def cache_dir(sha256):
+    """Katalog med alla renderingar (miniatyrer, tiles) av ett innehåll"""
+    return os.path.join(settings.RENDITION_CACHE_DIR, sha256[:2], sha256)
+
+
+def rendition_path(sha256, page, size):
+    """Sökväg i cachen för en sida (1-baserad) i en viss storlek"""
+    return os.path.join(cache_dir(sha256), f"p{page}-{size}.{FORMAT}")
+
+
+def open_pdf(pdf_path):
+    try:
+        import pypdfium2
+    except ImportError:
+        raise RenditionError("pypdfium2 är inte installerat")
+    try:
+        return pypdfium2.PdfDocument(pdf_path)
+    except (OSError, pypdfium2.PdfiumError) as e:
+        raise RenditionError(f"Kunde inte öppna {pdf_path}: {str(e)}")
+
+
+def save_image(image, target):
+    """Skriv bilden atomärt så att en samtidig läsare aldrig ser en halv fil"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            image.save(temp_file, format=FORMAT, quality=80)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _render_page(pdf, sha256, page, sizes):
+    """Rendera en sida en gång i största storleken och skala ner till övriga"""
+    if not 1 <= page <= len(pdf):
+        raise RenditionError(f"Sidan {page} finns inte (dokumentet har {len(pdf)} sidor)")
+
+    pdf_page = pdf[page - 1]
+    width, height = pdf_page.get_size()
+    largest = max(SIZES[size] for size in sizes)
+    image = pdf_page.render(scale=largest / max(width, height, 1)).to_pil()
+    for size in sorted(sizes, key=SIZES.get, reverse=True):
+        scaled = image.copy()
+        scaled.thumbnail((SIZES[size], SIZES[size]))
+        save_image(scaled, rendition_path(sha256, page, size))
+
+
+def render(sha256, pdf_path, page, size):
+    """Rendera en sida till cachen och returnera sökvägen"""
+    if size not in SIZES:
+        raise RenditionError(f"Okänd storlek: {size}")
+    pdf = open_pdf(pdf_path)
+    try:
+        _render_page(pdf, sha256, page, [size])
+    finally:
+        pdf.close()
+    return rendition_path(sha256, page, size)
+
+
+def get_or_render(sha256, pdf_path, page, size):
+    """Returnera en cachad förhandsbild och rendera den om den saknas"""
+    path = rendition_path(sha256, page, size)
+    if os.path.exists(path):
+        return path
+    return render(sha256, pdf_path, page, size)
+
+
+def generate(sha256, pdf_path, max_pages=None):
+    """
+    Rendera första sidan i alla storlekar och övriga sidor i PAGE_SIZE.
+    Redan cachade bilder hoppas över.
+
+    Returns:
+        int: Antal sidor som renderades
+    """
+    pdf = open_pdf(pdf_path)
+    rendered = 0
+    try:
+        page_count = len(pdf)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+        for page in range(1, page_count + 1):
+            sizes = list(SIZES) if page == 1 else [PAGE_SIZE]
+            missing = [size for size in sizes if not os.path.exists(rendition_path(sha256, page, size))]
+            if missing:
+                _render_page(pdf, sha256, page, missing)
+                rendered += 1
+    finally:
+        pdf.close()
+    return rendered
+
+
+def generation_job(instance):
+    """Bakgrundsjobbet (namn, payload, nyckel) som renderar förhandsbilder för en nyss sparad PDF, eller None"""
+    if not getattr(settings, 'RENDITIONS_ON_UPLOAD', True):
+        return None
+    sha256 = getattr(instance, 'sha256', '')
+    field_file = instance.file
+    if not sha256 or not field_file or not field_file.name.lower().endswith('.pdf'):
+        return None
+    if os.path.exists(rendition_path(sha256, 1, PAGE_SIZE)):
+        return None
+    return 'files.generate_renditions', {'sha256': sha256, 'name': field_file.name}, f"renditions:{sha256}"
+
+
+def schedule_generation(instance):
+    """
+    Köa rendering av förhandsbilder för en nyss sparad PDF som bakgrundsjobb
+    (anropas i post_save för File och PDFDocument, se files.tasks).
+    """
+    job = generation_job(instance)
+    if job:
+        from jobs.queue import enqueue
+        name, payload, key = job
+        enqueue(name, payload, key=key)
+
+
+def remove(sha256):
+    """Ta bort alla förhandsbilder för ett innehåll som inte längre finns"""
+    if sha256:
+        shutil.rmtree(cache_dir(sha256), ignore_errors=True)
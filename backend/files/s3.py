@@ -0,0 +1,232 @@
+"""
+S3-kompatibel lagring (AWS S3, MinIO, Ceph RGW) för files.storage.
+
+Används med FILE_STORAGE_DRIVER = 's3' och kräver boto3. Filer över
+S3_MULTIPART_THRESHOLD laddas upp som multipart med S3_MAX_CONCURRENCY delar
+parallellt, och download_to() hämtar stora filer med parallella Range-GET.
+iter_range() läser ett intervall med en Range-GET, så att Range-förfrågningar
+från klienter kan besvaras utan att hela filen hämtas. Med
+S3_REDIRECT_DOWNLOADS skickas klienten i stället vidare till en
+förhandssignerad URL och filen passerar inte Django alls.
+
+Lokalt kan drivern testas mot MinIO, t.ex.:
+
+    docker run -p 9000:9000 minio/minio server /data
+    FILE_STORAGE_DRIVER=s3 S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET=valvx \\
+    S3_ACCESS_KEY_ID=minioadmin S3_SECRET_ACCESS_KEY=minioadmin python manage.py runserver
+"""
+import mimetypes
+import posixpath
+import tempfile
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+from django.utils.http import content_disposition_header
+from .storage import READ_CHUNK_SIZE, ContentAddressedMixin
+
+# Filer upp till denna storlek hålls i minnet vid open(), större skrivs till en temporär fil
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+_NOT_FOUND_CODES = {'404', 'NoSuchKey', 'NotFound'}
+
+
+def _setting(name, default=None):
+    return getattr(settings, name, default)
+
+
+@deconstructible(path='files.s3.S3Storage')
+class S3Storage(Storage):
+    """
+    Django-lagring i en S3-bucket. Inställningarna läses från S3_* om de inte
+    anges, så att samma klass fungerar med AWS och MinIO.
+    """
+
+    def __init__(self, bucket=None, endpoint_url=None, region_name=None,
+                 access_key_id=None, secret_access_key=None, prefix=None):
+        self.bucket = bucket or _setting('S3_BUCKET')
+        if not self.bucket:
+            raise ImproperlyConfigured("S3_BUCKET måste anges för FILE_STORAGE_DRIVER='s3'")
+        self.endpoint_url = endpoint_url or _setting('S3_ENDPOINT_URL')
+        self.region_name = region_name or _setting('S3_REGION')
+        self.access_key_id = access_key_id or _setting('S3_ACCESS_KEY_ID')
+        self.secret_access_key = secret_access_key or _setting('S3_SECRET_ACCESS_KEY')
+        self.prefix = (prefix if prefix is not None else _setting('S3_PREFIX', '')).strip('/')
+
+    @cached_property
+    def client(self):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured("FILE_STORAGE_DRIVER='s3' kräver boto3 (pip install boto3)")
+        return boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            region_name=self.region_name,
+            aws_access_key_id=self.access_key_id,
+            aws_secret_access_key=self.secret_access_key,
+            config=Config(
+                signature_version='s3v4',
+                # En anslutning per parallell del, plus marginal för samtidiga förfrågningar
+                max_pool_connections=max(10, 2 * _setting('S3_MAX_CONCURRENCY', 8)),
+                s3={'addressing_style': _setting('S3_ADDRESSING_STYLE', 'auto')},
+            ),
+        )
+
+    @cached_property
+    def transfer_config(self):
+        """Multipart-uppladdning och nedladdning i parallella delar"""
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=_setting('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=_setting('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024),
+            max_concurrency=_setting('S3_MAX_CONCURRENCY', 8),
+            use_threads=True,
+        )
+
+    def _key(self, name):
+        name = posixpath.normpath(name.replace('\\', '/')).lstrip('/')
+        if name.startswith('..'):
+            raise ValueError(f"Ogiltigt filnamn: {name}")
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def _is_not_found(self, error):
+        return str(error.response.get('Error', {}).get('Code')) in _NOT_FOUND_CODES
+
+    def _head(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(name)
+            raise
+
+    def _save(self, name, content):
+        extra_args = {'ContentType': mimetypes.guess_type(name)[0] or 'application/octet-stream'}
+        temporary_file_path = getattr(content, 'temporary_file_path', None)
+        if temporary_file_path:
+            # Från disk kan boto3 läsa delarna parallellt
+            self.client.upload_file(
+                temporary_file_path(), self.bucket, self._key(name),
+                ExtraArgs=extra_args, Config=self.transfer_config
+            )
+        else:
+            content.seek(0)
+            self.client.upload_fileobj(
+                content, self.bucket, self._key(name),
+                ExtraArgs=extra_args, Config=self.transfer_config
+            )
+        return name
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode:
+            raise ValueError("S3-filer kan bara öppnas för läsning")
+        temp = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            self.client.download_fileobj(self.bucket, self._key(name), temp, Config=self.transfer_config)
+        except Exception:
+            temp.close()
+            raise
+        temp.seek(0)
+        return File(temp, name)
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        try:
+            self._head(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get_available_name(self, name, max_length=None):
+        # Blobnamnen är innehållsadresserade, samma namn betyder samma innehåll
+        return name
+
+    def size(self, name):
+        return self._head(name)['ContentLength']
+
+    def get_modified_time(self, name):
+        modified = self._head(name)['LastModified']
+        if settings.USE_TZ:
+            return modified.astimezone(dt_timezone.utc)
+        return timezone.make_naive(modified)
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip('/') + '/' if path else (f"{self.prefix}/" if self.prefix else '')
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            directories.extend(p['Prefix'][len(prefix):].rstrip('/') for p in page.get('CommonPrefixes', []))
+            files.extend(o['Key'][len(prefix):] for o in page.get('Contents', []))
+        return directories, files
+
+    def url(self, name, parameters=None, expire=None):
+        """Förhandssignerad GET-URL som gäller i S3_PRESIGNED_EXPIRY sekunder"""
+        params = {'Bucket': self.bucket, 'Key': self._key(name)}
+        params.update(parameters or {})
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expire or _setting('S3_PRESIGNED_EXPIRY', 300)
+        )
+
+    # Utöver Storage-API:t, se files.storage
+
+    def local_path(self, name):
+        return None
+
+    def iter_range(self, name, start, length, chunk_size=READ_CHUNK_SIZE):
+        """Läs ett intervall med en Range-GET och strömma svaret i block"""
+        from botocore.exceptions import ClientError
+
+        if length <= 0:
+            return
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(name), Range=f"bytes={start}-{start + length - 1}"
+            )
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(name)
+            raise
+        body = response['Body']
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def download_to(self, name, path):
+        """Hämta filen till disk med parallella Range-GET för stora filer"""
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.download_file(self.bucket, self._key(name), path, Config=self.transfer_config)
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(name)
+            raise
+
+    def download_url(self, name, filename=None, content_type=None, as_attachment=False):
+        if not _setting('S3_REDIRECT_DOWNLOADS', True):
+            return None
+        parameters = {
+            'ResponseContentDisposition': content_disposition_header(
+                as_attachment, filename or posixpath.basename(name)
+            ),
+        }
+        if content_type:
+            parameters['ResponseContentType'] = content_type
+        return self.url(name, parameters)
+
+
+@deconstructible(path='files.s3.S3ContentAddressedStorage')
+class S3ContentAddressedStorage(ContentAddressedMixin, S3Storage):
+    """S3-drivrutin: innehållsadresserade filer i en bucket"""
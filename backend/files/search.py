@@ -0,0 +1,326 @@
+"""
+Fulltextsökning i PDF-text, filnamn, beskrivningar och kommentarer.
+
+Texten lagras i SearchEntry och indexeras av databasen:
+- SQLite: en FTS5-tabell med SearchEntry som extern källa, uppdaterad av triggers
+- PostgreSQL: en genererad tsvector-kolumn med GIN-index
+
+Indexet uppdateras inkrementellt. Signalerna skriver om raden för det objekt
+som ändrats, och PDF-text extraheras per sida en gång per innehåll (sha256)
+när filen laddats upp. De databasspecifika delarna skapas av migreringen
+0015_searchentry_fulltext.
+"""
+import logging
+import re
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'files_searchentry_fts'
+
+# Antal träffar som returneras om inget annat anges
+DEFAULT_LIMIT = 50
+
+
+# Indexering
+
+def index_object(kind, key, *texts):
+    """Skriv om sökraden för ett objekt (namn, beskrivning, kommentar osv.)"""
+    from .models import SearchEntry
+
+    text = '\n'.join(t for t in texts if t)
+    SearchEntry.objects.update_or_create(
+        kind=kind, key=str(key), page_number=0,
+        defaults={'text': text}
+    )
+
+
+def index_objects(kind, objects):
+    """
+    Som index_object för många objekt: en delete och en bulk_create.
+
+    Args:
+        objects: (nyckel, text, ...) för varje objekt
+    """
+    from .models import SearchEntry
+
+    texts = {str(key): '\n'.join(t for t in parts if t) for key, *parts in objects}
+    if not texts:
+        return
+    with transaction.atomic():
+        SearchEntry.objects.filter(kind=kind, key__in=texts, page_number=0).delete()
+        SearchEntry.objects.bulk_create([
+            SearchEntry(kind=kind, key=key, page_number=0, text=text) for key, text in texts.items()
+        ])
+
+
+def remove_object(kind, key):
+    """Ta bort sökraderna för ett objekt"""
+    from .models import SearchEntry
+
+    SearchEntry.objects.filter(kind=kind, key=str(key)).delete()
+
+
+def is_extracted(sha256):
+    from .models import SearchEntry
+
+    return SearchEntry.objects.filter(kind=SearchEntry.KIND_PAGE, key=sha256).exists()
+
+
+def index_pages(sha256, pages):
+    """Ersätt den indexerade texten för ett PDF-innehåll med en rad per sida"""
+    from .models import SearchEntry
+
+    with transaction.atomic():
+        SearchEntry.objects.filter(kind=SearchEntry.KIND_PAGE, key=sha256).delete()
+        SearchEntry.objects.bulk_create([
+            SearchEntry(kind=SearchEntry.KIND_PAGE, key=sha256, page_number=number, text=text)
+            for number, text in enumerate(pages, start=1)
+        ])
+
+
+def extract_pages(path):
+    """
+    Text per sida ur en PDF-fil.
+    Returnerar None om pypdf saknas eller filen inte går att läsa.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        logger.warning("pypdf är inte installerat, PDF-text indexeras inte")
+        return None
+
+    try:
+        reader = PdfReader(path)
+        pages = []
+        for page in reader.pages:
+            try:
+                pages.append(page.extract_text() or '')
+            except Exception as e:
+                # En trasig sida ska inte stoppa resten av dokumentet
+                logger.warning(f"Kunde inte extrahera text från sida i {path}: {str(e)}")
+                pages.append('')
+        return pages
+    except Exception as e:
+        logger.warning(f"Kunde inte läsa PDF för textindexering {path}: {str(e)}")
+        return None
+
+
+def extract_and_index(sha256, path):
+    """Extrahera och indexera PDF-text om innehållet inte redan är indexerat"""
+    if not sha256 or is_extracted(sha256):
+        return False
+    pages = extract_pages(path)
+    if pages is None:
+        return False
+    index_pages(sha256, pages)
+    logger.info(f"Indexerade {len(pages)} sidor för {sha256}")
+    return True
+
+
+def extraction_job(instance):
+    """Bakgrundsjobbet (namn, payload, nyckel) som indexerar texten i en nyss sparad PDF, eller None"""
+    if not getattr(settings, 'SEARCH_EXTRACT_ON_UPLOAD', True):
+        return None
+    sha256 = getattr(instance, 'sha256', '')
+    field_file = instance.file
+    if not sha256 or not field_file or not field_file.name.lower().endswith('.pdf'):
+        return None
+    return 'files.extract_text', {'sha256': sha256, 'name': field_file.name}, f"extract:{sha256}"
+
+
+def schedule_extraction(instance):
+    """
+    Köa indexering av texten i en nyss sparad PDF som bakgrundsjobb
+    (anropas i post_save för File, FileVersion och PDFDocument, se files.tasks).
+    """
+    job = extraction_job(instance)
+    if job:
+        from jobs.queue import enqueue
+        name, payload, key = job
+        enqueue(name, payload, key=key)
+
+
+def remove_pages(sha256):
+    """Ta bort indexerad PDF-text för ett innehåll som inte längre finns"""
+    from .models import SearchEntry
+
+    SearchEntry.objects.filter(kind=SearchEntry.KIND_PAGE, key=sha256).delete()
+
+
+def rebuild(reextract=False):
+    """
+    Indexera alla befintliga objekt och extrahera text ur PDF:er som saknas i indexet.
+
+    Args:
+        reextract (bool): Extrahera om PDF-text även för redan indexerat innehåll
+
+    Returns:
+        dict: Antal indexerade objekt per typ och antal extraherade PDF:er
+    """
+    from .hashing import ensure_sha256
+    from .models import File, PDFAnnotation, SearchEntry
+    from .storage import local_copy
+    from workspace.models import FileVersion, PDFDocument
+
+    counts = {}
+    for kind, queryset, fields in (
+        (SearchEntry.KIND_FILE, File.objects.all(), ('name', 'description')),
+        (SearchEntry.KIND_PDF_DOCUMENT, PDFDocument.objects.all(), ('title', 'description')),
+        (SearchEntry.KIND_ANNOTATION, PDFAnnotation.objects.all(), ('comment',)),
+    ):
+        counts[kind] = 0
+        for row in queryset.values('id', *fields).iterator():
+            index_object(kind, row['id'], *(row[field] for field in fields))
+            counts[kind] += 1
+
+    if reextract:
+        SearchEntry.objects.filter(kind=SearchEntry.KIND_PAGE).delete()
+
+    counts[SearchEntry.KIND_PAGE] = 0
+    # Bara fälten som indexeringen och ensure_sha256 använder
+    for model, fields in (
+        (File, ('id', 'file', 'sha256', 'directory')),
+        (FileVersion, ('id', 'file', 'sha256')),
+        (PDFDocument, ('id', 'file', 'sha256')),
+    ):
+        queryset = model.objects.exclude(file='').filter(file__iendswith='.pdf').only(*fields)
+        for instance in queryset.iterator():
+            sha256 = ensure_sha256(instance)
+            if not sha256:
+                continue
+            try:
+                with local_copy(instance.file.name, instance.file.storage) as path:
+                    extracted = extract_and_index(sha256, path)
+            except OSError:
+                continue
+            if extracted:
+                counts[SearchEntry.KIND_PAGE] += 1
+    return counts
+
+
+# Sökning
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts5_query(query):
+    """Gör om fritext till en FTS5-fråga där alla ord måste finnas (prefixmatchning)"""
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(query))
+
+
+def search(query, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Sök i indexet och returnera träffar sorterade efter relevans.
+
+    Args:
+        query (str): Sökord, alla ord måste finnas
+        kinds (list, optional): Begränsa till vissa SearchEntry.KIND_*
+        limit (int): Max antal träffar
+
+    Returns:
+        list: dicts med kind, key, page_number, rank (högre är bättre) och snippet
+    """
+    if not _TOKEN_RE.search(query or ''):
+        return []
+
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        rows = _search_sqlite(query, kinds, limit)
+    elif vendor == 'postgresql':
+        rows = _search_postgres(query, kinds, limit)
+    else:
+        rows = _search_fallback(query, kinds, limit)
+
+    return [
+        {'kind': kind, 'key': key, 'page_number': page_number, 'rank': rank, 'snippet': snippet}
+        for kind, key, page_number, rank, snippet in rows
+    ]
+
+
+def _kind_filter(kinds, column):
+    if not kinds:
+        return '', []
+    return f" AND {column} IN ({', '.join(['%s'] * len(kinds))})", list(kinds)
+
+
+def _search_sqlite(query, kinds, limit):
+    kind_sql, kind_params = _kind_filter(kinds, 'e.kind')
+    sql = (
+        f"SELECT e.kind, e.key, e.page_number, -bm25({FTS_TABLE}) AS rank, "
+        f"snippet({FTS_TABLE}, 0, '[', ']', '…', 12) "
+        f"FROM {FTS_TABLE} JOIN files_searchentry e ON e.id = {FTS_TABLE}.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s{kind_sql} "
+        f"ORDER BY bm25({FTS_TABLE}) LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_fts5_query(query)] + kind_params + [limit])
+        return cursor.fetchall()
+
+
+def _search_postgres(query, kinds, limit):
+    # ts_headline är dyr och körs därför bara för de träffar som returneras
+    kind_sql, kind_params = _kind_filter(kinds, 'e.kind')
+    sql = (
+        "SELECT hit.kind, hit.key, hit.page_number, hit.rank, "
+        "ts_headline('simple', e.text, hit.q, 'StartSel=[, StopSel=], MaxFragments=1, MaxWords=20') "
+        "FROM ("
+        "  SELECT e.id, e.kind, e.key, e.page_number, ts_rank(e.search_vector, q) AS rank, q"
+        "  FROM files_searchentry e, websearch_to_tsquery('simple', %s) q"
+        f"  WHERE e.search_vector @@ q{kind_sql}"
+        "  ORDER BY rank DESC LIMIT %s"
+        ") hit JOIN files_searchentry e ON e.id = hit.id "
+        "ORDER BY hit.rank DESC"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query] + kind_params + [limit])
+        return cursor.fetchall()
+
+
+def _search_fallback(query, kinds, limit):
+    """Enkel icontains-sökning för databaser utan fulltextstöd"""
+    from .models import SearchEntry
+
+    queryset = SearchEntry.objects.all()
+    for token in _TOKEN_RE.findall(query):
+        queryset = queryset.filter(text__icontains=token)
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    return [
+        (kind, key, page_number, 1.0, text[:200])
+        for kind, key, page_number, text in queryset.values_list('kind', 'key', 'page_number', 'text')[:limit]
+    ]
+
+
+def matching_entries(query, kind):
+    """
+    SearchEntry-rader av en viss typ som matchar frågan, utan sortering och tak.
+    Används som underfråga när indexet filtrerar en lista, så att listans
+    paginering gäller alla träffar och inte bara de första.
+    """
+    from .models import SearchEntry
+
+    entries = SearchEntry.objects.filter(kind=kind)
+    if not _TOKEN_RE.search(query or ''):
+        return entries.none()
+
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        return entries.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts5_query(query)]
+        ))
+    if vendor == 'postgresql':
+        return entries.filter(RawSQL(
+            "search_vector @@ websearch_to_tsquery('simple', %s)", [query], output_field=BooleanField()
+        ))
+    for token in _TOKEN_RE.findall(query):
+        entries = entries.filter(text__icontains=token)
+    return entries
+
+
+def matching_keys(query, kind):
+    """Nycklar (id eller sha256) för objekt av en viss typ som matchar frågan"""
+    return list(matching_entries(query, kind).values_list('key', flat=True))
@@ -0,0 +1,113 @@
+from django.db.models import Q
+from django.db.models.functions import Cast
+from rest_framework import filters, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from .models import File, PDFAnnotation, SearchEntry
+from . import search
+
+# Max antal träffar från sökendpointen
+MAX_LIMIT = 200
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Ersätter SearchFilter (icontains) med fulltextindexet i files.search.
+
+    Vyn anger i full_text_search vilka SearchEntry-typer som söks och vilket
+    fält i querysetet nyckeln motsvarar, t.ex. {KIND_FILE: 'id', KIND_PAGE: 'sha256'}.
+    Träffarna filtreras med en underfråga i databasen, så alla matchande
+    objekt kommer med oavsett hur många de är.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        full_text_search = getattr(view, 'full_text_search', None)
+        if not query or not full_text_search:
+            return super().filter_queryset(request, queryset, view)
+
+        condition = Q(pk__in=[])
+        for kind, field in full_text_search.items():
+            # SearchEntry.key är text, så den tolkas som fältets typ (t.ex. heltals-id)
+            output_field = queryset.model._meta.get_field(field)
+            keys = search.matching_entries(query, kind).values(match=Cast('key', output_field))
+            condition |= Q(**{f"{field}__in": keys})
+        return queryset.filter(condition)
+
+
+def _resolve_hits(hits, project_id=None):
+    """Koppla träffarna till filer, PDF-dokument och annotationer (en fråga per typ)"""
+    from workspace.models import PDFDocument
+
+    keys = {kind: set() for kind, _ in SearchEntry.KIND_CHOICES}
+    for hit in hits:
+        keys[hit['kind']].add(hit['key'])
+
+    def scoped(queryset):
+        return queryset.filter(project_id=project_id) if project_id else queryset
+
+    file_fields = ('id', 'name', 'sha256', 'directory_id', 'project_id')
+    files = scoped(File.objects.filter(is_latest=True)).filter(
+        Q(id__in=keys[SearchEntry.KIND_FILE]) | Q(sha256__in=keys[SearchEntry.KIND_PAGE])
+    ).values(*file_fields)
+    documents = scoped(PDFDocument.objects.all()).filter(
+        Q(id__in=keys[SearchEntry.KIND_PDF_DOCUMENT]) | Q(sha256__in=keys[SearchEntry.KIND_PAGE])
+    ).values('id', 'title', 'sha256', 'project_id')
+    annotations = scoped(PDFAnnotation.objects.filter(id__in=keys[SearchEntry.KIND_ANNOTATION])).values(
+        'id', 'file_id', 'page_number', 'project_id'
+    )
+
+    by_id = {
+        SearchEntry.KIND_FILE: {str(f['id']): [f] for f in files},
+        SearchEntry.KIND_PDF_DOCUMENT: {str(d['id']): [d] for d in documents},
+        SearchEntry.KIND_ANNOTATION: {str(a['id']): [a] for a in annotations},
+    }
+    by_sha256 = {}
+    for f in files:
+        by_sha256.setdefault(f['sha256'], []).append(('file', f['id'], f['name'], f['project_id']))
+    for d in documents:
+        by_sha256.setdefault(d['sha256'], []).append(('pdf_document', d['id'], d['title'], d['project_id']))
+
+    results = []
+    for hit in hits:
+        base = {'page_number': hit['page_number'] or None, 'rank': hit['rank'], 'snippet': hit['snippet']}
+        if hit['kind'] == SearchEntry.KIND_PAGE:
+            for object_type, object_id, name, project in by_sha256.get(hit['key'], []):
+                results.append(dict(base, type=object_type, id=object_id, name=name, project=project))
+        elif hit['kind'] == SearchEntry.KIND_FILE:
+            for f in by_id[hit['kind']].get(hit['key'], []):
+                results.append(dict(base, type='file', id=f['id'], name=f['name'], project=f['project_id']))
+        elif hit['kind'] == SearchEntry.KIND_PDF_DOCUMENT:
+            for d in by_id[hit['kind']].get(hit['key'], []):
+                results.append(dict(base, type='pdf_document', id=d['id'], name=d['title'], project=d['project_id']))
+        else:
+            for a in by_id[hit['kind']].get(hit['key'], []):
+                results.append(dict(
+                    base, type='annotation', id=a['id'], file=a['file_id'],
+                    page_number=a['page_number'], project=a['project_id']
+                ))
+    return results
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_view(request):
+    """
+    Fulltextsökning i PDF-text, filnamn, beskrivningar och kommentarer.
+
+    Query-parametrar: q (sökord), project (valfritt), limit (valfritt, max 200).
+    Träffarna sorteras efter relevans och PDF-träffar anger sidnummer.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"detail": "Sökord (q) saknas."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = min(int(request.query_params.get('limit', search.DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        return Response({"detail": "Ogiltigt värde för limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+    hits = search.search(query, limit=limit)
+    results = _resolve_hits(hits, project_id=request.query_params.get('project'))
+    return Response({'query': query, 'count': len(results), 'results': results})
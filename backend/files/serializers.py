@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Directory, File, PDFAnnotation
+from .pdf_metadata import COORDINATE_TOLERANCE, page_size
 from django.contrib.auth import get_user_model
 from core.serializers import ProjectSerializer
 
@@ -15,6 +16,17 @@ class DirectorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Directory
         fields = '__all__'
+    
+    def validate_parent(self, parent):
+        """
+        En mapp kan inte flyttas in i sig själv eller sitt eget delträd.
+        Samma kontroll som Directory.save, men här ger den 400 i stället för ett serverfel.
+        """
+        directory = self.instance
+        if parent is not None and directory is not None and directory.tree_path:
+            if (parent.tree_path or '/').startswith(directory.tree_path):
+                raise serializers.ValidationError("En mapp kan inte flyttas in i sin egen undermapp.")
+        return parent
 
 class FileSerializer(serializers.ModelSerializer):
     """Serializer för File-modellen"""
@@ -29,6 +41,7 @@ class FileSerializer(serializers.ModelSerializer):
             'id', 'name', 'directory', 'directory_name', 'project', 'project_name', 
             'file', 'content_type', 'size', 'version', 'previous_version', 
             'is_latest', 'description', 'uploaded_by', 'uploaded_by_name', 
+            'version_group', 'sha256', 'page_count', 'pdf_metadata',
             'created_at', 'updated_at', 'file_url'
         ]
     
@@ -53,6 +66,36 @@ class PDFAnnotationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at']
     
+    def validate(self, attrs):
+        """
+        Kontrollera sidnummer och koordinater mot filens sidstorlekar.
+        Filer utan sparad metadata (t.ex. ännu inte inlästa) valideras inte.
+        """
+        file_obj = attrs.get('file') or getattr(self.instance, 'file', None)
+        if file_obj is None or file_obj.page_count is None:
+            return attrs
+        
+        def value(field):
+            return attrs[field] if field in attrs else getattr(self.instance, field, None)
+        
+        page_number = value('page_number')
+        if page_number is not None and not 1 <= page_number <= file_obj.page_count:
+            raise serializers.ValidationError({
+                'page_number': f"Sidan finns inte, dokumentet har {file_obj.page_count} sidor."
+            })
+        
+        size = page_size(file_obj, page_number) if page_number is not None else None
+        x, y, width, height = value('x'), value('y'), value('width'), value('height')
+        if size and None not in (x, y, width, height):
+            page_width, page_height = size
+            if (x < -COORDINATE_TOLERANCE or y < -COORDINATE_TOLERANCE or width < 0 or height < 0
+                    or x + width > page_width + COORDINATE_TOLERANCE
+                    or y + height > page_height + COORDINATE_TOLERANCE):
+                raise serializers.ValidationError(
+                    f"Markeringen ligger utanför sidan ({page_width} x {page_height} punkter)."
+                )
+        return attrs
+    
     def create(self, validated_data):
         # Sätt användaren som skapade annotationen
         user = self.context['request'].user
@@ -0,0 +1,97 @@
+"""
+Hierarkiskt mappträd för sidomenyn.
+
+Hela trädet byggs i minnet från en enda values()-fråga med antal filer per
+mapp, och cachas per projekt. Cachen rensas via signalerna i files.signals
+när mappar eller filer ändras.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+CACHE_KEY = 'files:sidebar_tree:{project}'
+
+# Används som project_id för ett träd med sidomenymappar från alla projekt
+ALL_PROJECTS = 'all'
+
+TREE_FIELDS = ('id', 'name', 'slug', 'parent_id', 'type', 'project_id')
+
+
+def _cache_key(project_id):
+    return CACHE_KEY.format(project=project_id if project_id is not None else 'none')
+
+
+def invalidate(project_id):
+    """Rensa det cachade trädet för ett projekt (och trädet för alla projekt)"""
+    cache.delete_many([_cache_key(project_id), _cache_key(ALL_PROJECTS)])
+
+
+def _load_nodes(project_id):
+    """Alla sidomenymappar i projektet som platta noder (en fråga)"""
+    from .models import Directory
+
+    queryset = Directory.objects.filter(is_sidebar_item=True)
+    if project_id is None:
+        queryset = queryset.filter(project__isnull=True)
+    elif project_id != ALL_PROJECTS:
+        queryset = queryset.filter(project_id=project_id)
+
+    rows = queryset.order_by('name').values(*TREE_FIELDS).annotate(
+        file_count=Count('files', filter=Q(files__is_latest=True))
+    )
+    return [dict(row, children=[]) for row in rows]
+
+
+def _build(nodes):
+    """Koppla ihop noderna till ett träd och räkna filer i varje delträd"""
+    by_id = {node['id']: node for node in nodes}
+    roots = []
+    for node in nodes:
+        parent = by_id.get(node['parent_id'])
+        if parent is not None:
+            parent['children'].append(node)
+        else:
+            # Mappar vars förälder inte visas i sidomenyn hamnar på toppnivå
+            roots.append(node)
+
+    def total(node):
+        node['total_file_count'] = node['file_count'] + sum(total(child) for child in node['children'])
+        return node['total_file_count']
+
+    for root in roots:
+        total(root)
+    return roots
+
+
+def _prune(nodes, max_depth, level=0):
+    """Kopia av trädet utan noder djupare än max_depth (0 = bara toppnivån)"""
+    pruned = []
+    for node in nodes:
+        copy = dict(node)
+        copy['has_children'] = bool(node['children'])
+        copy['children'] = _prune(node['children'], max_depth, level + 1) if level < max_depth else []
+        pruned.append(copy)
+    return pruned
+
+
+def get_sidebar_tree(project_id=ALL_PROJECTS, max_depth=None):
+    """
+    Returnera sidomenyns mappträd för ett projekt.
+
+    Args:
+        project_id: Projektets id, None för mappar utan projekt eller ALL_PROJECTS
+        max_depth (int, optional): Antal nivåer under toppnivån som tas med
+
+    Returns:
+        list: Noder med id, name, slug, parent_id, type, project_id,
+        file_count, total_file_count och children
+    """
+    key = _cache_key(project_id)
+    tree = cache.get(key)
+    if tree is None:
+        tree = _build(_load_nodes(project_id))
+        cache.set(key, tree, getattr(settings, 'SIDEBAR_TREE_CACHE_TIMEOUT', 300))
+
+    if max_depth is not None:
+        return _prune(tree, max_depth)
+    return tree
@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Directory
+from .models import Directory, File, FileIndexEntry, PDFAnnotation, SearchEntry, update_previous_version_is_latest
+from . import directory_cache, file_index, linearize, pdf_metadata, renditions, search, sidebar
+from .hashing import set_upload_hash
+from .storage import acquire_blobs, is_blob_name, remember_blob, sync_blob_reference, release_blob_reference
 
 @receiver(post_save, sender=Directory)
 def ensure_directory_has_slug(sender, instance, created, **kwargs):
@@ -10,4 +13,173 @@ def ensure_directory_has_slug(sender, instance, created, **kwargs):
     """
     if not instance.slug:
         # Spara igen för att generera slug via save-metoden
-        instance.save()
\ No newline at end of file
+        instance.save()
+
+
+@receiver(pre_save, sender=File)
+def hash_uploaded_file(sender, instance, **kwargs):
+    """Räkna ut sha256 från uppladdningen innan filen skrivs till disk"""
+    set_upload_hash(instance)
+
+
+@receiver(pre_save, sender=File)
+def read_pdf_metadata(sender, instance, **kwargs):
+    """Läs sidantal, sidstorlekar och bokmärken från en ny PDF"""
+    pdf_metadata.set_upload_metadata(instance)
+
+
+@receiver(post_save, sender=File)
+def index_saved_file(sender, instance, **kwargs):
+    """Håll filindexet uppdaterat när en fil sparas"""
+    if instance.file:
+        file_index.index_path(instance.file.name, FileIndexEntry.SOURCE_FILE, display_name=instance.name)
+
+
+@receiver(post_delete, sender=File)
+def unindex_deleted_file(sender, instance, **kwargs):
+    """
+    Ta bort raderade filer ur filindexet.
+    Blobs kan delas av flera filer och tas ur indexet först när de rensas bort.
+    """
+    if instance.file and not is_blob_name(instance.file.name):
+        file_index.remove_path(instance.file.name)
+
+
+@receiver(post_init, sender=File)
+def remember_loaded_blob(sender, instance, **kwargs):
+    remember_blob(instance)
+
+
+@receiver(post_save, sender=File)
+def reference_saved_blob(sender, instance, **kwargs):
+    """Räkna referenser till filer i den innehållsadresserade lagringen"""
+    sync_blob_reference(instance)
+
+
+@receiver(post_delete, sender=File)
+def release_deleted_blob(sender, instance, **kwargs):
+    """Släpp referensen och ta bort bloben om det var den sista"""
+    release_blob_reference(instance)
+
+
+@receiver(post_save, sender=Directory)
+@receiver(post_delete, sender=Directory)
+def invalidate_sidebar_tree(sender, instance, **kwargs):
+    """Mappträdet i sidomenyn byggs om när en mapp ändras"""
+    sidebar.invalidate(instance.project_id)
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def invalidate_sidebar_file_counts(sender, instance, **kwargs):
+    """Antalet filer per mapp i sidomenyn ändras när filer sparas eller raderas"""
+    if instance.directory_id:
+        sidebar.invalidate(instance.project_id)
+
+
+@receiver(pre_save, sender=Directory)
+def remember_previous_parent(sender, instance, **kwargs):
+    """Föräldern före en flytt, ur tree_path som ännu inte uppdaterats (ingen fråga)"""
+    parts = instance.tree_path.strip('/').split('/') if instance.tree_path else []
+    instance._previous_parent_id = int(parts[-2]) if len(parts) > 1 else None
+
+
+@receiver(post_save, sender=Directory)
+def invalidate_directory_data(sender, instance, **kwargs):
+    """Mappsidans data ändras för mappen, dess föräldrar (undermapparna) och undermapparna (föräldern)"""
+    children = Directory.objects.filter(parent_id=instance.id).values_list('id', flat=True)
+    directory_cache.invalidate(
+        instance.id, instance.parent_id, getattr(instance, '_previous_parent_id', None), *children
+    )
+
+
+@receiver(post_delete, sender=Directory)
+def invalidate_deleted_directory_data(sender, instance, **kwargs):
+    directory_cache.invalidate(instance.id, instance.parent_id)
+
+
+@receiver(post_init, sender=File)
+def remember_loaded_directory(sender, instance, **kwargs):
+    instance._loaded_directory_id = instance.__dict__.get('directory_id')
+
+
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def invalidate_directory_files(sender, instance, **kwargs):
+    """Fillistan på mappsidan ändras i mappen och, vid flytt, i den gamla mappen"""
+    directory_cache.invalidate(instance.directory_id, getattr(instance, '_loaded_directory_id', None))
+    instance._loaded_directory_id = instance.directory_id
+
+
+@receiver(post_save, sender=File)
+def index_file_text(sender, instance, **kwargs):
+    """Uppdatera sökindexet för filens namn och beskrivning och extrahera PDF-texten"""
+    search.index_object(SearchEntry.KIND_FILE, instance.id, instance.name, instance.description)
+    search.schedule_extraction(instance)
+
+
+@receiver(post_save, sender=File)
+def generate_file_renditions(sender, instance, **kwargs):
+    """Rendera förhandsbilder av sidorna efter uppladdning"""
+    renditions.schedule_generation(instance)
+
+
+@receiver(post_save, sender=File)
+def linearize_uploaded_file(sender, instance, **kwargs):
+    """Skriv en linjäriserad kopia för snabbare visning av första sidan"""
+    linearize.schedule_linearization(instance)
+
+
+def files_created_in_bulk(files):
+    """
+    Gör det som post_save-mottagarna ovan gör för nya filer, för rader skapade
+    med bulk_create (som inte skickar signaler). Sidopåverkan görs en gång per
+    batch: ett fast antal frågor oavsett antal filer. Håll i takt med mottagarna.
+    """
+    from jobs.queue import enqueue_many
+
+    files = [instance for instance in files if instance.pk]
+    if not files:
+        return
+
+    file_index.index_paths(
+        [(instance.file.name, instance.name) for instance in files if instance.file], FileIndexEntry.SOURCE_FILE
+    )
+    acquire_blobs([(instance.file.name, instance.size) for instance in files if instance.file])
+    search.index_objects(
+        SearchEntry.KIND_FILE, [(instance.id, instance.name, instance.description) for instance in files]
+    )
+    for instance in files:
+        instance._blob_name = instance.file.name if instance.file else None
+        instance._loaded_directory_id = instance.directory_id
+        if instance.previous_version_id:
+            update_previous_version_is_latest(File, instance)
+
+    sidebar_projects = {instance.project_id for instance in files if instance.directory_id}
+    for project_id in sidebar_projects:
+        sidebar.invalidate(project_id)
+    directory_cache.invalidate(*{instance.directory_id for instance in files})
+
+    jobs = []
+    for instance in files:
+        for job in (search.extraction_job(instance), renditions.generation_job(instance),
+                    linearize.linearization_job(instance)):
+            if job:
+                jobs.append(job)
+    enqueue_many(jobs)
+
+
+@receiver(post_delete, sender=File)
+def unindex_file_text(sender, instance, **kwargs):
+    """PDF-texten delas per innehåll och tas bort när bloben rensas"""
+    search.remove_object(SearchEntry.KIND_FILE, instance.id)
+
+
+@receiver(post_save, sender=PDFAnnotation)
+def index_annotation_text(sender, instance, **kwargs):
+    search.index_object(SearchEntry.KIND_ANNOTATION, instance.id, instance.comment)
+
+
+@receiver(post_delete, sender=PDFAnnotation)
+def unindex_annotation_text(sender, instance, **kwargs):
+    search.remove_object(SearchEntry.KIND_ANNOTATION, instance.id)
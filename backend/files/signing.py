@@ -0,0 +1,86 @@
+"""
+Kortlivade, HMAC-signerade media-URL:er.
+
+API:t lämnar ut en URL för ett visst lagrat innehåll, en användare och en
+utgångstid, signerad med SECRET_KEY. Leveransvyn (web_api.signed_media)
+kontrollerar bara signaturen och utgångstiden, utan databasfrågor, så att
+PDF.js Range-förfrågningar (dussintals per dokument) inte kostar något
+databasarbete. Lagringsnamnen är innehållsadresserade (files.storage), så en
+URL pekar alltid på samma bytes och kan cachas av en omvänd proxy tills den
+går ut.
+
+    /api/files/signed/<lagringsnamn>?u=<användare>&e=<utgång>&f=<filnamn>&s=<signatur>
+
+Utgångstiden avrundas uppåt till hela SIGNED_MEDIA_URL_TTL-perioder, så att
+upprepade anrop under en period ger samma URL och proxyns cache återanvänds.
+"""
+import math
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.signing import BadSignature, SignatureExpired
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SALT = 'files.signing.media'
+
+
+def _signature(name, user_id, expires, filename):
+    value = '\n'.join((name, str(user_id), str(expires), filename))
+    return salted_hmac(SALT, value, algorithm='sha256').hexdigest()
+
+
+def sign(name, user_id=None, filename='', ttl=None, now=None):
+    """
+    Query-parametrar som ger tillgång till name för user_id.
+
+    Returns:
+        dict: u, e (utgång som Unix-tid), f och s
+    """
+    ttl = ttl or getattr(settings, 'SIGNED_MEDIA_URL_TTL', 600)
+    now = time.time() if now is None else now
+    expires = math.ceil((now + ttl) / ttl) * ttl
+    user_id = user_id or ''
+    return {
+        'u': user_id,
+        'e': expires,
+        'f': filename,
+        's': _signature(name, user_id, expires, filename),
+    }
+
+
+def signed_url(name, user=None, filename=''):
+    """Relativ, signerad URL till ett lagrat innehåll och dess utgångstid (Unix-tid)"""
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    params = sign(name, user_id, filename)
+    return f"{reverse('signed_media', kwargs={'name': name})}?{urlencode(params)}", params['e']
+
+
+def verify(name, params, now=None):
+    """
+    Kontrollera en signerad URL:s parametrar utan databasfrågor.
+
+    Returns:
+        tuple: (användar-id eller None, utgångstid)
+
+    Raises:
+        BadSignature: Signaturen saknas eller stämmer inte
+        SignatureExpired: URL:en har gått ut
+    """
+    try:
+        expires = int(params.get('e', ''))
+    except ValueError:
+        raise BadSignature("Ogiltig utgångstid")
+    user_id = params.get('u', '')
+    expected = _signature(name, user_id, expires, params.get('f', ''))
+    if not constant_time_compare(expected, params.get('s', '')):
+        raise BadSignature("Ogiltig signatur")
+    if expires < (time.time() if now is None else now):
+        raise SignatureExpired("URL:en har gått ut")
+    return (int(user_id) if user_id else None), expires
+
+
+def signed_url_data(request, name, filename=''):
+    """API-svar med en absolut signerad URL för request.user"""
+    url, expires = signed_url(name, request.user, filename)
+    return {'url': request.build_absolute_uri(url), 'expires': expires}
@@ -0,0 +1,303 @@
+"""
+Innehållsadresserad lagring av filer.
+
+Varje fil sparas en gång under blobs/<ab>/<cd>/<sha256><ändelse>, oavsett hur
+många File-, FileVersion- och PDFDocument-rader som pekar på den. Samma ritning
+som laddas upp i flera mappar eller som ny version tar alltså ingen extra plats.
+
+Blob-tabellen räknar referenser. Signalerna i files.signals och
+workspace.signals anropar acquire_blob()/release_blob() när rader skapas,
+byter fil eller raderas, och filen tas bort från disken när den sista
+referensen försvinner. Äldre filer utanför blobs/ hanteras som tidigare.
+
+Var filerna ligger bestäms av FILE_STORAGE_DRIVER:
+
+- 'local': ContentAddressedStorage under MEDIA_ROOT.
+- 's3': files.s3.S3ContentAddressedStorage i en S3-kompatibel bucket (AWS S3,
+  MinIO), så att flera appnoder kan dela samma filer.
+
+Fälten pekar på get_blob_storage och koden går via blob_storage, så drivern
+kan bytas utan migreringar. Utöver Djangos Storage-API har drivrarna
+local_path(), iter_range(), download_to() och download_url(), som används av
+files.delivery.serve_stored() och local_copy() nedan.
+"""
+import logging
+import os
+import shutil
+import tempfile
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import LazyObject, empty
+from django.utils.module_loading import import_string
+from .hashing import hash_upload
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs/'
+
+
+def blob_name(sha256, extension=''):
+    """Lagringsnamn för en blob med given hash"""
+    return f"{BLOB_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def sha256_from_name(name):
+    """Innehållets sha256 ur ett blobnamn"""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+# Block som läses åt gången vid strömning genom drivern
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedMixin:
+    """
+    Sparar filer under sin SHA-256, för en Storage-klass.
+
+    Hashen tas från content.sha256 om den redan är uträknad (se
+    hashing.set_upload_hash), annars räknas den ut här. Finns bloben redan
+    skrivs ingenting till lagringen.
+    """
+
+    def _save(self, name, content):
+        sha256 = getattr(content, 'sha256', None) or hash_upload(content)
+        target = blob_name(sha256, os.path.splitext(name)[1])
+        if self.exists(target):
+            return target
+
+        saved = super()._save(target, content)
+        if saved != target:
+            # En samtidig uppladdning av samma innehåll hann före
+            super().delete(saved)
+        return target
+
+    def delete(self, name):
+        """
+        Blobs som fortfarande refereras tas inte bort, så att t.ex.
+        file.file.delete() i delete_file inte förstör andra versioner.
+        """
+        if is_blob_name(name):
+            from .models import Blob
+            if Blob.objects.filter(storage_name=name, ref_count__gt=0).exists():
+                return
+        super().delete(name)
+
+
+@deconstructible(path='files.storage.ContentAddressedStorage')
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    """Lokal drivrutin: innehållsadresserade filer under MEDIA_ROOT"""
+
+    def local_path(self, name):
+        """Sökväg på disk, None för drivrutiner utan lokala filer"""
+        return self.path(name)
+
+    def iter_range(self, name, start, length, chunk_size=READ_CHUNK_SIZE):
+        """Läs length byte från start i block"""
+        with open(self.path(name), 'rb') as file_obj:
+            file_obj.seek(start)
+            remaining = length
+            while remaining > 0:
+                data = file_obj.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    def download_to(self, name, path):
+        shutil.copyfile(self.path(name), path)
+
+    def download_url(self, name, filename=None, content_type=None, as_attachment=False):
+        """URL som klienten kan hämta filen från direkt, None om Django ska leverera den"""
+        return None
+
+
+STORAGE_DRIVERS = {
+    'local': 'files.storage.ContentAddressedStorage',
+    's3': 'files.s3.S3ContentAddressedStorage',
+}
+
+
+class BlobStorage(LazyObject):
+    """Lagringen som FILE_STORAGE_DRIVER anger, skapas vid första användningen"""
+
+    def _setup(self):
+        driver = getattr(settings, 'FILE_STORAGE_DRIVER', 'local')
+        try:
+            self._wrapped = import_string(STORAGE_DRIVERS[driver])()
+        except KeyError:
+            raise ImproperlyConfigured(
+                f"Okänd FILE_STORAGE_DRIVER '{driver}', välj en av: {', '.join(STORAGE_DRIVERS)}"
+            )
+
+
+blob_storage = BlobStorage()
+
+
+def get_blob_storage():
+    """Lagring för File-, FileVersion- och PDFDocument-fälten (anropbar så att drivern inte hamnar i migreringarna)"""
+    return blob_storage
+
+
+@receiver(setting_changed)
+def reset_blob_storage(setting, **kwargs):
+    if setting == 'FILE_STORAGE_DRIVER' or setting.startswith('S3_'):
+        blob_storage._wrapped = empty
+
+
+@contextmanager
+def local_copy(name, storage=None):
+    """
+    Sökväg till filen på disk för verktyg som kräver en lokal fil (pdfium, pikepdf, pypdf).
+    Lokala filer används direkt, annars laddas filen ner till en temporär fil som tas bort efteråt.
+    """
+    storage = storage or blob_storage
+    path = storage.local_path(name)
+    if path is not None:
+        yield path
+        return
+
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(name)[1])
+    os.close(fd)
+    try:
+        storage.download_to(name, temp_path)
+        yield temp_path
+    finally:
+        os.remove(temp_path)
+
+
+def acquire_blob(name, size=None):
+    """Öka referensräknaren för en blob (skapas vid första referensen)"""
+    from .models import Blob
+
+    if not is_blob_name(name):
+        return
+    with transaction.atomic():
+        blob, created = Blob.objects.get_or_create(
+            storage_name=name,
+            defaults={
+                'sha256': sha256_from_name(name),
+                'size': size or 0,
+                'ref_count': 1,
+            }
+        )
+        if not created:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+
+
+def acquire_blobs(blobs):
+    """
+    Som acquire_blob för många referenser på en gång (batchuppladdning).
+    Samma namn kan förekomma flera gånger och räknas då en gång per förekomst.
+
+    Args:
+        blobs: (namn, storlek) för varje ny referens
+    """
+    from .models import Blob
+
+    counts, sizes = Counter(), {}
+    for name, size in blobs:
+        if is_blob_name(name):
+            counts[name] += 1
+            sizes.setdefault(name, size or 0)
+    if not counts:
+        return
+
+    with transaction.atomic():
+        existing = set(
+            Blob.objects.select_for_update().filter(storage_name__in=counts).values_list('storage_name', flat=True)
+        )
+        missing = [name for name in counts if name not in existing]
+        try:
+            with transaction.atomic():
+                Blob.objects.bulk_create([
+                    Blob(storage_name=name, sha256=sha256_from_name(name), size=sizes[name], ref_count=counts[name])
+                    for name in missing
+                ])
+        except IntegrityError:
+            # En samtidig uppladdning skapade någon av blobarna, ta dem en referens i taget
+            for name in missing:
+                for _ in range(counts[name]):
+                    acquire_blob(name, sizes[name])
+
+        # En update per antal nya referenser, oftast bara en
+        by_increment = defaultdict(list)
+        for name in existing:
+            by_increment[counts[name]].append(name)
+        for increment, names in by_increment.items():
+            Blob.objects.filter(storage_name__in=names).update(ref_count=F('ref_count') + increment)
+
+
+def release_blob(name):
+    """
+    Minska referensräknaren för en blob.
+    Når den noll tas raden bort och filen tas bort av ett bakgrundsjobb
+    som köas i samma transaktion (se files.tasks).
+    """
+    from .models import Blob
+
+    if not is_blob_name(name):
+        return
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(storage_name=name).first()
+        if blob is None:
+            return
+        blob.ref_count -= 1
+        if blob.ref_count > 0:
+            blob.save(update_fields=['ref_count'])
+            return
+        blob.delete()
+        from jobs.queue import enqueue
+        enqueue('files.delete_blob', {'name': name}, key=f"delete-blob:{name}")
+
+
+def delete_unreferenced(name):
+    """Ta bort blobfilen och dess poster i fil- och sökindexet samt förhandsbilderna om ingen ny referens hann skapas"""
+    from .models import Blob
+    from . import file_index, renditions, search
+
+    if Blob.objects.filter(storage_name=name).exists():
+        return
+    try:
+        blob_storage.delete(name)
+        logger.info(f"Blob borttagen: {name}")
+    except OSError as e:
+        logger.warning(f"Kunde inte ta bort blob {name}: {str(e)}")
+    file_index.remove_path(name)
+    search.remove_pages(sha256_from_name(name))
+    renditions.remove(sha256_from_name(name))
+
+
+def remember_blob(instance):
+    """Kom ihåg vilket lagringsnamn instansen laddades med (anropas i post_init)"""
+    value = instance.__dict__.get('file')
+    instance._blob_name = value if instance.pk and isinstance(value, str) else None
+
+
+def sync_blob_reference(instance):
+    """Flytta referensen om instansen har fått en ny fil (anropas i post_save)"""
+    name = instance.file.name if instance.file else None
+    previous = getattr(instance, '_blob_name', None)
+    if name != previous:
+        acquire_blob(name, getattr(instance, 'size', None))
+        release_blob(previous)
+    instance._blob_name = name
+
+
+def release_blob_reference(instance):
+    """
+    Släpp referensen när instansen raderas (anropas i post_delete).
+    Namnet från laddningen används eftersom file.delete() nollställer fältet.
+    """
+    release_blob(getattr(instance, '_blob_name', None) or (instance.file.name if instance.file else None))
@@ -0,0 +1,47 @@
+"""
+Bakgrundsjobb för arbete efter uppladdning och radering (se jobs.queue).
+Köas från signalerna via schedule_*-funktionerna och körs av manage.py run_jobs.
+"""
+import logging
+from contextlib import nullcontext
+from django.conf import settings
+from jobs.queue import task
+from . import linearize, renditions, search
+from .storage import delete_unreferenced, local_copy
+
+logger = logging.getLogger(__name__)
+
+
+def _local_pdf(path, name):
+    """
+    PDF:en på disk. Jobb köas med namnet i lagringen och hämtar filen med
+    local_copy, äldre jobb i kön har en sökväg på disk.
+    """
+    return nullcontext(path) if path else local_copy(name)
+
+
+@task('files.generate_renditions', priority=10, max_attempts=3)
+def generate_renditions(sha256, name=None, path=None):
+    """Förhandsbilder först, eftersom de syns direkt i mapplistan"""
+    with _local_pdf(path, name) as pdf_path:
+        count = renditions.generate(sha256, pdf_path, getattr(settings, 'RENDITION_MAX_PAGES', None))
+    if count:
+        logger.info(f"Renderade förhandsbilder för {count} sidor av {sha256}")
+    return count
+
+
+@task('files.linearize', priority=5, max_attempts=3)
+def linearize_pdf(sha256, name=None, path=None):
+    with _local_pdf(path, name) as pdf_path:
+        return bool(linearize.linearize(sha256, pdf_path))
+
+
+@task('files.extract_text')
+def extract_text(sha256, name=None, path=None):
+    with _local_pdf(path, name) as pdf_path:
+        return search.extract_and_index(sha256, pdf_path)
+
+
+@task('files.delete_blob', priority=-10)
+def delete_blob(name):
+    delete_unreferenced(name)
@@ -1,7 +1,36 @@
-from django.test import TestCase
+import base64
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.signing import BadSignature, SignatureExpired
+from django.db import connection
+from django.http import FileResponse
+from unittest import mock, skipUnless
+from django.db.migrations.executor import MigrationExecutor
+from django.test import LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import Directory, File
-from core.models import User, Project
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.utils.functional import empty
+from django.utils.http import http_date
+from .models import Blob, Directory, File, FileIndexEntry, PDFAnnotation, SearchEntry, UploadSession
+from . import archive, directory_cache, file_index, linearize, renditions, search, signing, tiles
+from .delivery import parse_range_header, serve_file, serve_stored
+from .storage import blob_storage, local_copy
+from core.models import User, Project, RoleAccess
+from core.testing import QueryCountMixin
+from workspace.models import PDFDocument
 
 class FilesModelsTestCase(TestCase):
     """Test cases for files app models"""
@@ -103,4 +132,1944 @@ class FilesModelsTestCase(TestCase):
         self.assertTrue(new_file.is_latest)
         self.assertFalse(File.objects.get(id=self.file.id).is_latest)
 
+    def _create_version(self, previous, version):
+        return File.objects.create(
+            name="test_file.txt",
+            directory=self.subdirectory,
+            project=self.project,
+            file=SimpleUploadedFile("test_file.txt", f"version {version}".encode()),
+            content_type="text/plain",
+            size=9,
+            version=version,
+            previous_version=previous,
+            uploaded_by=self.user
+        )
+
+    def test_version_group_shared_by_chain(self):
+        """New versions inherit the version group and older versions are marked in one update"""
+        latest = self.file
+        for version in range(2, 6):
+            latest = self._create_version(latest, version)
+
+        self.assertEqual(File.objects.filter(version_group=self.file.version_group).count(), 5)
+        self.assertEqual(list(File.objects.filter(is_latest=True)), [latest])
+
+        with self.assertNumQueries(1):
+            versions = list(self.file.get_versions())
+        self.assertEqual([f.version for f in versions], [1, 2, 3, 4, 5])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.file.get_latest_version(), latest)
+
+    def test_separate_files_have_separate_groups(self):
+        """Unrelated uploads do not share a version group"""
+        other = File.objects.create(
+            name="other.txt",
+            directory=self.subdirectory,
+            project=self.project,
+            file=SimpleUploadedFile("other.txt", b"other"),
+            content_type="text/plain",
+            size=5,
+            uploaded_by=self.user
+        )
+        self.assertNotEqual(other.version_group, self.file.version_group)
+        self._create_version(self.file, 2)
+        self.assertTrue(File.objects.get(id=other.id).is_latest)
+
+
+class DirectoryTreeTestCase(TestCase):
+    """Test cases for the materialized tree_path on Directory"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="treeuser",
+            email="treeuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Tree Project", start_date="2023-01-01")
+    
+    def _chain(self, depth, parent=None):
+        """Create a chain of nested directories and return them top-down"""
+        chain = []
+        for level in range(depth):
+            parent = Directory.objects.create(name=f"Nivå {level}", project=self.project, parent=parent)
+            chain.append(parent)
+        return chain
+    
+    def _add_file(self, directory):
+        return File.objects.create(
+            name="ritning.pdf",
+            directory=directory,
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", f"%PDF {directory.id}".encode(), content_type="application/pdf"),
+            content_type="application/pdf",
+            size=10,
+            uploaded_by=self.user
+        )
+    
+    def test_tree_path_and_depth(self):
+        root, child, grandchild = self._chain(3)
+        self.assertEqual(root.tree_path, f"/{root.id}/")
+        self.assertEqual(grandchild.tree_path, f"/{root.id}/{child.id}/{grandchild.id}/")
+        self.assertEqual(Directory.objects.get(id=grandchild.id).depth, 2)
+    
+    def test_move_updates_descendants(self):
+        root, child, grandchild = self._chain(3)
+        other = Directory.objects.create(name="Annan", project=self.project)
+        
+        child.parent = other
+        child.save()
+        
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.tree_path, f"/{other.id}/{child.id}/{grandchild.id}/")
+        self.assertEqual(grandchild.depth, 2)
+        self.assertEqual(grandchild.get_path(), "Annan/Nivå 1/Nivå 2")
+    
+    def test_cannot_move_into_own_subtree(self):
+        root, child, grandchild = self._chain(3)
+        root.parent = grandchild
+        with self.assertRaises(ValidationError):
+            root.save()
+    
+    def test_move_into_own_subtree_via_api_is_rejected(self):
+        root, child, grandchild = self._chain(3)
+        for parent in (grandchild, root):
+            response = self.client.patch(
+                reverse('directory-detail', kwargs={'pk': root.id}),
+                {'parent': parent.id},
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('parent', response.data)
+        root.refresh_from_db()
+        self.assertIsNone(root.parent_id)
+    
+    def test_get_path_is_single_query(self):
+        leaf = Directory.objects.get(id=self._chain(8)[-1].id)
+        with self.assertNumQueries(1):
+            self.assertEqual(leaf.get_path(), '/'.join(f"Nivå {level}" for level in range(8)))
+    
+    def test_delete_subtree_query_count_is_independent_of_depth(self):
+        # Varje fil kostar sina egna signalfrågor (blob-referenser), så antalet filer hålls fast
+        def delete_queries(depth):
+            chain = self._chain(depth)
+            self._add_file(chain[-1])
+            root = Directory.objects.get(id=chain[0].id)
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    result = root.delete_subtree()
+            self.assertEqual(result, (depth, 1))
+            return len(queries)
+        
+        self.assertEqual(delete_queries(2), delete_queries(6))
+        self.assertFalse(Directory.objects.exists())
+        self.assertFalse(File.objects.exists())
+    
+    def test_subtree_endpoint(self):
+        root, child, grandchild = self._chain(3)
+        self._add_file(child)
+        self._add_file(grandchild)
+        response = self.client.get(reverse('directory-subtree', kwargs={'pk': root.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['file_count'], 2)
+        self.assertEqual([d['id'] for d in response.data['directories']], [child.id, grandchild.id])
+
+
+class SidebarTreeTestCase(TestCase):
+    """Test cases for the nested sidebar tree endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="sidebaruser",
+            email="sidebaruser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Sidebar Project", start_date="2023-01-01")
+        self.root = Directory.objects.create(name="Ritningar", project=self.project, is_sidebar_item=True)
+        self.child = Directory.objects.create(name="A-ritningar", project=self.project, parent=self.root, is_sidebar_item=True)
+        self.grandchild = Directory.objects.create(name="Plan 1", project=self.project, parent=self.child, is_sidebar_item=True)
+        self.url = reverse('directory-sidebar-tree') + f'?nested=true&project={self.project.id}'
+        self._add_file(self.child)
+        self._add_file(self.grandchild)
+    
+    def _add_file(self, directory):
+        return File.objects.create(
+            name="ritning.pdf",
+            directory=directory,
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", b"%PDF-1.4", content_type="application/pdf"),
+            content_type="application/pdf",
+            size=8,
+            uploaded_by=self.user
+        )
+    
+    def test_nested_tree_with_file_counts(self):
+        tree = self.client.get(self.url).data
+        self.assertEqual([node['id'] for node in tree], [self.root.id])
+        child = tree[0]['children'][0]
+        self.assertEqual(child['id'], self.child.id)
+        self.assertEqual(child['file_count'], 1)
+        self.assertEqual(tree[0]['total_file_count'], 2)
+        self.assertEqual(child['children'][0]['id'], self.grandchild.id)
+    
+    def test_tree_built_in_one_query_and_cached(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+    
+    def test_depth_limit(self):
+        tree = self.client.get(self.url + '&depth=0').data
+        self.assertEqual(tree[0]['children'], [])
+        self.assertTrue(tree[0]['has_children'])
+        # Begränsningen får inte påverka det cachade trädet
+        self.assertEqual(len(self.client.get(self.url).data[0]['children']), 1)
+    
+    def test_cache_invalidated_on_changes(self):
+        self.client.get(self.url)
+        Directory.objects.create(name="Plan 2", project=self.project, parent=self.child, is_sidebar_item=True)
+        tree = self.client.get(self.url).data
+        self.assertEqual(len(tree[0]['children'][0]['children']), 2)
+        
+        self._add_file(self.root)
+        self.assertEqual(self.client.get(self.url).data[0]['file_count'], 1)
+
+
+class FileIndexTestCase(TestCase):
+    """Test cases for the filename -> storage path index"""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, FILE_INDEX_EXTRA_ROOTS=[], JOBS_RUN_INLINE=True)
+        self.settings_override.enable()
+        
+        self.user = User.objects.create_user(
+            username="indexuser",
+            email="indexuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(
+            name="Index Project",
+            start_date="2023-01-01"
+        )
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project)
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _create_file(self, filename="ritning.pdf", content=b"%PDF-1.4 test"):
+        return File.objects.create(
+            name=filename,
+            directory=self.directory,
+            project=self.project,
+            file=SimpleUploadedFile(filename, content, content_type="application/pdf"),
+            content_type="application/pdf",
+            size=len(content),
+            uploaded_by=self.user
+        )
+    
+    def test_saved_file_is_indexed(self):
+        """Saving a File adds its storage path to the index"""
+        file = self._create_file()
+        filename = os.path.basename(file.file.name)
+        self.assertTrue(FileIndexEntry.objects.filter(storage_path=file.file.name).exists())
+        self.assertEqual(file_index.lookup(filename), file.file.path)
+    
+    def test_deleted_file_is_removed_from_index(self):
+        """Deleting a File removes it from the index"""
+        file = self._create_file()
+        storage_path = file.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            file.delete()
+        self.assertFalse(FileIndexEntry.objects.filter(storage_path=storage_path).exists())
+    
+    def test_stale_entries_are_pruned_on_lookup(self):
+        """Entries whose file has disappeared from disk are removed on lookup"""
+        file = self._create_file()
+        filename = os.path.basename(file.file.name)
+        os.remove(file.file.path)
+        self.assertIsNone(file_index.lookup(filename))
+        self.assertFalse(FileIndexEntry.objects.filter(filename=filename).exists())
+    
+    def test_rebuild_includes_files_on_disk(self):
+        """The rebuild command crawls the media directory once"""
+        os.makedirs(os.path.join(self.media_root, 'uploads'))
+        orphan_path = os.path.join(self.media_root, 'uploads', 'orphan.pdf')
+        with open(orphan_path, 'wb') as fh:
+            fh.write(b"%PDF-1.4 orphan")
+        file = self._create_file()
+        FileIndexEntry.objects.all().delete()
+        
+        call_command('rebuild_file_index', stdout=io.StringIO())
+        
+        self.assertEqual(file_index.lookup('orphan.pdf'), orphan_path)
+        self.assertEqual(
+            set(FileIndexEntry.objects.filter(storage_path=file.file.name).values_list('source', flat=True)),
+            {FileIndexEntry.SOURCE_FILE}
+        )
+    
+    def test_search_prefers_exact_match(self):
+        """Fragment search returns exact filename matches first"""
+        file = self._create_file()
+        filename = os.path.basename(file.file.name)
+        results = file_index.search(filename)
+        self.assertEqual([result[0] for result in results], [filename])
+        self.assertEqual(len(file_index.search('ritning')), 1)
+
+
+class RangeDeliveryTestCase(TestCase):
+    """Test cases for Range / partial content delivery of PDF files"""
+    
+    CONTENT = bytes(range(256)) * 40  # 10 240 bytes
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        
+        self.user = User.objects.create_user(
+            username="rangeuser",
+            email="rangeuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Range Project", start_date="2023-01-01")
+        self.file = File.objects.create(
+            name="ritning.pdf",
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", self.CONTENT, content_type="application/pdf"),
+            content_type="application/pdf",
+            size=len(self.CONTENT),
+            uploaded_by=self.user
+        )
+        self.url = reverse('get_file_content', kwargs={'file_id': self.file.id})
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_parse_range_header(self):
+        """Range headers are parsed, clamped and merged"""
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), [(0, 99)])
+        self.assertEqual(parse_range_header('bytes=900-', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=-100', 1000), [(900, 999)])
+        self.assertEqual(parse_range_header('bytes=0-5000', 1000), [(0, 999)])
+        self.assertEqual(parse_range_header('bytes=0-9,10-19,50-59', 1000), [(0, 19), (50, 59)])
+        self.assertEqual(parse_range_header('bytes=2000-3000', 1000), [])
+        self.assertIsNone(parse_range_header('items=0-1', 1000))
+        self.assertIsNone(parse_range_header('bytes=abc', 1000))
+        self.assertIsNone(parse_range_header(None, 1000))
+    
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+    
+    def test_full_response_advertises_ranges(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), len(self.CONTENT))
+        self.assertEqual(self._body(response), self.CONTENT)
+    
+    def test_single_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.CONTENT)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self._body(response), self.CONTENT[100:200])
+    
+    def test_multiple_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9,-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = self._body(response)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-9/10240', body)
+        self.assertIn(b'Content-Range: bytes 10230-10239/10240', body)
+        self.assertIn(self.CONTENT[:10], body)
+        self.assertIn(self.CONTENT[-10:], body)
+    
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENT)}')
+    
+    def test_if_range_mismatch_returns_full_file(self):
+        response = self.client.get(
+            self.url,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE=http_date(0)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.CONTENT)
+    
+    def test_if_range_match_returns_partial(self):
+        full = self.client.get(self.url)
+        response = self.client.get(
+            self.url,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE=full['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self._body(response), self.CONTENT[:10])
+    
+    def test_pdf_proxy_supports_ranges(self):
+        response = self.client.get(
+            reverse('pdf_proxy', kwargs={'file_id': self.file.id}),
+            HTTP_RANGE='bytes=10-19'
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self._body(response), self.CONTENT[10:20])
+    
+    def test_pdf_document_multiple_ranges(self):
+        """Multi-range responses keep their multipart Content-Type on the PDFDocument endpoint"""
+        RoleAccess.objects.create(user=self.user, project=self.project, role=RoleAccess.MEMBER)
+        document = PDFDocument.objects.create(
+            title="Ritning",
+            file=SimpleUploadedFile("ritning.pdf", self.CONTENT, content_type="application/pdf"),
+            size=len(self.CONTENT),
+            project=self.project,
+            uploaded_by=self.user
+        )
+        api = APIClient()
+        api.force_authenticate(self.user)
+        url = reverse('pdfdocument-content', args=[document.id])
+        
+        response = api.get(url, HTTP_RANGE='bytes=0-9,-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = self._body(response)
+        self.assertIn(b'Content-Type: application/pdf', body)
+        self.assertIn(b'Content-Range: bytes 0-9/10240', body)
+        self.assertIn(self.CONTENT[-10:], body)
+        
+        response = api.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+
+class DeliveryBackendTestCase(TestCase):
+    """Test cases for handing file transfers off to the front proxy"""
+    
+    CONTENT = b'%PDF-1.4 delivery backend test'
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        
+        self.user = User.objects.create_user(
+            username="deliveryuser",
+            email="deliveryuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Delivery Project", start_date="2023-01-01")
+        self.file = File.objects.create(
+            name="ritning.pdf",
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", self.CONTENT, content_type="application/pdf"),
+            content_type="application/pdf",
+            size=len(self.CONTENT),
+            uploaded_by=self.user
+        )
+        self.url = reverse('get_file_content', kwargs={'file_id': self.file.id})
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    @override_settings(FILE_DELIVERY_BACKEND='nginx', FILE_DELIVERY_ACCEL_PREFIX='/protected-media/')
+    def test_nginx_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.file.file.name}')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content, b'')
+    
+    @override_settings(FILE_DELIVERY_BACKEND='nginx')
+    def test_nginx_falls_back_outside_media_root(self):
+        outside_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside_dir, ignore_errors=True)
+        path = os.path.join(outside_dir, 'extern.pdf')
+        with open(path, 'wb') as f:
+            f.write(self.CONTENT)
+        
+        response = serve_file(RequestFactory().get('/', HTTP_RANGE='bytes=0-9'), path)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[:10])
+    
+    @override_settings(FILE_DELIVERY_BACKEND='xsendfile')
+    def test_xsendfile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], self.file.file.path)
+        self.assertEqual(response.content, b'')
+    
+    @override_settings(FILE_DELIVERY_BACKEND='okand')
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            serve_file(RequestFactory().get('/'), self.file.file.path)
+
+
+class ConditionalDeliveryTestCase(TestCase):
+    """Test cases for ETag/Last-Modified validation and version caching"""
+    
+    CONTENT = b'%PDF-1.4 version one'
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        
+        self.user = User.objects.create_user(
+            username="cacheuser",
+            email="cacheuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Cache Project", start_date="2023-01-01")
+        self.file = File.objects.create(
+            name="ritning.pdf",
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", self.CONTENT, content_type="application/pdf"),
+            content_type="application/pdf",
+            size=len(self.CONTENT),
+            uploaded_by=self.user
+        )
+        self.url = reverse('get_file_content', kwargs={'file_id': self.file.id})
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_sha256_computed_on_upload(self):
+        self.assertEqual(self.file.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+    
+    def test_missing_sha256_computed_lazily(self):
+        File.objects.filter(id=self.file.id).update(sha256='')
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.CONTENT).hexdigest()}"')
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+    
+    def test_version_url_is_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Last-Modified'], http_date(self.file.updated_at.timestamp()))
+    
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+    
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_latest_alias_revalidates(self):
+        newer = File.objects.create(
+            name="ritning.pdf",
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", b'%PDF-1.4 version two', content_type="application/pdf"),
+            content_type="application/pdf",
+            size=20,
+            version=2,
+            previous_version=self.file,
+            uploaded_by=self.user
+        )
+        response = self.client.get(reverse('get_latest_file_content', kwargs={'file_id': self.file.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertEqual(response['ETag'], f'"{newer.sha256}"')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 version two')
+
+
+class ResumableUploadTestCase(TestCase):
+    """Test cases for the resumable (tus) upload API"""
+    
+    CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 100
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.media_root, 'staging')
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RESUMABLE_UPLOAD_DIR=self.staging_dir
+        )
+        self.settings_override.enable()
+        
+        self.user = User.objects.create_user(
+            username="uploaduser",
+            email="uploaduser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Upload Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project)
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _metadata(self, **values):
+        return ','.join(
+            f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in values.items()
+        )
+    
+    def _create(self, length=None):
+        return self.client.post(
+            reverse('resumable_upload_create') + f'?directory_slug={self.directory.slug}',
+            HTTP_TUS_RESUMABLE='1.0.0',
+            HTTP_UPLOAD_LENGTH=str(len(self.CONTENT) if length is None else length),
+            HTTP_UPLOAD_METADATA=self._metadata(filename='stor ritning.pdf', description='A1')
+        )
+    
+    def _patch(self, location, offset, data):
+        return self.client.generic(
+            'PATCH', location, data,
+            content_type='application/offset+octet-stream',
+            HTTP_TUS_RESUMABLE='1.0.0',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+    
+    def test_options_advertises_tus(self):
+        response = self.client.options(reverse('resumable_upload_create'))
+        self.assertEqual(response['Tus-Version'], '1.0.0')
+        self.assertIn('creation', response['Tus-Extension'])
+    
+    def test_requires_tus_header(self):
+        response = self.client.post(reverse('resumable_upload_create'), HTTP_UPLOAD_LENGTH='10')
+        self.assertEqual(response.status_code, 412)
+    
+    def test_chunked_upload_and_finalize(self):
+        response = self._create()
+        self.assertEqual(response.status_code, 201)
+        location = response['Location']
+        self.assertFalse(File.objects.exists())
+        
+        # Första biten
+        response = self._patch(location, 0, self.CONTENT[:1000])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        
+        # Fel offset ger 409 med aktuellt offset
+        response = self._patch(location, 0, self.CONTENT[:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '1000')
+        
+        # Återuppta från offset som HEAD rapporterar
+        head = self.client.head(location, HTTP_TUS_RESUMABLE='1.0.0')
+        self.assertEqual(head['Upload-Offset'], '1000')
+        self.assertEqual(head['Upload-Length'], str(len(self.CONTENT)))
+        
+        response = self._patch(location, 1000, self.CONTENT[1000:])
+        self.assertEqual(response['Upload-Offset'], str(len(self.CONTENT)))
+        
+        response = self.client.post(location + 'finalize/')
+        self.assertEqual(response.status_code, 201)
+        file_obj = File.objects.get(id=response.data['file_id'])
+        self.assertEqual(file_obj.name, 'stor ritning')
+        self.assertEqual(file_obj.description, 'A1')
+        self.assertEqual(file_obj.directory, self.directory)
+        self.assertEqual(file_obj.size, len(self.CONTENT))
+        self.assertEqual(file_obj.sha256, hashlib.sha256(self.CONTENT).hexdigest())
+        with open(file_obj.file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.CONTENT)
+        self.assertEqual(os.listdir(self.staging_dir), [])
+    
+    def test_finalize_hashes_assembled_file(self):
+        """Chunks may reach different worker processes, so the hash is taken from the file on disk"""
+        location = self._create()['Location']
+        self._patch(location, 0, self.CONTENT[:100])
+        self._patch(location, 100, self.CONTENT[100:])
+        response = self.client.post(location + 'finalize/')
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.CONTENT).hexdigest())
+    
+    def test_concurrent_patch_does_not_overwrite(self):
+        """A PATCH that loses the race for the offset must leave the received bytes alone"""
+        location = self._create()['Location']
+        stale = UploadSession.objects.get()
+        self._patch(location, 0, self.CONTENT[:1000])
+        
+        from . import upload_api
+        request = mock.Mock(stream=io.BytesIO(b'x' * 500))
+        self.assertIsNone(upload_api._receive_chunk(request, stale))
+        
+        with open(stale.temp_path, 'rb') as temp_file:
+            self.assertEqual(temp_file.read(), self.CONTENT[:1000])
+        self.assertEqual(os.listdir(self.staging_dir), [os.path.basename(stale.temp_path)])
+        self.assertEqual(UploadSession.objects.get().offset, 1000)
+    
+    def test_finalize_retry_returns_existing_file(self):
+        location = self._create()['Location']
+        self._patch(location, 0, self.CONTENT)
+        first = self.client.post(location + 'finalize/')
+        self.assertEqual(first.status_code, 201)
+        
+        retry = self.client.post(location + 'finalize/')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data['file_id'], first.data['file_id'])
+        self.assertEqual(retry.data['sha256'], first.data['sha256'])
+        self.assertEqual(File.objects.count(), 1)
+    
+    def test_finalize_incomplete_upload(self):
+        location = self._create()['Location']
+        self._patch(location, 0, self.CONTENT[:10])
+        response = self.client.post(location + 'finalize/')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(File.objects.exists())
+    
+    def test_terminate_upload(self):
+        location = self._create()['Location']
+        self._patch(location, 0, self.CONTENT[:10])
+        response = self.client.delete(location, HTTP_TUS_RESUMABLE='1.0.0')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        self.assertEqual(self.client.head(location, HTTP_TUS_RESUMABLE='1.0.0').status_code, 404)
+    
+    @override_settings(RESUMABLE_UPLOAD_MAX_SIZE=100)
+    def test_upload_too_large(self):
+        self.assertEqual(self._create().status_code, 413)
+
+
+class BlobStorageTestCase(TestCase):
+    """Test cases for the content-addressed blob storage"""
+    
+    CONTENT = b'%PDF-1.4 shared drawing'
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, JOBS_RUN_INLINE=True)
+        self.settings_override.enable()
+        
+        self.user = User.objects.create_user(
+            username="blobuser",
+            email="blobuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Blob Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Granskning", project=self.project)
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _create_file(self, name="ritning.pdf", content=None):
+        content = self.CONTENT if content is None else content
+        return File.objects.create(
+            name=name,
+            directory=self.directory,
+            project=self.project,
+            file=SimpleUploadedFile(name, content, content_type="application/pdf"),
+            content_type="application/pdf",
+            size=len(content),
+            uploaded_by=self.user
+        )
+    
+    def test_duplicate_uploads_share_one_blob(self):
+        first = self._create_file("ritning.pdf")
+        second = self._create_file("kopia.pdf")
+        sha256 = hashlib.sha256(self.CONTENT).hexdigest()
+        
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.file.name, f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf")
+        self.assertEqual(Blob.objects.get(sha256=sha256).ref_count, 2)
+        blob_dir = os.path.dirname(first.file.path)
+        self.assertEqual(os.listdir(blob_dir), [f"{sha256}.pdf"])
+    
+    def test_blob_collected_after_last_reference(self):
+        first = self._create_file()
+        second = self._create_file()
+        path = first.file.path
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('delete_file', kwargs={'file_id': first.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+    
+    def test_delete_directory_collects_blobs(self):
+        path = self._create_file().file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('delete_directory', kwargs={'slug': self.directory.slug}))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(path))
+    
+    def test_migrate_legacy_files(self):
+        file = self._create_file()
+        legacy_name = 'project_files/2024/01/01/ritning.pdf'
+        os.makedirs(os.path.join(self.media_root, 'project_files/2024/01/01'))
+        with open(os.path.join(self.media_root, legacy_name), 'wb') as fh:
+            fh.write(self.CONTENT)
+        legacy = File.objects.create(
+            name="ritning.pdf",
+            project=self.project,
+            file=legacy_name,
+            content_type="application/pdf",
+            size=len(self.CONTENT),
+            uploaded_by=self.user
+        )
+        
+        call_command('migrate_to_blob_storage', stdout=io.StringIO())
+        
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.file.name, file.file.name)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, legacy_name)))
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+    
+    def test_blob_found_by_display_name(self):
+        file = self._create_file("ritning.pdf")
+        self.assertEqual(file_index.lookup("ritning.pdf"), file.file.path)
+
+
+class ListQueryCountTestCase(QueryCountMixin, TestCase):
+    """List endpoints must not issue queries per serialized row"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="listuser",
+            email="listuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(
+            name="List Project",
+            description="Query count project",
+            start_date="2023-01-01"
+        )
+        RoleAccess.objects.create(user=self.user, project=self.project, role=RoleAccess.MEMBER)
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project, created_by=self.user)
+        # Inga autentiseringsklasser är konfigurerade, så användaren sätts direkt på requesten
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.counter = 0
+    
+    def _uploader(self):
+        # Varje rad får en egen användare så att en fråga per rad syns i räkningen
+        self.counter += 1
+        return User.objects.create_user(
+            username=f"uploader{self.counter}",
+            email=f"uploader{self.counter}@example.com",
+            password="securepassword123"
+        )
+    
+    def _create_files(self, count):
+        for _ in range(count):
+            File.objects.create(
+                name=f"ritning{self.counter}.pdf",
+                directory=self.directory,
+                project=self.project,
+                file=f"project_files/ritning{self.counter}.pdf",
+                content_type="application/pdf",
+                size=10,
+                uploaded_by=self._uploader()
+            )
+    
+    def _create_annotations(self, count):
+        for _ in range(count):
+            self._create_files(1)
+            file = File.objects.latest('id')
+            PDFAnnotation.objects.create(
+                file=file,
+                project=self.project,
+                x=0, y=0, width=10, height=10,
+                page_number=1,
+                comment="Kontrollera måttet",
+                created_by=self._uploader(),
+                assigned_to=self._uploader()
+            )
+    
+    def _create_pdf_documents(self, count):
+        for _ in range(count):
+            uploader = self._uploader()
+            PDFDocument.objects.create(
+                title=f"Dokument {self.counter}",
+                file=f"pdf_documents/dokument{self.counter}.pdf",
+                size=10,
+                project=self.project,
+                uploaded_by=uploader
+            )
+    
+    def test_file_list(self):
+        self.assertConstantQueries(reverse('file-list'), self._create_files)
+    
+    def test_annotation_list(self):
+        self.assertConstantQueries(reverse('pdfannotation-list'), self._create_annotations)
+    
+    def test_workspace_pdf_list(self):
+        self.assertConstantQueries(reverse('pdfdocument-list'), self._create_pdf_documents)
+    
+    def test_cursor_pagination(self):
+        """Listorna pagineras med opaka cursorer och en djup sida kostar lika mycket som första"""
+        self._create_pdf_documents(25)
+        url = reverse('pdfdocument-list')
+        # Värm medlemskapscachen (core.membership) så att alla sidor mäts likadant
+        self.client.get(url, {'page_size': 10})
+        
+        with CaptureQueriesContext(connection) as first_queries:
+            first = self.client.get(url, {'page_size': 10}).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertNotIn('page=', first['next'])
+        
+        seen = [item['id'] for item in first['results']]
+        page = first
+        while page['next']:
+            with CaptureQueriesContext(connection) as page_queries:
+                page = self.client.get(page['next']).json()
+            self.assertEqual(len(page_queries), len(first_queries))
+            seen.extend(item['id'] for item in page['results'])
+        
+        expected = list(PDFDocument.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+
+def make_pdf(pages):
+    """Minimal PDF med en textrad per sida"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+class SearchIndexTestCase(TestCase):
+    """Test cases for the full-text search index"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="searchuser",
+            email="searchuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Search Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project, created_by=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, RENDITIONS_ON_UPLOAD=False, JOBS_RUN_INLINE=True)
+        self.override.enable()
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _upload(self, name, pages, description=''):
+        with self.captureOnCommitCallbacks(execute=True):
+            return File.objects.create(
+                name=name,
+                description=description,
+                directory=self.directory,
+                project=self.project,
+                file=SimpleUploadedFile(name, make_pdf(pages), content_type="application/pdf"),
+                content_type="application/pdf",
+                size=100,
+                uploaded_by=self.user
+            )
+    
+    def test_pdf_text_indexed_per_page(self):
+        file = self._upload("plan.pdf", ["Planritning plan 2", "Brandcell EI60 vid trapphus"])
+        hits = search.search("trapphus")
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]['kind'], SearchEntry.KIND_PAGE)
+        self.assertEqual(hits[0]['key'], file.sha256)
+        self.assertEqual(hits[0]['page_number'], 2)
+        self.assertIn('[trapphus]', hits[0]['snippet'])
+    
+    def test_same_content_extracted_once(self):
+        self._upload("plan.pdf", ["Sektion A-A"])
+        self._upload("kopia.pdf", ["Sektion A-A"])
+        self.assertEqual(SearchEntry.objects.filter(kind=SearchEntry.KIND_PAGE).count(), 1)
+    
+    def test_prefix_and_ranking(self):
+        self._upload("a.pdf", ["ventilation"])
+        self._upload("b.pdf", ["ventilation ventilation ventilationsaggregat"])
+        hits = search.search("ventil", kinds=[SearchEntry.KIND_PAGE])
+        self.assertEqual(len(hits), 2)
+        self.assertGreaterEqual(hits[0]['rank'], hits[1]['rank'])
+    
+    def test_name_and_description_updated_incrementally(self):
+        file = self._upload("gammal.pdf", ["x"], description="Fasad mot gatan")
+        self.assertTrue(search.search("fasad"))
+        file.name = "nyritning.pdf"
+        file.save()
+        self.assertEqual(search.matching_keys("nyritning", SearchEntry.KIND_FILE), [str(file.id)])
+        self.assertEqual(search.matching_keys("gammal", SearchEntry.KIND_FILE), [])
+        file.delete()
+        self.assertEqual(search.matching_keys("nyritning", SearchEntry.KIND_FILE), [])
+    
+    def test_annotation_comments(self):
+        file = self._upload("plan.pdf", ["x"])
+        annotation = PDFAnnotation.objects.create(
+            file=file, project=self.project, x=0, y=0, width=1, height=1,
+            page_number=3, comment="Saknar brandskydd", created_by=self.user
+        )
+        response = self.client.get(reverse('pdfannotation-list'), {'search': 'brandskydd'})
+        self.assertEqual([a['id'] for a in response.json()['results']], [annotation.id])
+        annotation.delete()
+        self.assertEqual(search.search("brandskydd"), [])
+    
+    def test_search_endpoint(self):
+        file = self._upload("plan.pdf", ["Planritning", "Brandcell EI60 vid trapphus"])
+        response = self.client.get(reverse('search'), {'q': 'EI60 trapphus'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['type'], 'file')
+        self.assertEqual(results[0]['id'], file.id)
+        self.assertEqual(results[0]['page_number'], 2)
+        self.assertEqual(self.client.get(reverse('search')).status_code, 400)
+    
+    def test_file_list_search_filter(self):
+        file = self._upload("plan.pdf", ["Dagvattenledning"])
+        self._upload("annan.pdf", ["Elcentral"])
+        response = self.client.get(reverse('file-list'), {'search': 'dagvatten'})
+        self.assertEqual([f['id'] for f in response.json()['results']], [file.id])
+    
+    def test_list_filter_has_no_match_limit(self):
+        SearchEntry.objects.bulk_create(
+            SearchEntry(kind=SearchEntry.KIND_PAGE, key=f"{n:064x}", page_number=1, text="Stomritning")
+            for n in range(1200)
+        )
+        self.assertEqual(len(search.matching_keys("stomritning", SearchEntry.KIND_PAGE)), 1200)
+    
+    def test_rebuild_command(self):
+        file = self._upload("plan.pdf", ["Takplan"])
+        SearchEntry.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('build_search_index', stdout=io.StringIO())
+        # Bara kolumnerna som behövs läses, så att äldre workspace-tabeller inte stoppar ombyggnaden
+        self.assertFalse([q['sql'] for q in queries if '"workspace_fileversion"."created_by_id"' in q['sql']])
+        self.assertEqual(search.matching_keys("takplan", SearchEntry.KIND_PAGE), [file.sha256])
+        self.assertEqual(search.matching_keys("plan", SearchEntry.KIND_FILE), [str(file.id)])
+
+
+class SearchSchemaMigrationTestCase(TransactionTestCase):
+    """The database-specific full-text schema is created and removed by migrations"""
+    
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+    
+    def _fts_objects(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') "
+                "AND name IN (%s, 'files_searchentry_ai', 'files_searchentry_ad', 'files_searchentry_au')",
+                [search.FTS_TABLE]
+            )
+            return {row[0] for row in cursor.fetchall()}
+    
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 används bara med SQLite")
+    def test_rollback_and_reapply(self):
+        self._migrate(('files', '0011_pdfannotation_created_index'))
+        self.assertEqual(self._fts_objects(), set())
+        self._migrate(('files', '0015_searchentry_fulltext'))
+        self.assertEqual(len(self._fts_objects()), 4)
+        # Triggrarna finns igen, så indexet följer tabellen
+        search.index_object(SearchEntry.KIND_FILE, 1, "Schaktritning")
+        self.assertEqual(search.matching_keys("schaktritning", SearchEntry.KIND_FILE), ['1'])
+
+
+class RenditionTestCase(TestCase):
+    """Test cases for page thumbnails in the rendition cache"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="thumbuser",
+            email="thumbuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Thumb Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project, created_by=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RENDITION_CACHE_DIR=os.path.join(self.media_root, 'renditions'),
+            SEARCH_EXTRACT_ON_UPLOAD=False,
+            JOBS_RUN_INLINE=True
+        )
+        self.override.enable()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.file = File.objects.create(
+                name="plan.pdf",
+                directory=self.directory,
+                project=self.project,
+                file=SimpleUploadedFile("plan.pdf", make_pdf(["Plan 1", "Plan 2", "Plan 3"]), content_type="application/pdf"),
+                content_type="application/pdf",
+                size=100,
+                uploaded_by=self.user
+            )
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_generated_after_upload(self):
+        sha256 = self.file.sha256
+        for size in renditions.SIZES:
+            self.assertTrue(os.path.exists(renditions.rendition_path(sha256, 1, size)))
+        self.assertTrue(os.path.exists(renditions.rendition_path(sha256, 3, renditions.PAGE_SIZE)))
+        self.assertFalse(os.path.exists(renditions.rendition_path(sha256, 3, 'large')))
+    
+    def test_served_immutable_when_pinned(self):
+        response = self.client.get(self.file.get_thumbnail_url('small'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        
+        unpinned = self.client.get(reverse('file_rendition', args=[self.file.id, 1, 'small']))
+        self.assertEqual(unpinned['Cache-Control'], 'private, no-cache')
+        
+        not_modified = self.client.get(self.file.get_thumbnail_url('small'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+    
+    def test_regenerated_on_miss(self):
+        path = renditions.rendition_path(self.file.sha256, 2, 'large')
+        self.assertFalse(os.path.exists(path))
+        response = self.client.get(reverse('file_rendition', args=[self.file.id, 2, 'large']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(path))
+        
+        from PIL import Image
+        with Image.open(path) as image:
+            self.assertEqual(max(image.size), renditions.SIZES['large'])
+    
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('file_rendition', args=[self.file.id, 1, 'huge'])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('file_rendition', args=[self.file.id, 9, 'small'])).status_code, 404)
+    
+    def test_directory_data_lists_thumbnails(self):
+        response = self.client.get(reverse('directory_data_api', kwargs={'slug': self.directory.slug}))
+        thumbnail = response.json()['files'][0]['thumbnail_url']
+        self.assertIn(f"?v={self.file.sha256[:12]}", thumbnail)
+    
+    def test_removed_with_blob(self):
+        sha256 = self.file.sha256
+        with self.captureOnCommitCallbacks(execute=True):
+            self.file.delete()
+        self.assertFalse(os.path.exists(renditions.rendition_path(sha256, 1, 'small')))
+
+@override_settings(TILE_MAX_SCALE=1.0)
+class TileTestCase(TestCase):
+    """Test cases for the deep-zoom tile pyramid"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="tileuser",
+            email="tileuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Tile Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project, created_by=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RENDITION_CACHE_DIR=os.path.join(self.media_root, 'renditions'),
+            SEARCH_EXTRACT_ON_UPLOAD=False,
+            RENDITIONS_ON_UPLOAD=False
+        )
+        self.override.enable()
+        self.file = File.objects.create(
+            name="a0.pdf",
+            directory=self.directory,
+            project=self.project,
+            file=SimpleUploadedFile("a0.pdf", make_pdf(["Plan 1", "Plan 2"]), content_type="application/pdf"),
+            content_type="application/pdf",
+            size=100,
+            uploaded_by=self.user
+        )
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_page_layout(self):
+        layout = tiles.page_layout(2384, 3370)  # A0 i punkter
+        self.assertEqual(layout['levels'][0]['rows'], 1)
+        self.assertEqual(layout['levels'][0]['height'], tiles.TILE_SIZE)
+        top = layout['levels'][layout['max_zoom']]
+        self.assertGreaterEqual(top['height'], 3370)
+        self.assertLess(top['height'] / 2, 3370)
+        self.assertEqual(top['rows'], top['height'] // tiles.TILE_SIZE)
+    
+    def test_tile_info_and_lazy_tile(self):
+        info = self.client.get(reverse('file_tile_info', args=[self.file.id, 1])).json()
+        self.assertEqual(info['tile_size'], tiles.TILE_SIZE)
+        self.assertEqual(len(info['levels']), info['max_zoom'] + 1)
+        self.assertIn('{z}/{x}/{y}/', info['tile_url'])
+        
+        z = info['max_zoom']
+        url = info['tile_url'].replace('{z}', str(z)).replace('{x}', '1').replace('{y}', '1')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        
+        # Hela blocket runt tilen renderas, men inga andra nivåer
+        self.assertTrue(os.path.exists(tiles.tile_path(self.file.sha256, 1, z, 0, 0)))
+        self.assertFalse(os.path.exists(tiles.tile_path(self.file.sha256, 1, 0, 0, 0)))
+        
+        from PIL import Image
+        with Image.open(tiles.tile_path(self.file.sha256, 1, z, 0, 0)) as image:
+            self.assertEqual(image.size, (tiles.TILE_SIZE, tiles.TILE_SIZE))
+    
+    def test_out_of_range(self):
+        self.assertEqual(self.client.get(reverse('file_tile', args=[self.file.id, 1, 12, 0, 0])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('file_tile', args=[self.file.id, 1, 0, 3, 0])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('file_tile_info', args=[self.file.id, 5])).status_code, 404)
+    
+    def test_generate_pyramid_resumes(self):
+        sha256, path = self.file.sha256, self.file.file.path
+        layout = tiles.get_layout(sha256, path, 1)
+        top = layout['max_zoom']
+        tiles.get_or_render_tile(sha256, path, 1, top, 0, 0)
+        
+        rendered = tiles.generate_pyramid(sha256, path, pages=[1], workers=1)
+        self.assertEqual(rendered, top)  # nivåerna under den redan renderade
+        for z, level in enumerate(layout['levels']):
+            for x in range(level['columns']):
+                for y in range(level['rows']):
+                    self.assertTrue(os.path.exists(tiles.tile_path(sha256, 1, z, x, y)))
+        self.assertEqual(tiles.generate_pyramid(sha256, path, pages=[1], workers=1), 0)
+
+class PDFMetadataTestCase(TestCase):
+    """Test cases for PDF structure metadata read on upload"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="metauser",
+            email="metauser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Meta Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project, created_by=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            SEARCH_EXTRACT_ON_UPLOAD=False,
+            RENDITIONS_ON_UPLOAD=False
+        )
+        self.override.enable()
+        self.file = File.objects.create(
+            name="plan.pdf",
+            directory=self.directory,
+            project=self.project,
+            file=SimpleUploadedFile("plan.pdf", make_pdf(["Plan 1", "Plan 2"]), content_type="application/pdf"),
+            content_type="application/pdf",
+            size=100,
+            uploaded_by=self.user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_read_on_upload(self):
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.page_count, 2)
+        page = self.file.pdf_metadata['pages'][0]
+        self.assertEqual((page['width'], page['height'], page['rotation']), (612, 792, 0))
+        self.assertEqual(self.file.pdf_metadata['version'], '1.4')
+        self.assertEqual(self.file.pdf_metadata['outline'], [])
+        # Filen ska fortfarande vara läsbar efter att metadata lästs från uppladdningsströmmen
+        self.assertEqual(hashlib.sha256(self.file.file.read()).hexdigest(), self.file.sha256)
+    
+    def test_exposed_in_api(self):
+        response = self.client.get(reverse('file-detail', args=[self.file.id]))
+        self.assertEqual(response.json()['page_count'], 2)
+        
+        data = self.client.get(reverse('directory_data_api', kwargs={'slug': self.directory.slug})).json()
+        self.assertEqual(data['files'][0]['pages'][1], {'width': 612, 'height': 792, 'rotation': 0})
+    
+    def test_backfill_command(self):
+        File.objects.filter(id=self.file.id).update(page_count=None, pdf_metadata={})
+        call_command('extract_pdf_metadata', stdout=io.StringIO())
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.page_count, 2)
+    
+    def test_annotation_validated_against_pages(self):
+        url = reverse('pdfannotation-list')
+        base = {
+            'file': self.file.id, 'project': self.project.id,
+            'x': 100, 'y': 100, 'width': 50, 'height': 20, 'page_number': 2, 'comment': "Kontrollera mått"
+        }
+        self.assertEqual(self.client.post(url, base, format='json').status_code, 201)
+        
+        response = self.client.post(url, dict(base, page_number=3), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('page_number', response.json())
+        
+        self.assertEqual(self.client.post(url, dict(base, x=600), format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, dict(base, y=-20), format='json').status_code, 400)
+
+class LinearizeTestCase(TestCase):
+    """Test cases for linearized copies served for viewing"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="linuser",
+            email="linuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Lin Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Ritningar", project=self.project, created_by=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RENDITION_CACHE_DIR=os.path.join(self.media_root, 'renditions'),
+            SEARCH_EXTRACT_ON_UPLOAD=False,
+            JOBS_RUN_INLINE=True,
+            RENDITIONS_ON_UPLOAD=False,
+            LINEARIZE_MIN_SIZE=0
+        )
+        self.override.enable()
+        self.content = make_pdf([f"Sida {number}" for number in range(1, 6)])
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _create_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return File.objects.create(
+                name="plan.pdf",
+                directory=self.directory,
+                project=self.project,
+                file=SimpleUploadedFile("plan.pdf", self.content, content_type="application/pdf"),
+                content_type="application/pdf",
+                size=len(self.content),
+                uploaded_by=self.user
+            )
+    
+    def test_linearized_copy_served_for_viewing(self):
+        file_obj = self._create_file()
+        path = linearize.optimized_path(file_obj.sha256)
+        self.assertTrue(linearize.is_linearized(path))
+        self.assertFalse(linearize.is_linearized(file_obj.file.path))
+        
+        url = reverse('get_file_content', args=[file_obj.id])
+        response = self.client.get(url)
+        self.assertEqual(response['ETag'], f'"{file_obj.sha256}-linearized"')
+        self.assertIn(b'/Linearized', b''.join(response.streaming_content)[:1024])
+        
+        original = self.client.get(url, {'download': 1})
+        self.assertEqual(original['ETag'], f'"{file_obj.sha256}"')
+        self.assertEqual(b''.join(original.streaming_content), self.content)
+    
+    def test_small_files_skipped(self):
+        with override_settings(LINEARIZE_MIN_SIZE=1024 * 1024):
+            file_obj = self._create_file()
+        self.assertFalse(os.path.exists(linearize.optimized_path(file_obj.sha256)))
+    
+    def test_benchmark_first_page(self):
+        # Större än ett Range-block, så att korsreferenserna i slutet kräver en egen rundresa
+        self.content = make_pdf([f"Sida {number} " + "x" * 1500 for number in range(1, 101)])
+        with override_settings(LINEARIZE_ON_UPLOAD=False):
+            file_obj = self._create_file()
+        out = io.StringIO()
+        call_command('benchmark_first_page', str(file_obj.id), '--json', stdout=out)
+        result = json.loads(out.getvalue())[0]
+        self.assertLess(result['after']['round_trips'], result['before']['round_trips'])
+        self.assertLess(result['after']['seconds'], result['before']['seconds'])
+        self.assertFalse(os.path.exists(linearize.optimized_path(file_obj.sha256)))
+
+class DirectoryArchiveTestCase(TestCase):
+    """Test cases for streaming ZIP downloads of a directory subtree"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="zipuser",
+            email="zipuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Zip Project", start_date="2023-01-01")
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.root = Directory.objects.create(name="K-ritningar", project=self.project)
+        self.child = Directory.objects.create(name="Plan", project=self.project, parent=self.root)
+        self.v1 = self._add_file(self.root, "fasad.pdf", b"%PDF fasad v1")
+        self.v2 = self._add_file(self.root, "fasad.pdf", b"%PDF fasad v2", previous_version=self.v1, version=2)
+        self.note = self._add_file(self.child, "anteckning.txt", "mått ".encode() * 1000, content_type="text/plain")
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _add_file(self, directory, name, content, content_type="application/pdf", **kwargs):
+        return File.objects.create(
+            name=name,
+            directory=directory,
+            project=self.project,
+            file=SimpleUploadedFile(name, content, content_type=content_type),
+            content_type=content_type,
+            size=len(content),
+            uploaded_by=self.user,
+            **kwargs
+        )
+    
+    def _download(self, **params):
+        response = self.client.get(reverse('directory-download', args=[self.root.id]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('K-ritningar.zip', response['Content-Disposition'])
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+    
+    def test_latest_files_with_directory_paths(self):
+        archive = self._download()
+        self.assertEqual(sorted(archive.namelist()), ['K-ritningar/Plan/anteckning.txt', 'K-ritningar/fasad.pdf'])
+        self.assertEqual(archive.read('K-ritningar/fasad.pdf'), b"%PDF fasad v2")
+        self.assertEqual(archive.getinfo('K-ritningar/fasad.pdf').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo('K-ritningar/Plan/anteckning.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertIsNone(archive.testzip())
+    
+    def test_chosen_versions(self):
+        archive = self._download(files=f"{self.v1.id},{self.v2.id}")
+        self.assertEqual(archive.namelist(), ['K-ritningar/fasad.pdf', 'K-ritningar/fasad (2).pdf'])
+        self.assertEqual(archive.read('K-ritningar/fasad.pdf'), b"%PDF fasad v1")
+    
+    def test_subdirectory_is_archive_root(self):
+        response = self.client.get(reverse('directory-download', args=[self.child.id]))
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['Plan/anteckning.txt'])
+    
+    def test_sizes_from_database(self):
+        """The archive does not ask the storage for sizes (a HEAD request per file with S3)"""
+        storage = File._meta.get_field('file').storage
+        with mock.patch.object(storage, 'size', side_effect=AssertionError("storage.size called")):
+            entries = archive.archive_entries(self.root)
+        self.assertEqual(sorted(entry[2] for entry in entries), sorted([self.v2.size, self.note.size]))
+    
+    def test_missing_file_left_out(self):
+        os.remove(self.note.file.path)
+        archive = self._download()
+        self.assertEqual(archive.namelist(), ['K-ritningar/fasad.pdf'])
+        self.assertIsNone(archive.testzip())
+    
+    def test_invalid_file_ids(self):
+        response = self.client.get(reverse('directory-download', args=[self.root.id]), {'files': 'a,b'})
+        self.assertEqual(response.status_code, 400)
+
+class BatchUploadTestCase(TestCase):
+    """Test cases for the batch upload API"""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.media_root, 'staging')
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RESUMABLE_UPLOAD_DIR=self.staging_dir,
+            RENDITIONS_ON_UPLOAD=False,
+            JOBS_RUN_INLINE=True
+        )
+        self.override.enable()
+        self.user = User.objects.create_user(
+            username="batchuser",
+            email="batchuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Batch Project", start_date="2023-01-01")
+        self.directory = Directory.objects.create(name="Leverans", project=self.project)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api_batch_upload') + f'?directory_slug={self.directory.slug}'
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _pdf(self, name, pages):
+        return SimpleUploadedFile(name, make_pdf(pages), content_type="application/pdf")
+    
+    def test_many_files_created_in_bulk(self):
+        uploads = [self._pdf(f"plan {i}.pdf", [f"Plan {i}"] * (i + 1)) for i in range(3)]
+        uploads.append(self._pdf("kopia.pdf", ["Plan 0"]))
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {'files': uploads}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual([r['filename'] for r in response.data['results']], ['plan 0.pdf', 'plan 1.pdf', 'plan 2.pdf', 'kopia.pdf'])
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "files_file"')]
+        self.assertEqual(len(inserts), 1)
+        
+        files = {f.name: f for f in File.objects.filter(directory=self.directory)}
+        self.assertEqual(sorted(files), ['kopia', 'plan 0', 'plan 1', 'plan 2'])
+        self.assertEqual(files['plan 2'].page_count, 3)
+        self.assertEqual(files['plan 2'].uploaded_by, self.user)
+        self.assertEqual(files['plan 1'].sha256, hashlib.sha256(make_pdf(["Plan 1"] * 2)).hexdigest())
+        # Samma innehåll delar blob, referenserna räknas per fil
+        self.assertEqual(files['kopia'].file.name, files['plan 0'].file.name)
+        self.assertEqual(Blob.objects.get(sha256=files['plan 0'].sha256).ref_count, 2)
+        self.assertEqual(Blob.objects.count(), 3)
+        self.assertTrue(SearchEntry.objects.filter(kind=SearchEntry.KIND_PAGE, key=files['plan 2'].sha256).exists())
+    
+    def test_query_count_independent_of_batch_size(self):
+        """Signal side effects are applied once per batch, not once per file"""
+        def post(first, count):
+            uploads = [self._pdf(f"ritning {i}.pdf", [f"Ritning {i}"]) for i in range(first, first + count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {'files': uploads}, format='multipart')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+        
+        self.assertEqual(post(0, 2), post(2, 6))
+        self.assertEqual(FileIndexEntry.objects.filter(storage_path__startswith='blobs/').values('storage_path').distinct().count(), 8)
+        self.assertEqual(SearchEntry.objects.filter(kind=SearchEntry.KIND_FILE).count(), 8)
+        self.assertEqual(set(Blob.objects.values_list('ref_count', flat=True)), {1})
+    
+    def test_partial_failure(self):
+        uploads = [
+            self._pdf("plan.pdf", ["Plan"]),
+            SimpleUploadedFile("bild.png", b"png", content_type="image/png"),
+            SimpleUploadedFile("falsk.pdf", b"inte en pdf", content_type="application/pdf"),
+        ]
+        response = self.client.post(self.url, {'files': uploads}, format='multipart')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error'])
+        self.assertEqual(File.objects.count(), 1)
+    
+    def test_completed_resumable_uploads(self):
+        content = make_pdf(["Stor plan"])
+        session = UploadSession.objects.create(
+            directory=self.directory, filename="stor.pdf", name="stor", length=len(content), offset=len(content)
+        )
+        os.makedirs(self.staging_dir, exist_ok=True)
+        with open(session.temp_path, 'wb') as temp_file:
+            temp_file.write(content)
+        response = self.client.post(self.url, {'upload_ids': [str(session.upload_id), 'okänd']}, format='multipart')
+        self.assertEqual(response.status_code, 207)
+        session.refresh_from_db()
+        self.assertEqual(session.file.name, 'stor')
+        self.assertEqual(session.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(os.listdir(self.staging_dir), [])
+    
+    def test_no_files(self):
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, 400)
+    
+    @override_settings(BATCH_UPLOAD_MAX_FILES=1)
+    def test_too_many_files(self):
+        uploads = [self._pdf("a.pdf", ["A"]), self._pdf("b.pdf", ["B"])]
+        response = self.client.post(self.url, {'files': uploads}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(File.objects.exists())
+
+class AsyncDeliveryTestCase(TestCase):
+    """Test cases for the async file delivery views under ASGI"""
+    
+    CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 1024
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username="asyncuser",
+            email="asyncuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Async Project", start_date="2023-01-01")
+        self.file = File.objects.create(
+            name="ritning.pdf",
+            project=self.project,
+            file=SimpleUploadedFile("ritning.pdf", self.CONTENT, content_type="application/pdf"),
+            content_type="application/pdf",
+            size=len(self.CONTENT),
+            uploaded_by=self.user
+        )
+        self.url = reverse('get_file_content', kwargs={'file_id': self.file.id})
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    async def _body(self, response):
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content])
+    
+    async def test_streams_asynchronously(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response['Content-Length']), len(self.CONTENT))
+        self.assertEqual(response['ETag'], f'"{self.file.sha256}"')
+        self.assertEqual(await self._body(response), self.CONTENT)
+        
+        response = await self.async_client.get(self.url, headers={'If-None-Match': f'"{self.file.sha256}"'})
+        self.assertEqual(response.status_code, 304)
+    
+    async def test_ranges(self):
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=100000-100099'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await self._body(response), self.CONTENT[100000:100100])
+        
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=0-9,-10'})
+        self.assertEqual(response.status_code, 206)
+        body = await self._body(response)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(self.CONTENT[-10:], body)
+    
+    async def test_proxy_and_media_views(self):
+        for url in (
+            reverse('pdf_proxy', kwargs={'file_id': self.file.id}),
+            reverse('direct_media_file', kwargs={'path': self.file.file.name}),
+            reverse('serve_pdf_file', kwargs={'file_path': self.file.file.name}),
+        ):
+            response = await self.async_client.get(url, headers={'Range': 'bytes=10-19'})
+            self.assertEqual(response.status_code, 206, url)
+            self.assertEqual(await self._body(response), self.CONTENT[10:20])
+        
+        response = await self.async_client.get(reverse('pdf_proxy', kwargs={'file_id': self.file.id + 1}))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_wsgi_keeps_sendfile(self):
+        response = self.client.get(self.url)
+        self.assertIsInstance(response, FileResponse)
+        self.assertFalse(response.is_async)
+
+
+class LoadTestCommandTestCase(LiveServerTestCase):
+    """Test cases for the download load test command"""
+    
+    def test_slow_downloads_against_live_server(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with open(os.path.join(media_root, 'last.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4 ' + b'x' * 100000)
+        out = io.StringIO()
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command(
+                'load_test_downloads',
+                self.live_server_url + reverse('direct_media_file', kwargs={'path': 'last.pdf'}),
+                '--concurrency=4', '--read-delay=0', '--json', stdout=out
+            )
+        result = json.loads(out.getvalue())[0]
+        self.assertEqual((result['completed'], result['errors']), (4, 0))
+        self.assertGreater(result['bytes'], 4 * 100000)
+        self.assertIsNotNone(result['probe_p50'])
+
+
+class RemoteStorage(InMemoryStorage):
+    """Lagring utan lokala filer, som S3-drivrutinen"""
+
+    redirect = False
+
+    def local_path(self, name):
+        return None
+
+    def iter_range(self, name, start, length, chunk_size=1024):
+        data = self.open(name).read()[start:start + length]
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset:offset + chunk_size]
+
+    def download_to(self, name, path):
+        with open(path, 'wb') as target:
+            target.write(self.open(name).read())
+
+    def download_url(self, name, filename=None, content_type=None, as_attachment=False):
+        return f"https://bucket.example.com/{name}?signature=abc" if self.redirect else None
+
+
+class StorageDriverTestCase(TestCase):
+    """Test cases for the configurable file storage drivers"""
+    
+    CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 20
+    
+    def setUp(self):
+        self.storage = RemoteStorage()
+        self.name = self.storage.save('blobs/ab/ritning.pdf', ContentFile(self.CONTENT))
+        self.factory = RequestFactory()
+    
+    def test_local_driver(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root, FILE_STORAGE_DRIVER='local'):
+            name = blob_storage.save('blobs/ab/lokal.pdf', ContentFile(self.CONTENT))
+            self.assertEqual(b''.join(blob_storage.iter_range(name, 9, 100, chunk_size=30)), self.CONTENT[9:109])
+            with local_copy(name) as path:
+                # Lokala filer används direkt utan kopia
+                self.assertEqual(path, os.path.join(media_root, name))
+            self.assertIsNone(blob_storage.download_url(name))
+    
+    def test_unknown_driver(self):
+        with override_settings(FILE_STORAGE_DRIVER='ftp'):
+            with self.assertRaises(ImproperlyConfigured):
+                blob_storage.exists('x')
+        # Drivrutinen väljs om när inställningen återställs
+        self.assertFalse(blob_storage.exists('blobs/saknas.pdf'))
+    
+    def test_local_copy_of_remote_file(self):
+        with local_copy(self.name, self.storage) as path:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.CONTENT)
+        self.assertFalse(os.path.exists(path))
+    
+    def test_remote_range_is_proxied(self):
+        request = self.factory.get('/', HTTP_RANGE='bytes=10-19')
+        response = serve_stored(request, self.name, storage=self.storage, content_type='application/pdf', etag='"abc"')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.CONTENT)}')
+        
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH='"abc"')
+        response = serve_stored(request, self.name, storage=self.storage, etag='"abc"')
+        self.assertEqual(response.status_code, 304)
+    
+    def test_remote_download_redirects(self):
+        self.storage.redirect = True
+        response = serve_stored(self.factory.get('/'), self.name, storage=self.storage, filename='ritning.pdf')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith('https://bucket.example.com/'))
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+    
+    def test_pdf_routes_use_storage(self):
+        """The legacy pdf-static and pdf-finder routes read from the configured storage, not MEDIA_ROOT"""
+        name = self.storage.save('project_files/plan.pdf', ContentFile(self.CONTENT))
+        FileIndexEntry.objects.create(filename='plan.pdf', storage_path=name, source=FileIndexEntry.SOURCE_FILE)
+        blob_storage._wrapped = self.storage
+        self.addCleanup(setattr, blob_storage, '_wrapped', empty)
+        
+        response = self.client.get(reverse('pdf_static_direct', args=['plan.pdf']), HTTP_RANGE='bytes=0-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT[:9])
+        self.assertEqual(self.client.get(reverse('pdf_static_direct', args=['saknas.pdf'])).status_code, 404)
+        
+        response = self.client.get(reverse('pdf_finder'), {'filename': 'plan.pdf'})
+        self.assertEqual(response.json()['files'][0]['url'], reverse('direct_media_file', args=[name]))
+        response = self.client.get(reverse('pdf_finder'), {'filename': 'plan.pdf', 'stream': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+    
+    @skipUnless(
+        importlib.util.find_spec('boto3') and os.environ.get('S3_TEST_ENDPOINT'),
+        'Kräver boto3 och en S3-tjänst i S3_TEST_ENDPOINT (t.ex. MinIO)'
+    )
+    def test_s3_driver(self):
+        from .s3 import S3ContentAddressedStorage
+        
+        with override_settings(S3_MULTIPART_THRESHOLD=5 * 1024 * 1024, S3_MULTIPART_CHUNK_SIZE=5 * 1024 * 1024):
+            storage = S3ContentAddressedStorage(
+                bucket=os.environ.get('S3_TEST_BUCKET', 'valvx-test'),
+                endpoint_url=os.environ['S3_TEST_ENDPOINT'],
+                access_key_id=os.environ.get('S3_TEST_ACCESS_KEY_ID', 'minioadmin'),
+                secret_access_key=os.environ.get('S3_TEST_SECRET_ACCESS_KEY', 'minioadmin'),
+                prefix='tests',
+            )
+            # Större än tröskeln, så att uppladdningen görs som multipart
+            content = os.urandom(12 * 1024 * 1024)
+            upload = ContentFile(content)
+            upload.sha256 = hashlib.sha256(content).hexdigest()
+            name = storage.save('ritning.pdf', upload)
+            self.addCleanup(storage.delete, name)
+            
+            self.assertEqual(storage.size(name), len(content))
+            self.assertEqual(b''.join(storage.iter_range(name, 100, 1000)), content[100:1100])
+            with local_copy(name, storage) as path, open(path, 'rb') as f:
+                self.assertEqual(hashlib.sha256(f.read()).hexdigest(), upload.sha256)
+
+
+@override_settings(RENDITIONS_ON_UPLOAD=False, LINEARIZE_ON_UPLOAD=False, SEARCH_EXTRACT_ON_UPLOAD=False)
+class SignedMediaTestCase(TestCase):
+    """Test cases for HMAC-signed short-lived media URLs"""
+    
+    CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 40
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username="signeduser",
+            email="signeduser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Signed Project", start_date="2023-01-01")
+        RoleAccess.objects.create(user=self.user, project=self.project, role=RoleAccess.MEMBER)
+        self.document = PDFDocument.objects.create(
+            title="Plan 1",
+            file=SimpleUploadedFile("plan.pdf", self.CONTENT, content_type="application/pdf"),
+            size=len(self.CONTENT),
+            project=self.project,
+            uploaded_by=self.user
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_sign_and_verify(self):
+        name = self.document.file.name
+        params = signing.sign(name, self.user.id, 'plan.pdf', ttl=600, now=1000)
+        self.assertEqual(params['e'], 1800)
+        # Samma period ger samma URL, så att en proxy kan återanvända svaret
+        self.assertEqual(signing.sign(name, self.user.id, 'plan.pdf', ttl=600, now=1100), params)
+        self.assertEqual(signing.verify(name, params, now=1700), (self.user.id, 1800))
+        
+        with self.assertRaises(SignatureExpired):
+            signing.verify(name, params, now=1801)
+        for tampered in ({'u': self.user.id + 1}, {'e': 99999}, {'f': 'annan.pdf'}, {'s': ''}):
+            with self.assertRaises(BadSignature):
+                signing.verify(name, {**params, **tampered}, now=1700)
+        with self.assertRaises(BadSignature):
+            signing.verify('blobs/annan.pdf', params, now=1700)
+    
+    def test_range_requests_without_database(self):
+        response = self.api.get(reverse('pdfdocument-signed-url', args=[self.document.id]))
+        self.assertEqual(response.status_code, 200)
+        url = response.json()['url']
+        
+        client = self.client_class()
+        with self.assertNumQueries(0):
+            response = client.get(url, HTTP_RANGE='bytes=0-99')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), self.CONTENT[:100])
+            response = client.get(url, HTTP_RANGE='bytes=100-199')
+            self.assertEqual(b''.join(response.streaming_content), self.CONTENT[100:200])
+        self.assertTrue(response['Cache-Control'].startswith('public, max-age='))
+        self.assertEqual(response['ETag'], f'"{self.document.sha256}"')
+        self.assertIn('Plan 1.pdf', response['Content-Disposition'])
+        
+        self.assertEqual(client.get(url.replace('&s=', '&s=0')).status_code, 403)
+        self.assertEqual(client.get(url.split('?')[0]).status_code, 403)
+    
+    def test_signed_url_requires_access(self):
+        outsider = User.objects.create_user(
+            username="outsider",
+            email="outsider@example.com",
+            password="securepassword123"
+        )
+        self.api.force_authenticate(outsider)
+        response = self.api.get(reverse('pdfdocument-signed-url', args=[self.document.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(RENDITIONS_ON_UPLOAD=False, LINEARIZE_ON_UPLOAD=False, SEARCH_EXTRACT_ON_UPLOAD=False)
+class DirectoryDataCacheTestCase(TestCase):
+    """Test cases for the cached directory_data payload"""
+    
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username="cacheuser",
+            email="cacheuser@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(name="Cache Project", start_date="2023-01-01")
+        self.parent = Directory.objects.create(name="Ritningar", project=self.project, is_sidebar_item=True)
+        self.directory = Directory.objects.create(name="Plan", project=self.project, parent=self.parent)
+        self.file = self._create_file("plan1.pdf", self.directory)
+        self.url = reverse('directory_data_api', kwargs={'slug': self.directory.slug})
+    
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def _create_file(self, name, directory):
+        return File.objects.create(
+            name=name,
+            project=self.project,
+            directory=directory,
+            file=SimpleUploadedFile(name, b"%PDF-1.4 " + name.encode(), content_type="application/pdf"),
+            content_type="application/pdf",
+            size=9 + len(name),
+            uploaded_by=self.user
+        )
+    
+    def _names(self, url=None):
+        return [f['name'] for f in self.client.get(url or self.url).json()['files']]
+    
+    def test_cached_with_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.json()['parent_slug'], self.parent.slug)
+        self.assertTrue(first.json()['files'][0]['file'].startswith('http://testserver/'))
+        etag = first['ETag']
+        
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+            self.assertEqual(second.json(), first.json())
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+        
+        self.assertEqual(self.client.get(reverse('directory_data_api', kwargs={'slug': 'saknas'})).status_code, 404)
+    
+    def test_file_changes_invalidate(self):
+        etag = self.client.get(self.url)['ETag']
+        added = self._create_file("plan2.pdf", self.directory)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(f['name'] for f in response.json()['files']), ['plan1.pdf', 'plan2.pdf'])
+        
+        # Flytt till en annan mapp ändrar båda mapparnas listor
+        parent_url = reverse('directory_data_api', kwargs={'slug': self.parent.slug})
+        self.assertEqual(self._names(parent_url), [])
+        added = File.objects.get(id=added.id)
+        added.directory = self.parent
+        added.save()
+        self.assertEqual(self._names(), ['plan1.pdf'])
+        self.assertEqual(self._names(parent_url), ['plan2.pdf'])
+        
+        added.delete()
+        self.assertEqual(self._names(parent_url), [])
+    
+    def test_directory_changes_invalidate(self):
+        parent_url = reverse('directory_data_api', kwargs={'slug': self.parent.slug})
+        self.assertEqual(self.client.get(parent_url).json()['subfolders'], [{'name': 'Plan', 'slug': self.directory.slug}])
+        self.client.get(self.url)
+        
+        # Föräldern visar undermappens namn och undermappen förälderns
+        self.directory.name = "Planer"
+        self.directory.save()
+        self.assertEqual(self.client.get(parent_url).json()['subfolders'][0]['name'], 'Planer')
+        self.parent.name = "K-ritningar"
+        self.parent.save()
+        self.assertEqual(self.client.get(self.url).json()['parent_name'], 'K-ritningar')
+        
+        # Flytt till toppnivån
+        other = Directory.objects.create(name="Fasader", project=self.project)
+        self.directory.parent = other
+        self.directory.save()
+        self.assertEqual(self.client.get(parent_url).json()['subfolders'], [])
+        self.assertEqual(self.client.get(self.url).json()['parent_slug'], other.slug)
+    
+    def test_warmup_command(self):
+        for _ in range(3):
+            self.client.get(self.url)
+        # Som efter en deploy: den cachade payloaden gäller inte längre, besöksstatistiken finns kvar
+        directory_cache.invalidate(self.directory.id)
+        
+        out = io.StringIO()
+        call_command('warm_directory_cache', '--limit=1', stdout=out)
+        self.assertIn('1 mappar', out.getvalue())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
 # API Tests will be added when the actual API implementation is completed
@@ -0,0 +1,217 @@
+"""
+Tile-pyramid för djupzoom i stora ritningar (A0 o.d.).
+
+Varje sida rastreras till en pyramid av 256 x 256-tiles i XYZ-stil. På nivå
+z är sidans längsta sida TILE_SIZE * 2^z pixlar, så nivå 0 är en enda tile
+och varje nivå dubblar upplösningen upp till max_zoom (begränsad av
+TILE_MAX_SCALE). Tiles sparas i renderingscachen bredvid miniatyrerna:
+
+    <RENDITION_CACHE_DIR>/<ab>/<sha256>/tiles/p<sida>/<z>/<x>_<y>.webp
+
+Pyramiden byggs i block om CHUNK x CHUNK tiles, så att pdfium renderar en
+begränsad yta åt gången i stället för hela sidan i högsta upplösning. Blocken
+fördelas på en processpool och block vars tiles redan finns hoppas över, så
+ett avbrutet bygge fortsätter där det slutade. Tiles som saknas när de
+efterfrågas renderas direkt.
+"""
+import json
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from .renditions import FORMAT, RenditionError, cache_dir, open_pdf, save_image
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# Antal tiles per sida i ett renderingsblock (CHUNK x CHUNK)
+CHUNK = 4
+
+
+def _max_scale():
+    return getattr(settings, 'TILE_MAX_SCALE', 4.0)
+
+
+def tiles_dir(sha256, page):
+    return os.path.join(cache_dir(sha256), 'tiles', f"p{page}")
+
+
+def tile_path(sha256, page, z, x, y):
+    return os.path.join(tiles_dir(sha256, page), str(z), f"{x}_{y}.{FORMAT}")
+
+
+def _info_path(sha256, page):
+    return os.path.join(tiles_dir(sha256, page), 'info.json')
+
+
+def page_layout(width, height):
+    """
+    Pyramidens geometri för en sida med given storlek i PDF-punkter.
+
+    Returns:
+        dict: width, height (punkter), tile_size, max_zoom och levels med
+        bildstorlek och antal tiles per nivå
+    """
+    longest = max(width, height, 1)
+    max_zoom = max(0, math.ceil(math.log2(longest * _max_scale() / TILE_SIZE)))
+    levels = []
+    for z in range(max_zoom + 1):
+        scale = TILE_SIZE * 2 ** z / longest
+        pixel_width = max(1, math.ceil(width * scale))
+        pixel_height = max(1, math.ceil(height * scale))
+        levels.append({
+            'scale': scale,
+            'width': pixel_width,
+            'height': pixel_height,
+            'columns': math.ceil(pixel_width / TILE_SIZE),
+            'rows': math.ceil(pixel_height / TILE_SIZE),
+        })
+    return {'width': width, 'height': height, 'tile_size': TILE_SIZE, 'max_zoom': max_zoom, 'levels': levels}
+
+
+def get_layout(sha256, pdf_path, page):
+    """Läs pyramidens geometri från cachen eller räkna ut den från PDF:en"""
+    info_path = _info_path(sha256, page)
+    if os.path.exists(info_path):
+        with open(info_path) as info_file:
+            return json.load(info_file)
+
+    pdf = open_pdf(pdf_path)
+    try:
+        if not 1 <= page <= len(pdf):
+            raise RenditionError(f"Sidan {page} finns inte (dokumentet har {len(pdf)} sidor)")
+        layout = page_layout(*pdf[page - 1].get_size())
+    finally:
+        pdf.close()
+
+    os.makedirs(os.path.dirname(info_path), exist_ok=True)
+    temp_path = f"{info_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as info_file:
+        json.dump(layout, info_file)
+    os.replace(temp_path, info_path)
+    return layout
+
+
+def _render_block(pdf_page, sha256, page, z, level, column, row, columns, rows):
+    """Rendera ett block av tiles på en nivå och dela upp det i enskilda tiles"""
+    width, height = pdf_page.get_size()
+    scale = level['scale']
+    left = column * TILE_SIZE
+    top = row * TILE_SIZE
+    right = min(left + columns * TILE_SIZE, level['width'])
+    bottom = min(top + rows * TILE_SIZE, level['height'])
+
+    # crop anges i punkter som ska skäras bort från varje kant (vänster, under, höger, över)
+    crop = (left / scale, max(0, height - bottom / scale), max(0, width - right / scale), top / scale)
+    image = pdf_page.render(scale=scale, crop=crop).to_pil()
+
+    for dx in range(columns):
+        for dy in range(rows):
+            box = (dx * TILE_SIZE, dy * TILE_SIZE, min((dx + 1) * TILE_SIZE, image.width), min((dy + 1) * TILE_SIZE, image.height))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            save_image(image.crop(box), tile_path(sha256, page, z, column + dx, row + dy))
+
+
+def _blocks(layout, z, x=None, y=None):
+    """Block (kolumn, rad, antal kolumner, antal rader) på en nivå, eller blocket som innehåller en tile"""
+    level = layout['levels'][z]
+    if x is not None:
+        column, row = x - x % CHUNK, y - y % CHUNK
+        yield column, row, min(CHUNK, level['columns'] - column), min(CHUNK, level['rows'] - row)
+        return
+    for column in range(0, level['columns'], CHUNK):
+        for row in range(0, level['rows'], CHUNK):
+            yield column, row, min(CHUNK, level['columns'] - column), min(CHUNK, level['rows'] - row)
+
+
+def _block_done(sha256, page, z, block):
+    column, row, columns, rows = block
+    return all(
+        os.path.exists(tile_path(sha256, page, z, column + dx, row + dy))
+        for dx in range(columns) for dy in range(rows)
+    )
+
+
+def render_blocks(sha256, pdf_path, page, z, blocks):
+    """
+    Rendera en lista med block på en nivå (körs i en arbetsprocess).
+    PDF:en öppnas i processen eftersom pdfium-objekt inte kan skickas mellan processer.
+    """
+    layout = get_layout(sha256, pdf_path, page)
+    level = layout['levels'][z]
+    pdf = open_pdf(pdf_path)
+    rendered = 0
+    try:
+        pdf_page = pdf[page - 1]
+        for block in blocks:
+            if _block_done(sha256, page, z, block):
+                continue
+            _render_block(pdf_page, sha256, page, z, level, *block)
+            rendered += 1
+    finally:
+        pdf.close()
+    return rendered
+
+
+def get_or_render_tile(sha256, pdf_path, page, z, x, y):
+    """Returnera en tile från cachen och rendera dess block om den saknas"""
+    path = tile_path(sha256, page, z, x, y)
+    if os.path.exists(path):
+        return path
+
+    layout = get_layout(sha256, pdf_path, page)
+    if not 0 <= z <= layout['max_zoom']:
+        raise RenditionError(f"Zoomnivån {z} finns inte (max {layout['max_zoom']})")
+    level = layout['levels'][z]
+    if not (0 <= x < level['columns'] and 0 <= y < level['rows']):
+        raise RenditionError(f"Tile {x}/{y} ligger utanför nivå {z}")
+
+    render_blocks(sha256, pdf_path, page, z, list(_blocks(layout, z, x, y)))
+    return path
+
+
+def generate_pyramid(sha256, pdf_path, pages=None, workers=None):
+    """
+    Bygg hela tile-pyramiden för en PDF i en processpool.
+    Block som redan är klara hoppas över, så ett avbrutet bygge kan köras om.
+
+    Args:
+        pages (list, optional): Sidor att bygga, annars alla
+        workers (int, optional): Antal processer, standard TILE_WORKERS
+
+    Returns:
+        int: Antal block som renderades
+    """
+    if pages is None:
+        pdf = open_pdf(pdf_path)
+        try:
+            pages = range(1, len(pdf) + 1)
+        finally:
+            pdf.close()
+
+    tasks = []
+    for page in pages:
+        layout = get_layout(sha256, pdf_path, page)
+        for z in range(layout['max_zoom'] + 1):
+            pending = [block for block in _blocks(layout, z) if not _block_done(sha256, page, z, block)]
+            # Ett par block per uppgift så att varje process inte öppnar PDF:en för varje block
+            for start in range(0, len(pending), CHUNK):
+                tasks.append((sha256, pdf_path, page, z, pending[start:start + CHUNK]))
+
+    if not tasks:
+        return 0
+
+    workers = workers or getattr(settings, 'TILE_WORKERS', None) or os.cpu_count()
+    if workers <= 1:
+        return sum(render_blocks(*task) for task in tasks)
+
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_blocks, *task) for task in tasks]
+        for future in as_completed(futures):
+            rendered += future.result()
+    logger.info(f"Renderade {rendered} tile-block för {sha256}")
+    return rendered
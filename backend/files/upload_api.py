@@ -4,9 +4,26 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from .models import Directory, File
-from core.models import User
+from .models import Directory, File, UploadSession
+from .hashing import hash_path, hash_upload
+from core.models import User, Project
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File as DjangoFile
+from django.db import router, transaction
+from django.http import UnreadablePostError
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+import base64
+import binascii
+import logging
 import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])  # I produktion bör detta ändras till IsAuthenticated
@@ -89,4 +106,539 @@ def upload_file(request):
         "file_id": file_instance.id,
         "name": file_instance.name,
         "url": request.build_absolute_uri(file_instance.file.url)
-    }, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    }, status=status.HTTP_201_CREATED)
+
+# --- Återupptagbar uppladdning (tus 1.0.0) ---
+#
+# POST    /uploads/                  skapa uppladdning (Upload-Length, Upload-Metadata)
+# HEAD    /uploads/<id>/             hämta aktuell Upload-Offset
+# PATCH   /uploads/<id>/             skicka nästa bit (application/offset+octet-stream)
+# DELETE  /uploads/<id>/             avbryt uppladdningen
+# POST    /uploads/<id>/finalize/    skapa File-objektet när alla byte har tagits emot
+#
+# Byten strömmas direkt till en temporär fil i block om UPLOAD_CHUNK_SIZE, så
+# minnesanvändningen är konstant oavsett filstorlek.
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,termination,expiration'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# SHA-256 räknas ut från den sammansatta filen vid finalize. Bitarna kan tas
+# emot av olika processer, så inget tillstånd per uppladdning hålls i minnet.
+
+
+class StagedFile(DjangoFile):
+    """Temporär fil som lagringen kan flytta på plats i stället för att kopiera"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def _tus_response(status_code=status.HTTP_204_NO_CONTENT, data=None, **headers):
+    response = Response(data, status=status_code)
+    response['Tus-Resumable'] = TUS_VERSION
+    response['Cache-Control'] = 'no-store'
+    for header, value in headers.items():
+        response[header.replace('_', '-')] = value
+    return response
+
+
+def _check_tus_version(request):
+    """Returnera 412 om klienten inte talar tus 1.0.0"""
+    if request.headers.get('Tus-Resumable') != TUS_VERSION:
+        return _tus_response(
+            status.HTTP_412_PRECONDITION_FAILED,
+            {"detail": "Tus-Resumable 1.0.0 krävs."},
+            Tus_Version=TUS_VERSION
+        )
+    return None
+
+
+def _parse_upload_metadata(header):
+    """Tolka Upload-Metadata: kommaseparerade par 'nyckel base64-värde'"""
+    metadata = {}
+    for pair in (header or '').split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode('utf-8') if value else ''
+        except (binascii.Error, UnicodeDecodeError):
+            raise ValueError(f"Ogiltigt värde för {key} i Upload-Metadata")
+    return metadata
+
+
+def _upload_expires(session):
+    expires = session.updated_at + timedelta(hours=settings.RESUMABLE_UPLOAD_EXPIRY_HOURS)
+    return http_date(expires.timestamp())
+
+
+def _get_active_session(upload_id):
+    """Hämta en ej slutförd och ej utgången uppladdning, annars None"""
+    session = UploadSession.objects.filter(upload_id=upload_id, file__isnull=True).first()
+    if session is None:
+        return None
+    expiry = timedelta(hours=settings.RESUMABLE_UPLOAD_EXPIRY_HOURS)
+    if session.updated_at + expiry < timezone.now():
+        return None
+    return session
+
+
+def _discard_session(session):
+    """Ta bort den temporära filen och sessionen"""
+    if os.path.exists(session.temp_path):
+        os.remove(session.temp_path)
+    session.delete()
+
+
+@api_view(['POST', 'OPTIONS'])
+@permission_classes([AllowAny])  # I produktion bör detta ändras till IsAuthenticated
+def create_upload(request):
+    """
+    Skapa en återupptagbar uppladdning (tus creation-tillägget).
+    Mappen anges med ?directory_slug= eller i Upload-Metadata.
+    """
+    if request.method == 'OPTIONS':
+        return _tus_response(
+            Tus_Version=TUS_VERSION,
+            Tus_Extension=TUS_EXTENSIONS,
+            Tus_Max_Size=str(settings.RESUMABLE_UPLOAD_MAX_SIZE)
+        )
+
+    error = _check_tus_version(request)
+    if error:
+        return error
+
+    try:
+        length = int(request.headers.get('Upload-Length', ''))
+    except ValueError:
+        return _tus_response(status.HTTP_400_BAD_REQUEST, {"detail": "Upload-Length saknas eller är ogiltig."})
+    if length < 0:
+        return _tus_response(status.HTTP_400_BAD_REQUEST, {"detail": "Upload-Length saknas eller är ogiltig."})
+    if length > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+        return _tus_response(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            {"detail": "Filen är för stor."},
+            Tus_Max_Size=str(settings.RESUMABLE_UPLOAD_MAX_SIZE)
+        )
+
+    try:
+        metadata = _parse_upload_metadata(request.headers.get('Upload-Metadata'))
+    except ValueError as e:
+        return _tus_response(status.HTTP_400_BAD_REQUEST, {"detail": str(e)})
+
+    filename = os.path.basename(metadata.get('filename', ''))
+    if not filename.lower().endswith('.pdf'):
+        return _tus_response(status.HTTP_400_BAD_REQUEST, {"detail": "Endast PDF-filer är tillåtna."})
+
+    directory_slug = request.query_params.get('directory_slug') or metadata.get('directory_slug')
+    if not directory_slug:
+        return _tus_response(status.HTTP_400_BAD_REQUEST, {"detail": "Mappparametern saknas."})
+    directory = get_object_or_404(Directory, slug=directory_slug)
+
+    session = UploadSession.objects.create(
+        filename=filename,
+        name=metadata.get('name') or os.path.splitext(filename)[0],
+        description=metadata.get('description', ''),
+        directory=directory,
+        length=length,
+        uploaded_by=request.user if request.user.is_authenticated else None
+    )
+
+    # Skapa en tom temporär fil som bitarna skrivs till
+    os.makedirs(settings.RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    open(session.temp_path, 'wb').close()
+
+    return _tus_response(
+        status.HTTP_201_CREATED,
+        Location=request.build_absolute_uri(
+            reverse('resumable_upload', kwargs={'upload_id': session.upload_id})
+        ),
+        Upload_Offset='0',
+        Upload_Expires=_upload_expires(session)
+    )
+
+
+@api_view(['HEAD', 'PATCH', 'DELETE', 'OPTIONS'])
+@permission_classes([AllowAny])  # I produktion bör detta ändras till IsAuthenticated
+def upload_session(request, upload_id):
+    """
+    HEAD ger aktuell Upload-Offset, PATCH tar emot nästa bit och
+    DELETE avbryter uppladdningen (tus termination-tillägget).
+    """
+    if request.method == 'OPTIONS':
+        return _tus_response(Tus_Version=TUS_VERSION, Tus_Extension=TUS_EXTENSIONS)
+
+    error = _check_tus_version(request)
+    if error:
+        return error
+
+    session = _get_active_session(upload_id)
+    if session is None:
+        return _tus_response(status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'HEAD':
+        return _tus_response(
+            status.HTTP_200_OK,
+            Upload_Offset=str(session.offset),
+            Upload_Length=str(session.length),
+            Upload_Expires=_upload_expires(session)
+        )
+
+    if request.method == 'DELETE':
+        _discard_session(session)
+        return _tus_response()
+
+    # PATCH
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return _tus_response(status.HTTP_400_BAD_REQUEST, {"detail": "Upload-Offset saknas eller är ogiltig."})
+    if offset != session.offset:
+        return _tus_response(status.HTTP_409_CONFLICT, Upload_Offset=str(session.offset))
+
+    new_offset = _receive_chunk(request, session)
+    if new_offset is None:
+        return _tus_response(status.HTTP_409_CONFLICT, Upload_Offset=str(session.offset))
+
+    session.refresh_from_db(fields=['updated_at'])
+    return _tus_response(Upload_Offset=str(new_offset), Upload_Expires=_upload_expires(session))
+
+
+def _receive_chunk(request, session):
+    """
+    Ta emot förfrågans kropp och lägg den i den temporära filen från session.offset.
+    Vid avbruten anslutning sparas det som hann tas emot, så att klienten
+    kan fortsätta därifrån. Returnerar nytt offset, eller None om en annan
+    förfrågan hann uppdatera samma uppladdning.
+
+    Kroppen strömmas först till en egen fil per förfrågan. Uppladdningens fil
+    skrivs först när offset har flyttats fram, så två samtidiga PATCH med
+    samma offset kan inte skriva över varandras byte.
+    """
+    remaining = session.length - session.offset
+    received = 0
+    stream = request.stream
+    fd, part_path = tempfile.mkstemp(dir=settings.RESUMABLE_UPLOAD_DIR, suffix='.tmp')
+    try:
+        try:
+            with os.fdopen(fd, 'wb') as part_file:
+                while remaining > 0 and stream is not None:
+                    chunk = stream.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    part_file.write(chunk)
+                    received += len(chunk)
+                    remaining -= len(chunk)
+        except (OSError, UnreadablePostError) as e:
+            logger.warning(f"Uppladdning {session.upload_id} avbröts efter {received} byte: {str(e)}")
+
+        new_offset = session.offset + received
+        try:
+            with transaction.atomic():
+                # Den villkorliga uppdateringen låser raden till commit, så bara
+                # den förfrågan som flyttar fram offset skriver till filen
+                updated = UploadSession.objects.filter(pk=session.pk, offset=session.offset).update(
+                    offset=new_offset,
+                    updated_at=timezone.now()
+                )
+                if not updated:
+                    return None
+                with open(part_path, 'rb') as part_file, open(session.temp_path, 'r+b') as temp_file:
+                    temp_file.seek(session.offset)
+                    shutil.copyfileobj(part_file, temp_file, UPLOAD_CHUNK_SIZE)
+                    temp_file.truncate()
+        except OSError as e:
+            # Offset rullas tillbaka, klienten kan skicka biten igen
+            logger.warning(f"Uppladdning {session.upload_id} kunde inte skrivas: {str(e)}")
+            return session.offset
+        return new_offset
+    finally:
+        os.remove(part_path)
+
+
+def _finalize_response(request, file_instance, status_code):
+    return Response({
+        "detail": "Filen har laddats upp.",
+        "file_id": file_instance.id,
+        "name": file_instance.name,
+        "sha256": file_instance.sha256,
+        "url": request.build_absolute_uri(file_instance.file.url)
+    }, status=status_code)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])  # I produktion bör detta ändras till IsAuthenticated
+def finalize_upload(request, upload_id):
+    """
+    Skapa File-objektet när alla byte har tagits emot.
+    Den temporära filen flyttas på plats i lagringen utan att kopieras.
+    Ett upprepat anrop efter lyckad finalize returnerar den redan skapade filen.
+    """
+    finished = UploadSession.objects.filter(upload_id=upload_id, file__isnull=False).select_related('file').first()
+    if finished is not None:
+        return _finalize_response(request, finished.file, status.HTTP_200_OK)
+
+    session = _get_active_session(upload_id)
+    if session is None:
+        return Response({"detail": "Uppladdningen hittades inte."}, status=status.HTTP_404_NOT_FOUND)
+
+    with transaction.atomic():
+        # Lås sessionen så att samtidiga anrop inte skapar två filer av samma uppladdning
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None:
+            return Response({"detail": "Uppladdningen hittades inte."}, status=status.HTTP_404_NOT_FOUND)
+        if session.file_id is not None:
+            return _finalize_response(request, session.file, status.HTTP_200_OK)
+        if not session.is_complete:
+            return Response({
+                "detail": "Uppladdningen är inte klar.",
+                "offset": session.offset,
+                "length": session.length
+            }, status=status.HTTP_409_CONFLICT)
+
+        sha256 = hash_path(session.temp_path)
+
+        # Kontrollera att det verkligen är en PDF innan filen sparas
+        with open(session.temp_path, 'rb') as temp_file:
+            if not temp_file.read(5).startswith(b'%PDF'):
+                _discard_session(session)
+                return Response({"detail": "Endast PDF-filer är tillåtna."}, status=status.HTTP_400_BAD_REQUEST)
+
+        directory = session.directory
+        project = directory.project or Project.objects.first()
+        if project is None:
+            return Response({"detail": "Mappen saknar projekt."}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_instance = File(
+            name=session.name,
+            directory=directory,
+            project=project,
+            content_type='application/pdf',
+            size=session.length,
+            sha256=sha256,
+            description=session.description,
+            # Använd första användaren som uppladdare i utvecklingsmiljö, som upload_file
+            uploaded_by=session.uploaded_by or User.objects.first()
+        )
+
+        # Spara direkt i lagringen så att pre_save inte behöver läsa om filen för att hasha den
+        field = File._meta.get_field('file')
+        with open(session.temp_path, 'rb') as temp_file:
+            staged = StagedFile(temp_file)
+            staged.sha256 = sha256
+            file_instance.file = field.storage.save(
+                field.generate_filename(file_instance, session.filename),
+                staged,
+                max_length=field.max_length
+            )
+
+        file_instance.save()
+        session.file = file_instance
+        session.sha256 = sha256
+        session.save(update_fields=['file', 'sha256', 'updated_at'])
+
+    if os.path.exists(session.temp_path):
+        os.remove(session.temp_path)
+
+    return _finalize_response(request, file_instance, status.HTTP_201_CREATED)
+
+
+# --- Batchuppladdning ---
+#
+# POST /upload/batch/?directory_slug=<slug>
+#   files:      flera PDF-filer (multipart), och/eller
+#   upload_ids: id för färdiga återupptagbara uppladdningar (tus)
+#
+# Filerna hashas, skrivs till lagringen och läses för PDF-metadata parallellt
+# i en trådpool (BATCH_UPLOAD_WORKERS). Trådarna rör inte databasen; mapp,
+# projekt och uppladdare slås upp en gång och alla File-rader skapas med en
+# bulk_create. Eftersom bulk_create inte skickar signaler görs det som
+# post_save-mottagarna gör (blob-referenser, filindex, sökindex, cachar och
+# bakgrundsjobb) av files.signals.files_created_in_bulk, en gång per batch.
+
+class _BatchItem:
+    """En fil i en batchuppladdning och dess resultat"""
+
+    def __init__(self, filename, name, description='', upload=None, session=None):
+        self.filename = filename
+        self.name = name
+        self.description = description
+        self.upload = upload  # UploadedFile från multipart
+        self.session = session  # Färdig UploadSession
+        self.sha256 = None
+        self.size = upload.size if upload is not None else session.length if session else 0
+        self.storage_name = None
+        self.metadata = None
+        self.error = None
+        self.instance = None
+
+    def result(self, request):
+        if self.error:
+            return {"filename": self.filename, "status": "error", "detail": self.error}
+        return {
+            "filename": self.filename,
+            "status": "created",
+            "file_id": self.instance.id,
+            "name": self.instance.name,
+            "sha256": self.instance.sha256,
+            "url": request.build_absolute_uri(self.instance.file.url)
+        }
+
+
+def _store_batch_item(item):
+    """
+    Hasha, kontrollera och skriv en fil till lagringen samt läs dess PDF-metadata.
+    Körs i en arbetstråd och får därför inte använda databasen.
+    """
+    from .pdf_metadata import extract
+
+    field = File._meta.get_field('file')
+    try:
+        if item.session is not None:
+            source = open(item.session.temp_path, 'rb')
+            content = StagedFile(source)
+        else:
+            source = item.upload
+            content = item.upload
+        with source:
+            source.seek(0)
+            if not source.read(5).startswith(b'%PDF'):
+                item.error = "Endast PDF-filer är tillåtna."
+                return item
+            source.seek(0)
+            item.sha256 = hash_path(item.session.temp_path) if item.session else hash_upload(content)
+            content.sha256 = item.sha256
+            # Metadata läses från källan, så att filen inte behöver hämtas tillbaka från lagringen
+            if item.session is not None:
+                item.metadata = extract(item.session.temp_path)
+            else:
+                source.seek(0)
+                item.metadata = extract(source)
+                source.seek(0)
+            item.storage_name = field.storage.save(
+                field.generate_filename(None, item.filename), content, max_length=field.max_length
+            )
+    except OSError as e:
+        logger.warning(f"Batchuppladdning av {item.filename} misslyckades: {str(e)}")
+        item.error = "Filen kunde inte sparas."
+    return item
+
+
+def _batch_items(request, directory):
+    """Validera indata och bygg listan med filer (multipart först, sedan tus-uppladdningar)"""
+    items = []
+    max_size = settings.BATCH_UPLOAD_MAX_FILE_SIZE
+    for upload in request.FILES.getlist('files'):
+        filename = os.path.basename(upload.name)
+        item = _BatchItem(filename, os.path.splitext(filename)[0], upload=upload)
+        if not filename.lower().endswith('.pdf'):
+            item.error = "Endast PDF-filer är tillåtna."
+        elif upload.size > max_size:
+            item.error = f"Filstorleken får inte överstiga {max_size // (1024 * 1024)} MB."
+        items.append(item)
+
+    for upload_id in request.data.getlist('upload_ids'):
+        try:
+            session = _get_active_session(upload_id)
+        except ValidationError:
+            session = None
+        if session is None or session.directory_id != directory.id:
+            item = _BatchItem(str(upload_id), '')
+            item.error = "Uppladdningen hittades inte."
+        elif not session.is_complete:
+            item = _BatchItem(session.filename, session.name)
+            item.error = "Uppladdningen är inte klar."
+        else:
+            item = _BatchItem(session.filename, session.name, session.description, session=session)
+        items.append(item)
+    return items
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])  # I produktion bör detta ändras till IsAuthenticated
+@parser_classes([MultiPartParser, FormParser])
+def batch_upload(request):
+    """
+    Ladda upp många PDF-filer till en mapp i ett anrop.
+    Svarar med ett resultat per fil: 201 om alla skapades, 207 om några
+    misslyckades och 400 om ingen kunde skapas.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from .signals import files_created_in_bulk
+
+    directory_slug = request.query_params.get('directory_slug')
+    if not directory_slug:
+        return Response({"detail": "Mappparametern saknas."}, status=status.HTTP_400_BAD_REQUEST)
+    directory = get_object_or_404(Directory.objects.select_related('project'), slug=directory_slug)
+    project = directory.project or Project.objects.first()
+    if project is None:
+        return Response({"detail": "Mappen saknar projekt."}, status=status.HTTP_400_BAD_REQUEST)
+
+    items = _batch_items(request, directory)
+    if not items:
+        return Response({"detail": "Inga filer har skickats."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BATCH_UPLOAD_MAX_FILES:
+        return Response(
+            {"detail": f"Högst {settings.BATCH_UPLOAD_MAX_FILES} filer per anrop."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Använd första användaren som uppladdare i utvecklingsmiljö, som upload_file
+    user = request.user if request.user.is_authenticated else User.objects.first()
+
+    pending = [item for item in items if not item.error]
+    with ThreadPoolExecutor(max_workers=settings.BATCH_UPLOAD_WORKERS) as executor:
+        list(executor.map(_store_batch_item, pending))
+
+    stored = [item for item in pending if not item.error]
+    for item in stored:
+        item.instance = File(
+            name=item.name,
+            directory=directory,
+            project=project,
+            file=item.storage_name,
+            content_type='application/pdf',
+            size=item.size,
+            sha256=item.sha256,
+            description=item.description,
+            uploaded_by=user
+        )
+        if item.metadata is not None:
+            item.instance.page_count = len(item.metadata['pages'])
+            item.instance.pdf_metadata = item.metadata
+
+    using = router.db_for_write(File)
+    sessions = [item.session for item in stored if item.session is not None]
+    with transaction.atomic(using=using):
+        File.objects.using(using).bulk_create([item.instance for item in stored])
+        files_created_in_bulk([item.instance for item in stored])
+        now = timezone.now()
+        for item in stored:
+            if item.session is not None:
+                item.session.file = item.instance
+                item.session.sha256 = item.sha256
+                item.session.updated_at = now
+        UploadSession.objects.using(using).bulk_update(sessions, ['file', 'sha256', 'updated_at'])
+
+    for item in stored:
+        if item.session is not None and os.path.exists(item.session.temp_path):
+            os.remove(item.session.temp_path)
+
+    results = [item.result(request) for item in items]
+    created = len(stored)
+    if created == len(items):
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({
+        "detail": f"{created} av {len(items)} filer har laddats upp.",
+        "created": created,
+        "results": results
+    }, status=response_status)
@@ -7,6 +7,8 @@ from . import upload_api
 from . import api_views
 from . import proxy_views
 from . import api_annotations
+from . import search_api
+from . import rendition_api
 
 # API router för RESTful endpoints
 router = DefaultRouter()
@@ -20,6 +22,26 @@ urlpatterns = [
     
     # API för filuppladdning
     path('upload/', upload_api.upload_file, name='api_upload_file'),
+    path('upload/batch/', upload_api.batch_upload, name='api_batch_upload'),
+    
+    # Återupptagbar uppladdning i bitar (tus 1.0.0) för stora filer
+    path('uploads/', upload_api.create_upload, name='resumable_upload_create'),
+    path('uploads/<uuid:upload_id>/', upload_api.upload_session, name='resumable_upload'),
+    path('uploads/<uuid:upload_id>/finalize/', upload_api.finalize_upload, name='resumable_upload_finalize'),
+    
+    # Förhandsbild av en PDF-sida (small, medium eller large)
+    path('renditions/<int:file_id>/<int:page>/<str:size>/', rendition_api.file_rendition, name='file_rendition'),
+    
+    # Tile-pyramid för djupzoom: geometri per sida och tiles som {z}/{x}/{y}
+    path('tiles/<int:object_id>/<int:page>/', rendition_api.tile_info, name='file_tile_info'),
+    path('tiles/<int:object_id>/<int:page>/<int:z>/<int:x>/<int:y>/', rendition_api.tile, name='file_tile'),
+    path('tiles/pdf-documents/<int:object_id>/<int:page>/', rendition_api.tile_info,
+         {'source': 'pdf-documents'}, name='pdf_document_tile_info'),
+    path('tiles/pdf-documents/<int:object_id>/<int:page>/<int:z>/<int:x>/<int:y>/', rendition_api.tile,
+         {'source': 'pdf-documents'}, name='pdf_document_tile'),
+    
+    # Fulltextsökning i PDF-text, filnamn, beskrivningar och kommentarer
+    path('search/', search_api.search_view, name='search'),
     
     # API för att radera en fil
     path('delete/<int:file_id>/', web_api.delete_file, name='delete_file'),
@@ -33,12 +55,18 @@ urlpatterns = [
     # Ny endpoint för att hämta fil-innehåll (PDF) via ID
     path('get-file-content/<str:file_id>/', web_api.get_file_content, name='get_file_content'),
     
+    # Alias som alltid pekar på senaste versionen (omvalideras i stället för att cachas)
+    path('get-file-content/<str:file_id>/latest/', web_api.get_latest_file_content, name='get_latest_file_content'),
+    
     # Direktåtkomst till PDF-fil via sökväg i media-katalogen (utan avslutande /)
     path('pdf-media/<path:file_path>', web_api.serve_pdf_file, name='serve_pdf_file'),
     
     # Proxy för PDF-filer som löser CORS-problem
     path('pdf-proxy/<int:file_id>/', proxy_views.PDFProxyView.as_view(), name='pdf_proxy'),
     
+    # Signerade, kortlivade media-URL:er (files.signing), utan databasfrågor per anrop
+    path('signed/<path:name>', web_api.signed_media, name='signed_media'),
+    
     # Ny förbättrad endpoint för direkt åtkomst till projektfiler (PDF)
     path('web/<str:project_id>/data/<path:path_info>', api_views.serve_project_file, name='serve_project_file'),
     
@@ -2,8 +2,12 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q
-from .models import File, Directory
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from .models import File, Directory, SearchEntry
 from .serializers import FileSerializer, DirectorySerializer
+from . import archive, sidebar, signing
+from .search_api import FullTextSearchFilter
 from core.models import Project, RoleAccess
 
 class DirectoryViewSet(viewsets.ModelViewSet):
@@ -24,55 +28,15 @@ class DirectoryViewSet(viewsets.ModelViewSet):
             # Debuginfo för att se vad vi raderar
             print(f"Raderar mapp: {directory_id} ({slug_to_delete})")
             
-            # Hitta alla undermappar rekursivt
-            def get_all_child_directories(parent_id):
-                child_dirs = Directory.objects.filter(parent_id=parent_id).values_list('id', flat=True)
-                all_dirs = list(child_dirs)
-                
-                for child_id in child_dirs:
-                    child_subdirs = get_all_child_directories(child_id)
-                    if child_subdirs:
-                        all_dirs.extend(child_subdirs)
-                        
-                return all_dirs
-            
-            # Hitta alla undermappar
-            child_directory_ids = get_all_child_directories(directory_id)
-            print(f"Undermappar som ska raderas: {child_directory_ids}")
-            
-            # Radera alla filer i dessa mappar 
-            from .models import File
-            deleted_files = 0
-            
-            # Ta bort filer i huvudmappen
-            main_folder_files = File.objects.filter(directory_id=directory_id).delete()
-            deleted_files += main_folder_files[0] if main_folder_files[0] else 0
-            
-            # Ta bort filer i undermappar
-            for dir_id in child_directory_ids:
-                files_deleted = File.objects.filter(directory_id=dir_id).delete()
-                deleted_files += files_deleted[0] if files_deleted[0] else 0
-            
-            # Viktigt: Se till att avmarkera is_sidebar_item flaggan för alla mappar före radering
-            # Detta löser problemet med att raderade mappar fortfarande visas i sidomenyn
-            Directory.objects.filter(id=directory_id).update(is_sidebar_item=False)
-            if child_directory_ids:
-                Directory.objects.filter(id__in=child_directory_ids).update(is_sidebar_item=False)
-            
-            # Radera alla undermappar
-            deleted_directories = 0
-            if child_directory_ids:
-                delete_result = Directory.objects.filter(id__in=child_directory_ids).delete()
-                deleted_directories = delete_result[0] if delete_result[0] else 0
-            
-            # Radera slutligen huvudmappen
-            instance.delete()
+            # Radera hela delträdet (mappar och filer) med ett fast antal frågor
+            deleted_directories, deleted_files = instance.delete_subtree()
+            print(f"Raderade {deleted_directories} mappar och {deleted_files} filer")
             
             # Returnera detaljerad information om raderingen
             return Response({
                 "message": f"Mappen '{slug_to_delete}' och allt dess innehåll har raderats",
                 "details": {
-                    "deleted_directories": deleted_directories + 1,  # +1 för huvudmappen
+                    "deleted_directories": deleted_directories,
                     "deleted_files": deleted_files,
                     "slug": slug_to_delete,
                     "id": directory_id
@@ -134,9 +98,64 @@ class DirectoryViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    @action(detail=True, methods=['get'])
+    def subtree(self, request, pk=None):
+        """Hämta mappens sökväg, alla undermappar och antal filer i hela delträdet"""
+        directory = self.get_object()
+        descendants = directory.get_descendants().order_by('tree_path')
+        return Response({
+            "path": directory.get_path(),
+            "file_count": directory.get_subtree_files().filter(is_latest=True).count(),
+            "directories": self.get_serializer(descendants, many=True).data
+        })
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Ladda ner mappen med alla undermappar som ZIP, strömmat medan det byggs.
+        Standard är de senaste versionerna; med ?files=1,2,3 väljs vilka filversioner i delträdet som tas med.
+        """
+        directory = self.get_object()
+        file_ids = None
+        if request.query_params.get('files'):
+            try:
+                file_ids = [int(file_id) for file_id in request.query_params['files'].split(',')]
+            except ValueError:
+                return Response({"error": "files måste vara en kommaseparerad lista med id"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        entries = archive.archive_entries(directory, file_ids)
+        response = StreamingHttpResponse(archive.stream_zip(entries), content_type='application/zip')
+        response['Content-Disposition'] = content_disposition_header(True, f"{directory.name}.zip")
+        # Arkivet byggs om vid varje anrop och ska inte buffras av en proxy
+        response['Cache-Control'] = 'no-store'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
     @action(detail=False, methods=['get'])
     def sidebar_tree(self, request):
-        """Get all sidebar items in a tree structure"""
+        """
+        Get all sidebar items in a tree structure.
+        
+        Med ?nested=true returneras hela det nästlade trädet (valfritt begränsat
+        med ?depth=) med antal filer per mapp, byggt från en enda fråga och
+        cachat per projekt (?project=<id> eller ?project=null).
+        """
+        if request.query_params.get('nested', 'false').lower() == 'true':
+            project_id = request.query_params.get('project', sidebar.ALL_PROJECTS)
+            if project_id == 'null':
+                project_id = None
+            elif project_id != sidebar.ALL_PROJECTS and not project_id.isdigit():
+                return Response({"error": "Ogiltigt projekt-id"}, status=status.HTTP_400_BAD_REQUEST)
+            
+            max_depth = request.query_params.get('depth')
+            if max_depth is not None:
+                if not max_depth.isdigit():
+                    return Response({"error": "depth måste vara ett heltal"}, status=status.HTTP_400_BAD_REQUEST)
+                max_depth = int(max_depth)
+            
+            project_key = int(project_id) if project_id not in (None, sidebar.ALL_PROJECTS) else project_id
+            return Response(sidebar.get_sidebar_tree(project_key, max_depth=max_depth))
+        
         queryset = Directory.objects.filter(is_sidebar_item=True).order_by('name')
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -150,8 +169,9 @@ class DirectoryViewSet(viewsets.ModelViewSet):
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.all()
     serializer_class = FileSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['name']
+    full_text_search = {SearchEntry.KIND_FILE: 'id', SearchEntry.KIND_PAGE: 'sha256'}  # Namn, beskrivning och PDF-text
     ordering_fields = ['name', 'created_at', 'size']
     permission_classes = [permissions.AllowAny]  # Tillåt alla anrop för utvecklingsändamål
     
@@ -163,7 +183,8 @@ class FileViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter files by project and directory"""
-        queryset = File.objects.all()
+        # directory, project och uploaded_by läses av FileSerializer för varje rad
+        queryset = File.objects.select_related('directory', 'project', 'uploaded_by')
         
         # Filter by project (required)
         project_id = self.request.query_params.get('project')
@@ -184,23 +205,21 @@ class FileViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    @action(detail=True, methods=['get'], url_path='signed-url')
+    def signed_url(self, request, pk=None):
+        """Kortlivad signerad URL till just den här versionens innehåll (se files.signing)"""
+        file = self.get_object()
+        if not file.file:
+            return Response({"error": "Filen saknar innehåll"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(signing.signed_url_data(request, file.file.name, file.name))
+    
     @action(detail=True, methods=['get'])
     def versions(self, request, pk=None):
         """Get all versions of a specific file"""
         file = self.get_object()
         
-        # Find the first version
-        first_version = file
-        while first_version.previous_version:
-            first_version = first_version.previous_version
-        
-        # Get all versions from the first one
-        all_versions = []
-        current = first_version
-        while current:
-            all_versions.append(current)
-            next_versions = File.objects.filter(previous_version=current)
-            current = next_versions.first() if next_versions.exists() else None
+        # Hela historiken via versionsgruppen, sorterad på versionsnummer
+        all_versions = file.get_versions()
         
         serializer = self.get_serializer(all_versions, many=True)
         return Response(serializer.data)
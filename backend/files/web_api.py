@@ -1,16 +1,29 @@
-from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
+from django.core.signing import BadSignature
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_http_methods
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Directory, File
+from .delivery import aserve_file, aserve_stored, serve_stored, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from .hashing import etag_for
+from .storage import blob_storage, is_blob_name, sha256_from_name
+from . import directory_cache, linearize, signing
+import asyncio
+import mimetypes
 import os
+import time
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def directory_data(request, slug):
     """
     API-endpoint för att tillhandahålla data för en specifik mapp till frontend.
+    Svaret cachas per mapp och har en ETag (se files.directory_cache).
     """
     # Kontrollera om detta är en direktnedladdningsbegäran
     direct_param = request.query_params.get('direct', None)
@@ -24,29 +37,21 @@ def directory_data(request, slug):
         try:
             # Om vi har en filsökväg, prioritera den
             if file_path_param:
-                import os
-                from django.conf import settings
-                
-                # Säkerställ att filsökvägen är relativ till media-katalogen
+                # Säkerställ att filsökvägen är relativ till media-katalogen (lagringsnamn)
                 if file_path_param.startswith('/'):
                     file_path_param = file_path_param[1:]
+                file_path = file_path_param
                 
-                # Konstruera fullständig sökväg
-                file_path = os.path.join(settings.MEDIA_ROOT, file_path_param)
-                
-                # Kontrollera att filen existerar och är läsbar
-                if not os.path.exists(file_path):
+                # Kontrollera att filen existerar i lagringen
+                if not blob_storage.exists(file_path):
                     return Response({"error": f"Kan inte hitta filen: {file_path_param}"}, status=404)
                 
-                # Öppna filen direkt
-                from django.http import FileResponse
-                response = FileResponse(
-                    open(file_path, 'rb'),
-                    content_type='application/pdf'
+                # Leverera filen med stöd för Range-förfrågningar
+                response = serve_stored(
+                    request, file_path, content_type='application/pdf'
                 )
                 
                 # Sätt headers för korrekt visning
-                response['Content-Disposition'] = f'inline; filename="{os.path.basename(file_path)}"'
                 response.headers.pop('X-Frame-Options', None)
                 response['Access-Control-Allow-Origin'] = '*'
                 
@@ -58,26 +63,19 @@ def directory_data(request, slug):
                 # Hämta filen från databasen
                 file_obj = File.objects.get(name=filename, directory__slug=slug)
                 
-                # Öppna filen direkt från disk
-                import os
-                from django.conf import settings
-                
-                file_path = os.path.join(settings.MEDIA_ROOT, file_obj.file.name)
+                file_path = file_obj.file.name
                 
-                # Kontrollera att filen finns
-                if not os.path.exists(file_path):
+                # Kontrollera att filen finns i lagringen
+                if not blob_storage.exists(file_path):
                     return Response({"error": "Filen hittades inte på disken"}, status=404)
                     
-                # Returnera filen som PDF med öppen filestream
-                from django.http import FileResponse
-                response = FileResponse(
-                    open(file_path, 'rb'),
-                    content_type='application/pdf'
+                # Returnera filen som PDF med stöd för Range-förfrågningar
+                response = serve_stored(
+                    request, file_path,
+                    content_type='application/pdf',
+                    filename=f"{file_obj.name}.pdf"
                 )
                 
-                # Sätt nödvändiga headers för korrekt PDF-visning
-                response['Content-Disposition'] = f'inline; filename="{file_obj.name}.pdf"'
-                
                 # Radera X-Frame-Options header helt för att tillåta embedding
                 response.headers.pop('X-Frame-Options', None)
                 
@@ -93,50 +91,21 @@ def directory_data(request, slug):
             traceback.print_exc()
             return Response({"error": str(e)}, status=500)
     
-    # Standardlogik för att hämta mappdata
-    directory = get_object_or_404(Directory, slug=slug)
-    
-    # Hämta föräldermappen om sådan finns
-    parent_data = None
-    if directory.parent:
-        parent_data = {
-            'name': directory.parent.name,
-            'slug': directory.parent.slug
-        }
-    
-    # Hämta undermappar
-    subfolders = Directory.objects.filter(parent=directory).values('name', 'slug')
-    
-    # Hämta filer i denna mapp
-    files = File.objects.filter(directory=directory, is_latest=True).values(
-        'id', 'name', 'file', 'content_type', 'created_at'
-    )
-    
-    # Formatera data för frontend
-    data = {
-        'id': directory.id,
-        'name': directory.name,
-        'slug': directory.slug,
-        'description': directory.page_description,
-        'page_title': directory.page_title or directory.name,
-        'subfolders': list(subfolders),
-        'files': [{
-            'id': file['id'],
-            'name': file['name'],
-            'file': request.build_absolute_uri(file['file']),
-            'content_type': file['content_type'],
-            'uploaded_at': file['created_at']
-        } for file in files],
-    }
-    
-    # Lägg till föräldermappinformation om den finns
-    if parent_data:
-        data['parent_name'] = parent_data['name']
-        data['parent_slug'] = parent_data['slug']
+    # Standardlogik för att hämta mappdata, cachad per mapp (files.directory_cache)
+    entry = directory_cache.get(slug)
+    if entry is None:
+        raise Http404("Mappen hittades inte")
+    directory_cache.record_visit(entry['data']['id'])
     
-    return Response(data)
+    # Klienten omvaliderar med ETag och får 304 om mappen inte ändrats
+    response = get_conditional_response(request, etag=entry['etag'])
+    if response is None:
+        response = Response(directory_cache.absolute(entry['data'], request))
+    response['ETag'] = entry['etag']
+    response['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response
     
-@api_view(['GET'])
+@api_view(['GET', 'HEAD'])
 @permission_classes([AllowAny])
 def direct_file_download(request, file_id):
     """
@@ -146,32 +115,25 @@ def direct_file_download(request, file_id):
         # Hämta filen från databasen
         file_obj = get_object_or_404(File, id=file_id)
         
-        # Öppna filen direkt från disk
-        import os
-        from django.conf import settings
-        
-        file_path = os.path.join(settings.MEDIA_ROOT, file_obj.file.name)
+        file_path = file_obj.file.name
         
-        # Kontrollera att filen finns
-        if not os.path.exists(file_path):
+        # Kontrollera att filen finns i lagringen
+        if not blob_storage.exists(file_path):
             return Response({"error": "Filen hittades inte på disken"}, status=404)
             
-        # Returnera filen som PDF med öppen filestream
-        from django.http import FileResponse
-        response = FileResponse(
-            open(file_path, 'rb'),
-            content_type='application/pdf'
+        # Returnera filen som PDF med stöd för Range-förfrågningar
+        response = serve_stored(
+            request, file_path,
+            content_type='application/pdf',
+            filename=f"{file_obj.name}.pdf"
         )
         
-        # Sätt nödvändiga headers för korrekt PDF-visning
-        response['Content-Disposition'] = f'inline; filename="{file_obj.name}.pdf"'
-        
         # Radera X-Frame-Options header helt för att tillåta embedding
         response.headers.pop('X-Frame-Options', None)
         
         # Tillåt innehållsdelning mellan olika ursprung
         response['Access-Control-Allow-Origin'] = '*'
-        response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
         
         # Underlätta debugging
         print(f"Serving PDF file: {file_path} with content type: {response['Content-Type']}")
@@ -182,68 +144,41 @@ def direct_file_download(request, file_id):
         return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET', 'HEAD', 'OPTIONS'])
-@permission_classes([AllowAny])
-def serve_pdf_file(request, file_path):
+@require_http_methods(['GET', 'HEAD', 'OPTIONS'])
+async def serve_pdf_file(request, file_path):
     """
     Dedikerad endpoint för att servera PDF-filer direkt från media-katalogen
     med korrekt Content-Type och headers.
+    Asynkron så att överföringen under ASGI inte håller en tråd.
     """
-    from django.http import HttpResponse, Http404, FileResponse
-    import os
-    from django.conf import settings
-    
     # Hantera OPTIONS-anrop för CORS preflight requests
     if request.method == 'OPTIONS':
         response = HttpResponse()
         response['Allow'] = 'GET, HEAD, OPTIONS'
         response['Access-Control-Allow-Origin'] = '*'
         response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization'
+        response['Access-Control-Allow-Headers'] = 'Content-Type, Accept, Authorization, Range, If-Range'
         return response
     
     try:
-        # Rensa sökvägen och skapa fullständig filsökväg
+        # Rensa sökvägen, den är relativ media-katalogen och alltså ett lagringsnamn
         clean_path = file_path.rstrip('/').replace('..', '')
-        full_path = os.path.join(settings.MEDIA_ROOT, clean_path)
         
         # Logga för felsökning
-        print(f"Serving PDF file: {full_path}")
+        print(f"Serving PDF file: {clean_path}")
         
-        # Kontrollera att filen existerar
-        if not os.path.exists(full_path) or not os.path.isfile(full_path):
-            print(f"PDF file not found: {full_path}")
-            
-            # Leta efter liknande filer som hjälp för felsökning
-            import glob
-            parent_dir = os.path.dirname(full_path)
-            if os.path.exists(parent_dir):
-                similar_files = glob.glob(os.path.join(parent_dir, "*.pdf"))
-                if similar_files:
-                    print(f"Similar PDF files in directory: {similar_files}")
-            
+        # Kontrollera att filen existerar i lagringen
+        if not await asyncio.to_thread(blob_storage.exists, clean_path):
+            print(f"PDF file not found: {clean_path}")
             return HttpResponse(
-                f"PDF file not found: {os.path.basename(full_path)}".encode('utf-8'), 
+                f"PDF file not found: {os.path.basename(clean_path)}".encode('utf-8'), 
                 status=404, 
                 content_type='text/plain'
             )
             
-        # För HEAD-förfrågningar, returnera bara headers
-        if request.method == 'HEAD':
-            response = HttpResponse(content_type='application/pdf')
-            response['Content-Length'] = os.path.getsize(full_path)
-            response['Accept-Ranges'] = 'bytes'
-            response['Content-Disposition'] = f'inline; filename="{os.path.basename(full_path)}"'
-            response['Access-Control-Allow-Origin'] = '*'
-            return response
-            
-        # För GET-förfrågningar, använd StreamingHttpResponse för att returnera PDF-datan direkt
-        with open(full_path, 'rb') as pdf_file:
-            response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-            
-        # Lägg till nödvändiga headers
-        response['Content-Disposition'] = f'inline; filename="{os.path.basename(full_path)}"'
-        response['Content-Length'] = os.path.getsize(full_path)
+        # Leverera filen med stöd för Range-förfrågningar (och HEAD) utan att
+        # läsa in hela filen i minnet
+        response = await aserve_stored(request, clean_path, content_type='application/pdf')
         response['Access-Control-Allow-Origin'] = '*'
         
         # Ta bort eventuella headers som kan störa pdf-visning
@@ -252,9 +187,9 @@ def serve_pdf_file(request, file_path):
                 del response[header]
                 
         # Debugging
-        print(f"Successfully served PDF: {full_path}")
+        print(f"Successfully served PDF: {clean_path} ({response.status_code})")
         print(f"Content-Type: {response['Content-Type']}")
-        print(f"Content-Length: {response['Content-Length']}")
+        print(f"Content-Length: {response.get('Content-Length')}")
             
         return response
     
@@ -309,71 +244,20 @@ def delete_directory(request, slug):
             parent_id = instance.parent.id
             parent_slug = instance.parent.slug
         
-        # Hitta alla undermappar rekursivt
-        def get_all_child_directories(parent_id):
-            try:
-                child_dirs = Directory.objects.filter(parent_id=parent_id).values_list('id', flat=True)
-                all_dirs = list(child_dirs)
-                
-                for child_id in child_dirs:
-                    child_subdirs = get_all_child_directories(child_id)
-                    if child_subdirs:
-                        all_dirs.extend(child_subdirs)
-                        
-                return all_dirs
-            except Exception as e:
-                print(f"Fel vid hämtning av undermappar: {str(e)}")
-                return []
-        
-        # Hitta alla undermappar
-        child_directory_ids = get_all_child_directories(directory_id)
-        print(f"Undermappar som ska raderas: {child_directory_ids}")
-        
-        # Radera alla filer i dessa mappar
-        deleted_files = 0
-        
-        try:
-            # Ta bort filer i huvudmappen
-            main_folder_files = File.objects.filter(directory_id=directory_id).delete()
-            deleted_files += main_folder_files[0] if main_folder_files[0] else 0
-            
-            # Ta bort filer i undermappar
-            for dir_id in child_directory_ids:
-                files_deleted = File.objects.filter(directory_id=dir_id).delete()
-                deleted_files += files_deleted[0] if files_deleted[0] else 0
-        except Exception as e:
-            print(f"Fel vid radering av filer: {str(e)}")
-        
+        # Radera hela delträdet (mappar och filer) med ett fast antal frågor
         try:
-            # Avmarkera is_sidebar_item flaggan för alla mappar före radering
-            Directory.objects.filter(id=directory_id).update(is_sidebar_item=False)
-            if child_directory_ids:
-                Directory.objects.filter(id__in=child_directory_ids).update(is_sidebar_item=False)
+            deleted_directories, deleted_files = instance.delete_subtree()
         except Exception as e:
-            print(f"Fel vid uppdatering av is_sidebar_item: {str(e)}")
-        
-        # Radera alla undermappar
-        deleted_directories = 0
-        try:
-            if child_directory_ids:
-                delete_result = Directory.objects.filter(id__in=child_directory_ids).delete()
-                deleted_directories = delete_result[0] if delete_result[0] else 0
-        except Exception as e:
-            print(f"Fel vid radering av undermappar: {str(e)}")
-        
-        # Radera slutligen huvudmappen
-        try:
-            instance.delete()
-        except Exception as e:
-            print(f"Fel vid radering av huvudmapp: {str(e)}")
+            print(f"Fel vid radering av mappen: {str(e)}")
             raise e  # Låt felet propagera vidare
+        print(f"Raderade {deleted_directories} mappar och {deleted_files} filer")
         
         # Returnera detaljerad information om raderingen
         return Response({
             "success": True,
             "message": f"Mappen '{slug_to_delete}' och allt dess innehåll har raderats",
             "details": {
-                "deleted_directories": deleted_directories + 1,  # +1 för huvudmappen
+                "deleted_directories": deleted_directories,
                 "deleted_files": deleted_files,
                 "slug": slug_to_delete,
                 "id": directory_id,
@@ -392,47 +276,123 @@ def delete_directory(request, slug):
             "error": f"Kunde inte radera mappen: {str(e)}"
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def get_file_content(request, file_id):
+async def _file_content_response(request, file_obj, cache_control):
+    """
+    Leverera en fils innehåll som PDF med ETag, Last-Modified och given cachepolicy.
+    För visning levereras den linjäriserade kopian om den finns, med ?download=1 originalet.
+    """
+    name = file_obj.file.name
+    
+    # Kontrollera att filen finns i lagringen
+    if not name or not await asyncio.to_thread(blob_storage.exists, name):
+        return JsonResponse({"error": "Filen hittades inte på disken"}, status=404)
+    
+    # etag_for kan behöva hasha filen och spara hashen
+    etag = await sync_to_async(etag_for)(file_obj)
+    file_path = None
+    if not request.GET.get('download'):
+        file_path, etag = await asyncio.to_thread(linearize.viewing_file, file_obj.sha256, None)
+    
+    # Returnera filen som PDF med stöd för Range- och villkorade förfrågningar,
+    # den linjäriserade kopian från disk och annars originalet ur lagringen
+    options = dict(
+        content_type='application/pdf',
+        filename=file_obj.name,
+        etag=etag,
+        last_modified=file_obj.updated_at.timestamp()
+    )
+    if file_path:
+        response = await aserve_file(request, file_path, **options)
+    else:
+        response = await aserve_stored(request, name, **options)
+    # Omdirigeringar till förhandssignerade URL:er får inte cachas
+    response.setdefault('Cache-Control', cache_control)
+    
+    # Tillåt embedding i iframe och cross-origin access
+    response.headers.pop('X-Frame-Options', None)
+    response['Access-Control-Allow-Origin'] = '*'
+    
+    print(f"Levererar PDF-fil via get_file_content: {file_path or name}")
+    return response
+
+@require_http_methods(['GET', 'HEAD'])
+async def get_file_content(request, file_id):
     """
     API-endpoint för att hämta en PDF-fils innehåll direkt via ID.
     Stödjer strömning av PDF-filer för inline-visning i webbläsare.
+    
+    Ett File-id pekar alltid på en och samma version, så svaret kan cachas
+    som oföränderligt. Använd get_latest_file_content för senaste versionen.
     """
     try:
-        # Hämta filen från databasen
-        file_obj = get_object_or_404(File, id=file_id)
-        file_path = file_obj.file.path
-        
-        # Kontrollera att filen finns på disken
-        if not os.path.exists(file_path):
-            return Response({"error": "Filen hittades inte på disken"}, status=404)
-        
-        # Returnera filen som PDF med öppnad filestream
-        from django.http import FileResponse
-        response = FileResponse(
-            open(file_path, 'rb'),
-            content_type='application/pdf'
-        )
-        
-        # Sätt headers för korrekt PDF-visning och caching
-        response['Content-Disposition'] = f'inline; filename="{file_obj.name}"'
-        
-        # Förbättrad cachehantering för PDF-filer
-        response['Cache-Control'] = 'no-store, must-revalidate, max-age=0'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-        
-        # Tillåt embedding i iframe och cross-origin access
-        response.headers.pop('X-Frame-Options', None)
-        response['Access-Control-Allow-Origin'] = '*'
-        
-        print(f"Levererar PDF-fil via get_file_content: {file_path}")
-        return response
-        
-    except File.DoesNotExist:
-        return Response({"error": "Filen hittades inte i databasen"}, status=404)
+        file_obj = await aget_object_or_404(File, id=file_id)
+        return await _file_content_response(request, file_obj, IMMUTABLE_CACHE_CONTROL)
+    except Http404:
+        return JsonResponse({"error": "Filen hittades inte i databasen"}, status=404)
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return Response({"error": str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({"error": str(e)}, status=500)
+
+@require_http_methods(['GET', 'HEAD'])
+async def get_latest_file_content(request, file_id):
+    """
+    Alias som alltid levererar den senaste versionen av filen.
+    Svaret måste omvalideras (ETag/Last-Modified) eftersom innehållet byts ut
+    när en ny version laddas upp.
+    """
+    try:
+        file_obj = await aget_object_or_404(File, id=file_id)
+        file_obj = await sync_to_async(file_obj.get_latest_version)()
+        return await _file_content_response(request, file_obj, REVALIDATE_CACHE_CONTROL)
+    except Http404:
+        return JsonResponse({"error": "Filen hittades inte i databasen"}, status=404)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({"error": str(e)}, status=500)
+
+@require_http_methods(['GET', 'HEAD', 'OPTIONS'])
+async def signed_media(request, name):
+    """
+    Leverera ett lagrat innehåll via en signerad URL (files.signing).
+    Signaturen kontrolleras utan databasfrågor, och eftersom namnet är
+    innehållsadresserat kan svaret cachas av en proxy tills URL:en går ut.
+    """
+    if request.method == 'OPTIONS':
+        response = HttpResponse()
+    else:
+        try:
+            _, expires = signing.verify(name, request.GET)
+        except BadSignature as e:
+            return JsonResponse({"error": str(e)}, status=403)
+        
+        if not await asyncio.to_thread(blob_storage.exists, name):
+            return JsonResponse({"error": "Filen hittades inte"}, status=404)
+        
+        filename = request.GET.get('f') or os.path.basename(name)
+        content_type = mimetypes.guess_type(filename)[0] or mimetypes.guess_type(name)[0]
+        sha256 = sha256_from_name(name) if is_blob_name(name) else ''
+        etag = f'"{sha256}"' if sha256 else None
+        
+        # PDF:er visas från den linjäriserade kopian om den finns (?download=1 ger originalet)
+        file_path = None
+        if sha256 and content_type == 'application/pdf' and not request.GET.get('download'):
+            file_path, etag = await asyncio.to_thread(linearize.viewing_file, sha256, None)
+        
+        options = dict(content_type=content_type, filename=filename, etag=etag)
+        if file_path:
+            response = await aserve_file(request, file_path, **options)
+        else:
+            response = await aserve_stored(request, name, **options)
+        
+        # Samma URL ger alltid samma bytes fram till utgången, men bara till den som har URL:en
+        max_age = max(0, int(expires - time.time()))
+        response.setdefault('Cache-Control', f'public, max-age={max_age}, immutable')
+        response.headers.pop('X-Frame-Options', None)
+    
+    response['Access-Control-Allow-Origin'] = '*'
+    response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
+    response['Access-Control-Allow-Headers'] = 'Range, If-Range, If-None-Match'
+    response['Access-Control-Expose-Headers'] = 'Accept-Ranges, Content-Range, Content-Length, ETag'
+    return response
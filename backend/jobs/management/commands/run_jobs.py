@@ -0,0 +1,47 @@
+import multiprocessing
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from jobs import queue
+
+
+def _worker(burst):
+    """Entry point for a worker process: stop after the current job on SIGTERM/SIGINT"""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+    # Connections inherited from the parent must not be shared between processes
+    connections.close_all()
+    return queue.work(burst=burst, should_stop=lambda: bool(stopping))
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Number of worker processes (default JOB_WORKERS)')
+        parser.add_argument('--burst', action='store_true', help='Exit when no job is due')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or getattr(settings, 'JOB_WORKERS', 1)
+        burst = options['burst']
+
+        if workers <= 1:
+            processed = _worker(burst)
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
+            return
+
+        connections.close_all()
+        processes = [multiprocessing.Process(target=_worker, args=(burst,), daemon=False) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {workers} job workers")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
@@ -0,0 +1,57 @@
+from django.db import models
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by a run_jobs worker"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    
+    # Jobs that still hold their idempotency key
+    ACTIVE_STATUSES = [QUEUED, RUNNING]
+    
+    name = models.CharField(max_length=100)  # Registered task name, e.g. files.generate_renditions
+    payload = models.JSONField(default=dict, blank=True)  # Keyword arguments for the task
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.IntegerField(default=0)  # Higher runs first
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)  # Not claimed before this time (retry backoff)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_at'], name='jobs_job_claim_idx'),
+            models.Index(fields=['created_at', 'id'], name='jobs_job_created_idx'),
+        ]
+        constraints = [
+            # Only one queued or running job per key; finished jobs release it
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=Q(status__in=['queued', 'running']),
+                name='jobs_job_active_key_unique'
+            ),
+        ]
@@ -0,0 +1,278 @@
+"""
+Database-backed background job queue.
+
+Tasks are plain functions registered with @task in an app's tasks.py. They
+are enqueued as Job rows in the same transaction as the change that
+triggered them, so a rolled back upload never leaves work behind, and
+run_jobs worker processes claim and run them outside the request:
+
+    @task('files.generate_renditions', priority=10)
+    def generate_renditions(sha256, path):
+        ...
+
+    enqueue('files.generate_renditions', {'sha256': ..., 'path': ...}, key=f"renditions:{sha256}")
+
+Claiming is an optimistic conditional UPDATE (queued -> running), which works
+the same on SQLite and PostgreSQL without a broker. Failed jobs are retried
+with exponential backoff until max_attempts. An idempotency key is held while
+a job is queued or running, so enqueueing the same work twice returns the
+existing job. With JOBS_RUN_INLINE the job is run in-process when the
+transaction commits, which is what tests and a single dev server use.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# name -> (function, default priority, default max attempts)
+_registry = {}
+
+# Number of times claim() retries when another worker takes the job first
+CLAIM_RETRIES = 5
+
+
+def task(name, priority=0, max_attempts=None):
+    """Register a function as a background task under a stable name"""
+    def decorator(func):
+        _registry[name] = (func, priority, max_attempts)
+        func.job_name = name
+        return func
+    return decorator
+
+
+def get_task(name):
+    return _registry.get(name)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _new_job(name, payload, key, priority, delay, max_attempts, created_by):
+    """An unsaved Job for a registered task"""
+    name = getattr(name, 'job_name', name)
+    registered = _registry.get(name)
+    if registered is None:
+        raise ValueError(f"Unknown task: {name}")
+    _, default_priority, default_attempts = registered
+    return Job(
+        name=name,
+        payload=payload or {},
+        priority=default_priority if priority is None else priority,
+        idempotency_key=key or None,
+        max_attempts=max_attempts or default_attempts or _setting('JOB_MAX_ATTEMPTS', 5),
+        run_at=timezone.now() + timedelta(seconds=delay),
+        created_by=created_by,
+    )
+
+
+def _run_inline_on_commit(job):
+    if _setting('JOBS_RUN_INLINE', False):
+        transaction.on_commit(lambda: _run_inline(job.id))
+
+
+def enqueue(name, payload=None, key=None, priority=None, delay=0, max_attempts=None, created_by=None):
+    """
+    Queue a registered task.
+
+    Args:
+        name (str): Task name (or the decorated function)
+        payload (dict): Keyword arguments, must be JSON serializable
+        key (str, optional): Idempotency key, returns the active job with the same key if there is one
+        priority (int, optional): Higher runs first, defaults to the task's priority
+        delay (float): Seconds before the job may run
+
+    Returns:
+        Job: The new or existing job
+    """
+    job = _new_job(name, payload, key, priority, delay, max_attempts, created_by)
+
+    if key:
+        existing = Job.objects.filter(idempotency_key=key, status__in=Job.ACTIVE_STATUSES).first()
+        if existing:
+            return existing
+
+    try:
+        with transaction.atomic():
+            job.save(force_insert=True)
+    except IntegrityError:
+        # Another request enqueued the same key in between
+        existing = Job.objects.filter(idempotency_key=key, status__in=Job.ACTIVE_STATUSES).first()
+        if existing is None:
+            raise
+        return existing
+
+    _run_inline_on_commit(job)
+    return job
+
+
+def enqueue_many(jobs, created_by=None):
+    """
+    Queue several tasks with one lookup of their keys and one insert.
+
+    Args:
+        jobs: (name, payload, key) tuples; a key that is already active, or
+            repeated in jobs, is queued once
+
+    Returns:
+        list: The new and existing jobs
+    """
+    new, keys = [], set()
+    for name, payload, key in jobs:
+        if key and key in keys:
+            continue
+        if key:
+            keys.add(key)
+        new.append(_new_job(name, payload, key, None, 0, None, created_by))
+    if not new:
+        return []
+
+    existing = list(
+        Job.objects.filter(idempotency_key__in=keys, status__in=Job.ACTIVE_STATUSES).order_by()
+    ) if keys else []
+    active = {job.idempotency_key for job in existing}
+    new = [job for job in new if job.idempotency_key not in active]
+
+    try:
+        with transaction.atomic():
+            created = Job.objects.bulk_create(new)
+    except IntegrityError:
+        # Another request enqueued one of the keys in between, take them one at a time
+        return existing + [
+            enqueue(job.name, job.payload, key=job.idempotency_key, created_by=created_by) for job in new
+        ]
+
+    for job in created:
+        _run_inline_on_commit(job)
+    return existing + created
+
+
+def _run_inline(job_id):
+    job = _claim_job(Job.objects.filter(id=job_id).first(), worker_id='inline')
+    if job:
+        run_job(job)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claim_job(job, worker_id):
+    """Take a queued job for this worker, returns None if someone else got it first"""
+    if job is None:
+        return None
+    now = timezone.now()
+    claimed = Job.objects.filter(id=job.id, status=Job.QUEUED).update(
+        status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1, updated_at=now
+    )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def claim(worker_id=None):
+    """Claim the most urgent job that is due, or None if the queue is empty"""
+    worker_id = worker_id or worker_name()
+    for _ in range(CLAIM_RETRIES):
+        job = Job.objects.filter(status=Job.QUEUED, run_at__lte=timezone.now()).order_by('-priority', 'run_at', 'id').first()
+        if job is None:
+            return None
+        claimed = _claim_job(job, worker_id)
+        if claimed:
+            return claimed
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff in seconds after the given number of failed attempts"""
+    base = _setting('JOB_RETRY_BACKOFF', 10)
+    return min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_MAX_DELAY', 3600))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome, retrying later if attempts remain"""
+    registered = _registry.get(job.name)
+    now = timezone.now()
+    if registered is None:
+        job.status, job.last_error, job.finished_at = Job.FAILED, f"Unknown task: {job.name}", now
+        job.save(update_fields=['status', 'last_error', 'finished_at', 'updated_at'])
+        return job
+
+    try:
+        result = registered[0](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+            logger.warning(f"Job {job} failed, retrying at {job.run_at}")
+        else:
+            job.status, job.finished_at = Job.FAILED, timezone.now()
+            logger.error(f"Job {job} failed after {job.attempts} attempts")
+        job.locked_by, job.locked_at = '', None
+        job.save(update_fields=['status', 'run_at', 'last_error', 'finished_at', 'locked_by', 'locked_at', 'updated_at'])
+        return job
+
+    job.status, job.result, job.finished_at = Job.SUCCEEDED, result, timezone.now()
+    job.locked_by, job.locked_at = '', None
+    job.save(update_fields=['status', 'result', 'finished_at', 'locked_by', 'locked_at', 'updated_at'])
+    return job
+
+
+def recover_stale():
+    """Requeue jobs whose worker died while running them (locked longer than JOB_LOCK_TIMEOUT)"""
+    cutoff = timezone.now() - timedelta(seconds=_setting('JOB_LOCK_TIMEOUT', 600))
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(), last_error="Worker stopped while running the job"
+    )
+    requeued = stale.update(status=Job.QUEUED, locked_by='', locked_at=None, run_at=timezone.now())
+    return requeued + failed
+
+
+def purge_finished():
+    """Delete succeeded jobs older than JOB_RETENTION_DAYS; failed jobs are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=_setting('JOB_RETENTION_DAYS', 7))
+    deleted, _ = Job.objects.filter(status=Job.SUCCEEDED, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def work(worker_id=None, burst=False, should_stop=lambda: False):
+    """
+    Claim and run jobs until stopped.
+
+    Args:
+        burst (bool): Return when no job is due instead of polling
+
+    Returns:
+        int: Number of jobs run
+    """
+    worker_id = worker_id or worker_name()
+    poll_interval = _setting('JOB_POLL_INTERVAL', 1.0)
+    housekeeping_at = 0
+    processed = 0
+    while not should_stop():
+        if time.monotonic() >= housekeeping_at:
+            recover_stale()
+            purge_finished()
+            housekeeping_at = time.monotonic() + 60
+
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
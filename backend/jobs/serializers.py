@@ -0,0 +1,12 @@
+from rest_framework import serializers
+from .models import Job
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'payload', 'status', 'priority', 'idempotency_key',
+            'attempts', 'max_attempts', 'run_at', 'last_error', 'result',
+            'created_by', 'created_at', 'updated_at', 'finished_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,143 @@
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from datetime import timedelta
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.models import User
+from .models import Job
+from . import queue
+
+calls = []
+
+
+@queue.task('tests.record')
+def record(value):
+    calls.append(value)
+    return value
+
+
+@queue.task('tests.flaky', max_attempts=2)
+def flaky():
+    calls.append('flaky')
+    raise RuntimeError("temporary failure")
+
+
+class JobQueueTestCase(TestCase):
+    """Test cases for the database job queue"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_order(self):
+        queue.enqueue('tests.record', {'value': 'low'}, priority=-1)
+        queue.enqueue('tests.record', {'value': 'normal'})
+        queue.enqueue('tests.record', {'value': 'high'}, priority=10)
+        queue.enqueue('tests.record', {'value': 'later'}, priority=20, delay=60)
+
+        self.assertEqual(queue.work(burst=True), 3)
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+        self.assertEqual(Job.objects.filter(status=Job.SUCCEEDED).count(), 3)
+        self.assertEqual(Job.objects.get(payload__value='high').result, 'high')
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+    def test_idempotency_key(self):
+        first = queue.enqueue('tests.record', {'value': 1}, key='record:1')
+        self.assertEqual(queue.enqueue('tests.record', {'value': 1}, key='record:1'), first)
+        queue.work(burst=True)
+
+        # A finished job releases its key
+        second = queue.enqueue('tests.record', {'value': 1}, key='record:1')
+        self.assertNotEqual(second, first)
+        self.assertEqual(Job.objects.filter(idempotency_key='record:1').count(), 2)
+
+    def test_enqueue_many(self):
+        existing = queue.enqueue('tests.record', {'value': 1}, key='record:1')
+        # One lookup and one insert (in a savepoint)
+        with self.assertNumQueries(4):
+            jobs = queue.enqueue_many([
+                ('tests.record', {'value': 1}, 'record:1'),
+                ('tests.record', {'value': 2}, 'record:2'),
+                ('tests.record', {'value': 2}, 'record:2'),
+                ('tests.record', {'value': 3}, None),
+            ])
+        self.assertIn(existing, jobs)
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(Job.objects.count(), 3)
+        queue.work(burst=True)
+        self.assertEqual(sorted(calls), [1, 2, 3])
+
+    def test_claimed_once(self):
+        job = queue.enqueue('tests.record', {'value': 1})
+        self.assertEqual(queue.claim('worker-a'), job)
+        self.assertIsNone(queue.claim('worker-b'))
+        self.assertEqual(Job.objects.get(id=job.id).locked_by, 'worker-a')
+
+    @override_settings(JOB_RETRY_BACKOFF=30)
+    def test_retry_with_backoff(self):
+        job = queue.enqueue('tests.flaky')
+        self.assertEqual(queue.work(burst=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('temporary failure', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=25))
+
+        # Not due yet
+        self.assertEqual(queue.work(burst=True), 0)
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        queue.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(calls, ['flaky', 'flaky'])
+
+    def test_stale_jobs_recovered(self):
+        job = queue.enqueue('tests.record', {'value': 1})
+        queue.claim('dead-worker')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(queue.recover_stale(), 1)
+        queue.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.SUCCEEDED, 2))
+
+    @override_settings(JOBS_RUN_INLINE=True)
+    def test_inline_runs_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = queue.enqueue('tests.record', {'value': 'inline'})
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, ['inline'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            queue.enqueue('tests.missing')
+
+
+class JobAPITestCase(TestCase):
+    """Test cases for the job status API"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="jobuser", email="jobuser@example.com", password="securepassword123")
+        self.admin = User.objects.create_user(username="jobadmin", email="jobadmin@example.com", password="securepassword123", is_staff=True)
+        self.own = queue.enqueue('tests.record', {'value': 1}, created_by=self.user)
+        self.other = queue.enqueue('tests.flaky', key='flaky', max_attempts=1)
+        queue.work(burst=True)
+        self.client = APIClient()
+
+    def test_users_see_their_jobs(self):
+        self.client.force_authenticate(self.user)
+        results = self.client.get(reverse('job-list')).json()['results']
+        self.assertEqual([job['id'] for job in results], [self.own.id])
+        self.assertEqual(results[0]['status'], Job.SUCCEEDED)
+
+    def test_staff_filter_and_retry(self):
+        self.client.force_authenticate(self.admin)
+        failed = self.client.get(reverse('job-list'), {'status': Job.FAILED}).json()['results']
+        self.assertEqual([job['id'] for job in failed], [self.other.id])
+
+        response = self.client.post(reverse('job-retry', args=[self.other.id]))
+        self.assertEqual(response.json()['status'], Job.QUEUED)
+        self.assertEqual(self.client.post(reverse('job-retry', args=[self.own.id])).status_code, 400)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post(reverse('job-retry', args=[self.own.id])).status_code, 403)
@@ -0,0 +1,50 @@
+from django.utils import timezone
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from core.pagination import CreatedAtCursorPagination
+from .models import Job
+from .serializers import JobSerializer
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background jobs.
+    Staff see every job, other users the jobs they started.
+    Filter with ?status=, ?name= or ?key= (idempotency key).
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    pagination_class = CreatedAtCursorPagination
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = Job.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('name'):
+            queryset = queryset.filter(name=params['name'])
+        if params.get('key'):
+            queryset = queryset.filter(idempotency_key=params['key'])
+        return queryset
+    
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def retry(self, request, pk=None):
+        """Queue a failed job again with a fresh set of attempts"""
+        job = self.get_object()
+        if job.status != Job.FAILED:
+            return Response({'detail': 'Only failed jobs can be retried'}, status=status.HTTP_400_BAD_REQUEST)
+        if job.idempotency_key and Job.objects.filter(
+            idempotency_key=job.idempotency_key, status__in=Job.ACTIVE_STATUSES
+        ).exists():
+            return Response({'detail': 'A job with the same key is already queued'}, status=status.HTTP_409_CONFLICT)
+        
+        job.status = Job.QUEUED
+        job.attempts = 0
+        job.run_at = timezone.now()
+        job.finished_at = None
+        job.save(update_fields=['status', 'attempts', 'run_at', 'finished_at', 'updated_at'])
+        return Response(JobSerializer(job).data)
@@ -37,6 +37,9 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='notification_user_created_idx'),
+        ]
 
 class Meeting(models.Model):
     """Model for project meetings"""
@@ -2,7 +2,10 @@ from django.test import TestCase
 from django.utils import timezone
 from datetime import timedelta
 from .models import Notification, Meeting
+from django.urls import reverse
+from rest_framework.test import APIClient
 from core.models import User, Project, Task
+from core.testing import QueryCountMixin
 
 class NotificationsModelsTestCase(TestCase):
     """Test cases for notifications app models"""
@@ -102,4 +105,38 @@ class NotificationsModelsTestCase(TestCase):
                 is_virtual=True
             )
 
+
+class MeetingListQueryCountTestCase(QueryCountMixin, TestCase):
+    """The meeting list must not issue queries per meeting"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="organizer",
+            email="organizer@example.com",
+            password="securepassword123"
+        )
+        self.project = Project.objects.create(
+            name="Test Project",
+            description="Test project description",
+            start_date="2023-01-01"
+        )
+        # No authentication classes are configured, so force the user onto the request
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def _create_meetings(self, count):
+        now = timezone.now()
+        for _ in range(count):
+            meeting = Meeting.objects.create(
+                title="Site Meeting",
+                project=self.project,
+                organizer=self.user,
+                start_time=now + timedelta(days=1),
+                end_time=now + timedelta(days=1, hours=1)
+            )
+            meeting.attendees.add(self.user)
+    
+    def test_meeting_list(self):
+        self.assertConstantQueries(reverse('meeting-list'), self._create_meetings)
+
 # API Tests will be added when the actual API implementation is completed
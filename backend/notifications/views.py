@@ -4,13 +4,15 @@ from rest_framework.response import Response
 from .models import Notification, Meeting
 from .serializers import NotificationSerializer, MeetingSerializer
 from core.models import Project, RoleAccess
+from core.pagination import CreatedAtCursorPagination
 
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    pagination_class = CreatedAtCursorPagination
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     def get_queryset(self):
         """Return only notifications for the current user"""
@@ -40,7 +42,8 @@ class MeetingViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Return meetings based on project and user participation"""
         user = self.request.user
-        queryset = Meeting.objects.filter(attendees=user)
+        # attendees is serialized as a list of ids; fetch them in one query for the whole page
+        queryset = Meeting.objects.filter(attendees=user).prefetch_related('attendees')
         
         # Filter by project if specified
         project_id = self.request.query_params.get('project')
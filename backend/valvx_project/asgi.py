@@ -1,5 +1,10 @@
 """
 ASGI config for valvx_project project.
+
+Run with e.g. ``uvicorn valvx_project.asgi:application --workers 4``. The file
+delivery views (direct/media/, files/pdf-media/, files/pdf-proxy/ and
+files/get-file-content/) are async, so under ASGI a slow download does not
+hold a thread. Compare with the WSGI server using ``manage.py load_test_downloads``.
 """
 
 import os
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'wiki',
     'notifications',
     'workspace',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -82,6 +83,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # run_jobs-workers skriver samtidigt som webbservern, vänta på låset i stället för att fela
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -136,6 +139,100 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Extra kataloger som tas med när filindexet byggs om (rebuild_file_index)
+FILE_INDEX_EXTRA_ROOTS = [
+    os.path.join(BASE_DIR.parent, 'basic-pdf-manager', 'uploads'),
+]
+
+# Återupptagbara uppladdningar (tus): temporära filer, maxstorlek och livslängd.
+# Katalogen bör ligga på samma filsystem som MEDIA_ROOT så att färdiga filer kan flyttas.
+RESUMABLE_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_staging')
+RESUMABLE_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2 GB
+RESUMABLE_UPLOAD_EXPIRY_HOURS = 24
+
+# Batchuppladdning (upload/batch/): filer per anrop, maxstorlek per fil i multipart
+# och antal trådar som skriver till lagringen samtidigt
+BATCH_UPLOAD_MAX_FILES = 200
+BATCH_UPLOAD_MAX_FILE_SIZE = 20 * 1024 * 1024  # 20 MB
+BATCH_UPLOAD_WORKERS = 8
+DATA_UPLOAD_MAX_NUMBER_FILES = BATCH_UPLOAD_MAX_FILES
+
+# Hur länge sidomenyns mappträd cachas (sekunder). Cachen rensas även vid ändringar.
+SIDEBAR_TREE_CACHE_TIMEOUT = 300
+
+# Hur länge mappsidans data (files.directory_cache) cachas (sekunder). Cachen ogiltigförklaras
+# när mappar eller filer ändras; manage.py warm_directory_cache förberäknar de mest besökta mapparna.
+DIRECTORY_DATA_CACHE_TIMEOUT = 3600
+
+# Hur länge en användares projektmedlemskap (core.membership) cachas mellan anrop (sekunder).
+# Cachen ogiltigförklaras när RoleAccess ändras.
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# Extrahera text ur PDF:er för fulltextsökning (files.search) när de laddas upp.
+# Kräver pypdf. Befintliga filer indexeras med manage.py build_search_index.
+SEARCH_EXTRACT_ON_UPLOAD = os.environ.get('SEARCH_EXTRACT_ON_UPLOAD', 'true').lower() == 'true'
+
+# Förhandsbilder av PDF-sidor (files.renditions), cachade per innehåll (sha256).
+# Renderas med pypdfium2 efter uppladdning och annars vid första anropet.
+RENDITION_CACHE_DIR = os.path.join(BASE_DIR, 'renditions')
+RENDITIONS_ON_UPLOAD = os.environ.get('RENDITIONS_ON_UPLOAD', 'true').lower() == 'true'
+RENDITION_MAX_PAGES = 200  # Sidor som förrenderas per dokument, resten renderas vid behov
+
+# Tile-pyramid för djupzoom (files.tiles). Högsta nivån renderas med upp till
+# TILE_MAX_SCALE pixlar per punkt (4.0 ≈ 288 dpi). Byggs med manage.py generate_tiles
+# i TILE_WORKERS processer (standard: antal kärnor) eller per tile vid behov.
+TILE_MAX_SCALE = 4.0
+TILE_WORKERS = None
+
+# Linjärisering (fast web view) av uppladdade PDF:er (files.linearize). Mindre filer
+# hämtas ändå i en eller ett par Range-förfrågningar och hoppas över. Effekten på
+# tid till första sidan mäts med manage.py benchmark_first_page.
+LINEARIZE_ON_UPLOAD = os.environ.get('LINEARIZE_ON_UPLOAD', 'true').lower() == 'true'
+LINEARIZE_MIN_SIZE = 256 * 1024
+
+# Bakgrundsjobb (jobs.queue) för arbete efter uppladdning och radering: förhandsbilder,
+# textextraktion, linjärisering och borttagning av blobs. Jobben ligger i databasen
+# och körs av manage.py run_jobs. Med JOBS_RUN_INLINE körs de i stället i processen
+# när transaktionen är klar (utveckling utan worker och tester).
+JOBS_RUN_INLINE = os.environ.get('JOBS_RUN_INLINE', 'false').lower() == 'true'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = 1.0  # Sekunder mellan försök när kön är tom
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10  # Sekunder före första omförsöket, fördubblas för varje försök
+JOB_RETRY_MAX_DELAY = 3600
+JOB_LOCK_TIMEOUT = 600  # Körande jobb utan klar worker efter så här lång tid köas om
+JOB_RETENTION_DAYS = 7  # Lyckade jobb rensas efter så här många dagar
+
+# Var uppladdade filer lagras (files.storage): 'local' (MEDIA_ROOT) eller 's3'
+# (S3-kompatibel bucket, t.ex. AWS S3 eller MinIO, kräver boto3)
+FILE_STORAGE_DRIVER = os.environ.get('FILE_STORAGE_DRIVER', 'local')
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None  # t.ex. http://localhost:9000 för MinIO
+S3_REGION = os.environ.get('S3_REGION') or None
+S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID') or None
+S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY') or None
+S3_PREFIX = os.environ.get('S3_PREFIX', '')
+S3_ADDRESSING_STYLE = os.environ.get('S3_ADDRESSING_STYLE', 'auto')  # 'path' för MinIO utan DNS per bucket
+# Multipart-överföring: filer över tröskeln delas upp och skickas med S3_MAX_CONCURRENCY delar samtidigt
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', '8'))
+# Skicka klienten vidare till en förhandssignerad URL i stället för att strömma filen genom Django
+S3_REDIRECT_DOWNLOADS = os.environ.get('S3_REDIRECT_DOWNLOADS', 'true').lower() == 'true'
+S3_PRESIGNED_EXPIRY = 300  # Sekunder
+
+# Hur filer levereras efter behörighetskontroll (files.delivery.serve_file):
+# 'django' strömmar från Django (sendfile via gunicorns wsgi.file_wrapper, under ASGI
+# asynkront från de asynkrona filvyerna via files.delivery.aserve_file),
+# 'nginx' skickar X-Accel-Redirect och 'xsendfile' skickar X-Sendfile till proxyn
+FILE_DELIVERY_BACKEND = os.environ.get('FILE_DELIVERY_BACKEND', 'django')
+# Intern nginx-location som motsvarar MEDIA_ROOT (används med 'nginx')
+FILE_DELIVERY_ACCEL_PREFIX = os.environ.get('FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+
+# Signerade media-URL:er (files.signing): giltighetstid i sekunder. Utgångstiden avrundas
+# uppåt till hela perioder, så att samma fil ger samma URL (och proxycache-träff) under en period.
+SIGNED_MEDIA_URL_TTL = int(os.environ.get('SIGNED_MEDIA_URL_TTL', '600'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -203,6 +300,28 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'range',
+    'if-range',
+    'tus-resumable',
+    'upload-length',
+    'upload-offset',
+    'upload-metadata',
+]
+
+# PDF.js behöver kunna läsa dessa headers vid Range-förfrågningar mellan olika ursprung
+CORS_EXPOSE_HEADERS = [
+    'accept-ranges',
+    'content-range',
+    'content-length',
+    'content-disposition',
+    'location',
+    'tus-resumable',
+    'tus-version',
+    'tus-extension',
+    'tus-max-size',
+    'upload-offset',
+    'upload-length',
+    'upload-expires',
 ]
 
 CORS_ALLOW_METHODS = [
@@ -2,17 +2,18 @@
 URL configuration for valvx_project project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, reverse
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import HttpResponse, JsonResponse, FileResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
-from django.views.static import serve as static_serve
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
 from core import custom_views
+from files.delivery import aserve_stored, serve_file, serve_stored
+from files.storage import blob_storage
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -34,6 +35,7 @@ urlpatterns = [
         path('wiki/', include('wiki.urls')),
         path('notifications/', include('notifications.urls')),
         path('workspace/', include('workspace.urls')),
+        path('jobs/', include('jobs.urls')),
     ])),
 ]
 
@@ -44,30 +46,26 @@ urlpatterns = [
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-# Lägg till en dedikerad view för att servera media-filer med korrekt CORS och headers
-from django.http import FileResponse
-def serve_media_file(request, path):
-    import os
-    from django.conf import settings
-    from django.http import HttpResponse, Http404, FileResponse
+# Lägg till en dedikerad view för att servera media-filer med korrekt CORS och headers.
+# Vyn är asynkron så att en nedladdning under ASGI inte håller en tråd (se files.delivery).
+async def serve_media_file(request, path):
+    import asyncio
     
     # Säkerhetsvalidering
     if '..' in path:
         raise Http404("Invalid path")
     
-    file_path = os.path.join(settings.MEDIA_ROOT, path)
-    if not os.path.exists(file_path):
+    if not await asyncio.to_thread(blob_storage.exists, path):
         raise Http404(f"File not found: {path}")
     
     # Detektera filtyp för att sätta Content-Type korrekt
     content_type = None
-    if file_path.lower().endswith('.pdf'):
+    if path.lower().endswith('.pdf'):
         content_type = 'application/pdf'
     
-    # Öppna och returnera filen
+    # Returnera filen ur lagringen med stöd för Range-förfrågningar
     try:
-        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
-        response['Content-Disposition'] = f'inline; filename="{os.path.basename(file_path)}"'
+        response = await aserve_stored(request, path, content_type=content_type)
         response['Access-Control-Allow-Origin'] = '*'
         
         # Viktigt: Ta bort headers som kan blockera visning i <iframe>
@@ -84,16 +82,13 @@ from django.views.decorators.csrf import csrf_exempt
 urlpatterns.append(path('direct/media/<path:path>', serve_media_file, name='direct_media_file'))
 
 # Funktioner för hantering av PDF-filer
-def direct_serve_pdf(request, file_path):
-    """Serverar en PDF-fil direkt med rätt Content-Type header och CORS-inställningar"""
-    import os
-    
+def direct_serve_pdf(request, name):
+    """Serverar en PDF-fil ur lagringen med rätt Content-Type header och CORS-inställningar"""
     try:
-        if not os.path.exists(file_path):
-            raise Http404(f"PDF-fil hittades inte: {file_path}")
+        if not blob_storage.exists(name):
+            raise Http404(f"PDF-fil hittades inte: {name}")
             
-        response = FileResponse(open(file_path, 'rb'), content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{os.path.basename(file_path)}"'
+        response = serve_stored(request, name, content_type='application/pdf')
         response['Access-Control-Allow-Origin'] = '*'
         
         # Ta bort headers som kan störa visning i iframe
@@ -109,67 +104,56 @@ def direct_serve_pdf(request, file_path):
 def pdf_file_finder(request):
     """Hittar PDF-filer baserat på delar av filnamnet med direkt streaming"""
     import os
-    import glob
-    
+    from files import file_index
+
     # Hämta sökparameter (filnamn eller del av filnamn)
     filename_part = request.GET.get('filename', '')
     if not filename_part or not filename_part.endswith('.pdf'):
         return JsonResponse({'error': 'Invalid or missing filename parameter'}, status=400)
-    
-    # Leta i alla viktiga PDF-kataloger 
-    media_root = settings.MEDIA_ROOT
-    project_files_dir = os.path.join(media_root, 'project_files')
-    
-    # Sök med glob för bättre prestanda
-    search_patterns = [
-        os.path.join(project_files_dir, '**', f'*{filename_part}*'),  # Sök i alla undermappar
-        os.path.join(media_root, '**', f'*{filename_part}*')          # Sök i hela media
-    ]
-    
-    # Samla alla matchande filer
+
+    # Slå upp i filindexet i stället för att söka igenom media-katalogen med glob.
+    # Relativa sökvägar är lagringsnamn och hålls aktuella av signalerna; absoluta
+    # kommer från FILE_INDEX_EXTRA_ROOTS och finns bara på den lokala disken.
     matching_files = []
-    for pattern in search_patterns:
-        for filepath in glob.glob(pattern, recursive=True):
-            if filepath.lower().endswith('.pdf'):
-                rel_path = os.path.relpath(filepath, media_root)
-                matching_files.append({
-                    'filename': os.path.basename(filepath),
-                    'path': rel_path,
-                    'url': f'/media/{rel_path}',
-                    'filepath': filepath
-                })
+    for filename, rel_path, filepath in file_index.search(filename_part, extension='.pdf'):
+        if os.path.isabs(rel_path):
+            if os.path.isfile(filepath):
+                matching_files.append({'filename': filename, 'path': rel_path, 'url': None, 'filepath': filepath})
+            continue
+        matching_files.append({
+            'filename': filename,
+            'path': rel_path,
+            'url': reverse('direct_media_file', kwargs={'path': rel_path}),
+            'filepath': filepath
+        })
     
     # Logga sökningen för debugging
     print(f"PDF-sökning: {filename_part}, hittade {len(matching_files)} filer")
     
     # Direkt streaming mode
     if request.GET.get('stream', 'false').lower() == 'true' and matching_files:
-        filepath = matching_files[0]['filepath']
-        return direct_serve_pdf(request, filepath)
+        match = matching_files[0]
+        if match['url'] is None:
+            return serve_file(request, match['filepath'], content_type='application/pdf')
+        return direct_serve_pdf(request, match['path'])
     
     return JsonResponse({'files': matching_files}, safe=False)
 
 # Explicit PDF-access funktion
 def serve_pdf_file(request, path):
-    import os
-    
-    # Leta i alla möjliga kataloger efter PDF-filen
-    possible_paths = []
-    
-    # Standardsökväg
-    media_root = settings.MEDIA_ROOT
-    project_files_dir = os.path.join(media_root, 'project_files')
-    standard_path = os.path.join(project_files_dir, path)
-    possible_paths.append(standard_path)
-    
-    # Alternativ sökväg direkt under media
-    alternative_path = os.path.join(media_root, path)
-    possible_paths.append(alternative_path)
+    # Leta efter PDF-filen under project_files och direkt i lagringens rot
+    if '..' in path:
+        raise Http404("Invalid path")
+    possible_paths = [f'project_files/{path}', path]
     
     # Prova alla sökvägar
-    for file_path in possible_paths:
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            return direct_serve_pdf(request, file_path)
+    for name in possible_paths:
+        if blob_storage.exists(name):
+            response = serve_stored(request, name, content_type='application/pdf')
+            response['Access-Control-Allow-Origin'] = '*'
+            if 'X-Frame-Options' in response:
+                del response['X-Frame-Options']
+            return response
     
     # Om vi når hit hittades ingen fil
     return JsonResponse({
@@ -184,10 +168,13 @@ urlpatterns.append(path('pdf-finder/', pdf_file_finder, name='pdf_finder'))
 # Direkt åtkomst till PDF via path
 urlpatterns.append(path('pdf/<path:path>', serve_pdf_file, name='pdf_path_direct'))
 
-# Backupfunktion med vanlig static serve som fallback
-from django.views.static import serve as static_serve
-urlpatterns.append(path('pdf-static/<path:path>', lambda request, path: static_serve(
-    request, 
-    path=f"project_files/{path}", 
-    document_root=settings.MEDIA_ROOT
-), name='pdf_static_direct'))
+# Backupfunktion som levererar filer under project_files ur lagringen
+def serve_static_pdf_file(request, path):
+    if '..' in path:
+        raise Http404("Invalid path")
+    name = f"project_files/{path}"
+    if not blob_storage.exists(name):
+        raise Http404(f"File not found: {path}")
+    return serve_stored(request, name)
+
+urlpatterns.append(path('pdf-static/<path:path>', serve_static_pdf_file, name='pdf_static_direct'))
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class WorkspaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'workspace'
\ No newline at end of file
+    name = 'workspace'
+
+    def ready(self):
+        """Import signals when the app is loaded"""
+        import workspace.signals
@@ -0,0 +1,23 @@
+# Generated manually for ValvX project
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0007_pdfdocument_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileversion',
+            name='sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated manually for ValvX project
+
+import files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_blob'),
+        ('workspace', '0008_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileversion',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=files.storage.ContentAddressedStorage(), upload_to='project_files/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='file',
+            field=models.FileField(storage=files.storage.ContentAddressedStorage(), upload_to='pdf_documents/%Y/%m/%d/'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated manually for ValvX project
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0009_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filenode',
+            index=models.Index(fields=['created_at', 'id'], name='workspace_node_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileversion',
+            index=models.Index(fields=['created_at', 'id'], name='workspace_version_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filecomment',
+            index=models.Index(fields=['created_at', 'id'], name='workspace_comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wikiarticle',
+            index=models.Index(fields=['created_at', 'id'], name='workspace_wiki_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['created_at', 'id'], name='workspace_pdf_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated manually for ValvX project
+
+import files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0014_file_storage_driver'),
+        ('workspace', '0010_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileversion',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=files.storage.get_blob_storage, upload_to='project_files/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='file',
+            field=models.FileField(storage=files.storage.get_blob_storage, upload_to='pdf_documents/%Y/%m/%d/'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from core.models import Project
+from files.storage import get_blob_storage
 import uuid
 
 class FileNode(models.Model):
@@ -22,6 +23,11 @@ class FileNode(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='workspace_node_created_idx'),
+        ]
+    
     def __str__(self):
         return self.name
     
@@ -43,15 +49,19 @@ class FileVersion(models.Model):
     Represents a specific version of a file
     """
     file_node = models.ForeignKey(FileNode, on_delete=models.CASCADE, related_name='versions')
-    file = models.FileField(upload_to='project_files/%Y/%m/%d/', null=True, blank=True)
+    file = models.FileField(upload_to='project_files/%Y/%m/%d/', storage=get_blob_storage, null=True, blank=True)
     version = models.PositiveIntegerField(default=1)
     content_type = models.CharField(max_length=100)
     size = models.BigIntegerField()  # Size in bytes
+    sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)  # Content hash, used as ETag
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_versions')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-version']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='workspace_version_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.file_node.name} (v{self.version})"
@@ -75,6 +85,11 @@ class FileComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='workspace_comment_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Comment on {self.file_node.name} by {self.created_by.username}"
 
@@ -95,6 +110,9 @@ class WikiArticle(models.Model):
     
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='workspace_wiki_created_idx'),
+        ]
         
     def __str__(self):
         return self.title
@@ -118,9 +136,10 @@ class PDFDocument(models.Model):
     unique_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
-    file = models.FileField(upload_to='pdf_documents/%Y/%m/%d/')
+    file = models.FileField(upload_to='pdf_documents/%Y/%m/%d/', storage=get_blob_storage)
     content_type = models.CharField(max_length=100, default='application/pdf')
     size = models.BigIntegerField()  # Size in bytes
+    sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)  # Content hash, used as ETag
     version = models.PositiveIntegerField(default=1)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='pdf_documents')
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploaded_pdfs')
@@ -129,6 +148,9 @@ class PDFDocument(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='workspace_pdf_created_idx'),
+        ]
         
     def __str__(self):
         return self.title
@@ -20,8 +20,8 @@ class FileVersionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = FileVersion
-        fields = ['id', 'file_node', 'file', 'version', 'content_type', 'size', 'created_by', 'created_by_details', 'created_at']
-        read_only_fields = ['id', 'version', 'content_type', 'size', 'created_at']
+        fields = ['id', 'file_node', 'file', 'version', 'content_type', 'size', 'sha256', 'created_by', 'created_by_details', 'created_at']
+        read_only_fields = ['id', 'version', 'content_type', 'size', 'sha256', 'created_at']
     
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
@@ -75,10 +75,10 @@ class PDFDocumentSerializer(serializers.ModelSerializer):
         model = PDFDocument
         fields = [
             'id', 'unique_id', 'title', 'description', 'file', 'file_url', 'content_type', 
-            'size', 'version', 'project', 'uploaded_by', 'uploaded_by_details',
+            'size', 'sha256', 'version', 'project', 'uploaded_by', 'uploaded_by_details',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'unique_id', 'file_url', 'uploaded_by', 'content_type', 'size', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'unique_id', 'file_url', 'uploaded_by', 'content_type', 'size', 'sha256', 'created_at', 'updated_at']
     
     def create(self, validated_data):
         validated_data['uploaded_by'] = self.context['request'].user
@@ -0,0 +1,104 @@
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from files import file_index, linearize, renditions, search
+from files.hashing import set_upload_hash
+from files.storage import is_blob_name, remember_blob, sync_blob_reference, release_blob_reference
+from files.models import FileIndexEntry, SearchEntry
+from .models import FileVersion, PDFDocument
+
+INDEX_SOURCES = {
+    FileVersion: FileIndexEntry.SOURCE_FILE_VERSION,
+    PDFDocument: FileIndexEntry.SOURCE_PDF_DOCUMENT,
+}
+
+
+@receiver(pre_save, sender=FileVersion)
+@receiver(pre_save, sender=PDFDocument)
+def hash_uploaded_file(sender, instance, **kwargs):
+    """
+    Compute sha256 from the upload before the file is written to storage
+    """
+    set_upload_hash(instance)
+
+
+@receiver(post_save, sender=FileVersion)
+@receiver(post_save, sender=PDFDocument)
+def index_saved_file(sender, instance, **kwargs):
+    """
+    Keep the file index up to date when a version or PDF document is saved
+    """
+    if instance.file:
+        if sender is FileVersion:
+            display_name = instance.file_node.name
+        else:
+            display_name = instance.title
+        file_index.index_path(instance.file.name, INDEX_SOURCES[sender], display_name=display_name)
+
+
+@receiver(post_delete, sender=FileVersion)
+@receiver(post_delete, sender=PDFDocument)
+def unindex_deleted_file(sender, instance, **kwargs):
+    """
+    Remove deleted versions and PDF documents from the file index.
+    Shared blobs are unindexed when they are garbage-collected instead.
+    """
+    if instance.file and not is_blob_name(instance.file.name):
+        file_index.remove_path(instance.file.name)
+
+
+@receiver(post_init, sender=FileVersion)
+@receiver(post_init, sender=PDFDocument)
+def remember_loaded_blob(sender, instance, **kwargs):
+    remember_blob(instance)
+
+
+@receiver(post_save, sender=FileVersion)
+@receiver(post_save, sender=PDFDocument)
+def reference_saved_blob(sender, instance, **kwargs):
+    """
+    Count references to files in the content-addressed storage
+    """
+    sync_blob_reference(instance)
+
+
+@receiver(post_delete, sender=FileVersion)
+@receiver(post_delete, sender=PDFDocument)
+def release_deleted_blob(sender, instance, **kwargs):
+    """
+    Release the reference and delete the blob if it was the last one
+    """
+    release_blob_reference(instance)
+
+
+@receiver(post_save, sender=FileVersion)
+@receiver(post_save, sender=PDFDocument)
+def index_file_text(sender, instance, **kwargs):
+    """
+    Update the search index for PDF document titles and descriptions
+    and extract the PDF text of new uploads
+    """
+    if sender is PDFDocument:
+        search.index_object(SearchEntry.KIND_PDF_DOCUMENT, instance.id, instance.title, instance.description)
+    search.schedule_extraction(instance)
+
+
+@receiver(post_save, sender=PDFDocument)
+def generate_file_renditions(sender, instance, **kwargs):
+    """
+    Render page thumbnails after upload
+    """
+    renditions.schedule_generation(instance)
+
+
+@receiver(post_save, sender=FileVersion)
+@receiver(post_save, sender=PDFDocument)
+def linearize_uploaded_file(sender, instance, **kwargs):
+    """
+    Write a linearized copy so viewers can show the first page sooner
+    """
+    linearize.schedule_linearization(instance)
+
+
+@receiver(post_delete, sender=PDFDocument)
+def unindex_file_text(sender, instance, **kwargs):
+    search.remove_object(SearchEntry.KIND_PDF_DOCUMENT, instance.id)
@@ -5,7 +5,14 @@ from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.utils.decorators import method_decorator
+from core.membership import memberships
 from core.models import Project, RoleAccess
+from core.pagination import CreatedAtCursorPagination
+from files import linearize, signing
+from files.delivery import serve_file, serve_stored, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from files.hashing import etag_for
+from files.models import SearchEntry
+from files.search_api import FullTextSearchFilter
 from .models import FileNode, FileVersion, FileComment, WikiArticle, ProjectDashboard, PDFDocument
 from .serializers import (
     FileNodeSerializer, FileVersionSerializer, FileCommentSerializer,
@@ -16,6 +23,7 @@ from .serializers import (
 class HasProjectPermission(permissions.BasePermission):
     """
     Custom permission to check if user has access to the project.
+    Memberships are cached (see core.membership), so checking many objects costs no queries.
     """
     def has_permission(self, request, view):
         # Allow read access to authenticated users for list views
@@ -27,44 +35,93 @@ class HasProjectPermission(permissions.BasePermission):
         if request.method == 'POST' and request.user.is_authenticated:
             project_id = request.data.get('project')
             if project_id:
-                return RoleAccess.objects.filter(
-                    user=request.user,
-                    project_id=project_id
-                ).exists()
+                return memberships(request).has(project_id)
             
         return False
 
     def has_object_permission(self, request, view, obj):
-        # Get the project from the object
-        if hasattr(obj, 'project'):
-            project = obj.project
+        # Get the project id from the object without loading the project
+        if hasattr(obj, 'project_id'):
+            project_id = obj.project_id
         elif hasattr(obj, 'file_node'):
-            project = obj.file_node.project
+            project_id = obj.file_node.project_id
         else:
             return False
         
         # Check if user has role access to this project
-        return RoleAccess.objects.filter(
-            user=request.user,
-            project=project
-        ).exists()
+        return memberships(request).has(project_id)
 
 # API Views
+def viewing_response(request, field_file, sha256, etag, **options):
+    """
+    Serve a stored file for viewing: the node-local linearized copy when one
+    exists (unless ?download=1), otherwise the original from file storage.
+    """
+    path = None
+    if not request.query_params.get('download'):
+        path, etag = linearize.viewing_file(sha256, None)
+    if path:
+        return serve_file(request, path, etag=etag, **options)
+    return serve_stored(request, field_file.name, storage=field_file.storage, etag=etag, **options)
+
+def version_content_response(request, version, cache_control):
+    """
+    Stream a file version with content-hash ETag and the given cache policy.
+    PDFs are served from their linearized copy when one exists, unless ?download=1.
+    """
+    if not version.file or not version.file.storage.exists(version.file.name):
+        return Response({"error": "File not found"}, status=404)
+    
+    etag = etag_for(version)
+    response = viewing_response(
+        request, version.file, version.sha256, etag,
+        content_type=version.content_type or None,
+        filename=version.file_node.name,
+        last_modified=version.created_at.timestamp()
+    )
+    # Redirects to presigned storage URLs keep their own no-store policy
+    response.setdefault('Cache-Control', cache_control)
+    return response
+
 class FileNodeViewSet(viewsets.ModelViewSet):
     """
     API endpoint for file nodes (files and folders)
     """
     serializer_class = FileNodeSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, HasProjectPermission]
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
     
     def get_queryset(self):
-        user = self.request.user
         # Get all projects that the user has access to
-        project_ids = RoleAccess.objects.filter(user=user).values_list('project_id', flat=True)
+        project_ids = memberships(self.request).project_ids
         # Return all file nodes from these projects
-        return FileNode.objects.filter(project_id__in=project_ids)
+        return FileNode.objects.filter(project_id__in=project_ids).select_related('created_by')
+    
+    @action(detail=True, methods=['get'])
+    def content(self, request, pk=None):
+        """
+        Serve the latest version of a file node.
+        This is a "latest" alias, so clients must revalidate with ETag/Last-Modified.
+        """
+        node = self.get_object()
+        version = node.versions.exclude(file='').exclude(file__isnull=True).first()
+        if version is None:
+            return Response({"error": "File has no versions"}, status=404)
+        return version_content_response(request, version, REVALIDATE_CACHE_CONTROL)
+    
+    @action(detail=True, methods=['get'], url_path='signed-url')
+    def signed_url(self, request, pk=None):
+        """
+        Short-lived signed URL for the latest version's content (see files.signing).
+        The URL is tied to that version, so it keeps serving it after a new upload.
+        """
+        node = self.get_object()
+        version = node.versions.exclude(file='').exclude(file__isnull=True).first()
+        if version is None:
+            return Response({"error": "File has no versions"}, status=404)
+        return Response(signing.signed_url_data(request, version.file.name, node.name))
     
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -82,22 +139,39 @@ class FileNodeViewSet(viewsets.ModelViewSet):
             else:
                 queryset = queryset.filter(parent_id=parent_id)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class FileVersionViewSet(viewsets.ModelViewSet):
     """
     API endpoint for file versions
     """
     serializer_class = FileVersionSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, HasProjectPermission]
     
     def get_queryset(self):
-        user = self.request.user
         # Get all projects that the user has access to
-        project_ids = RoleAccess.objects.filter(user=user).values_list('project_id', flat=True)
+        project_ids = memberships(self.request).project_ids
         # Return all file versions from file nodes in these projects
-        return FileVersion.objects.filter(file_node__project_id__in=project_ids)
+        return FileVersion.objects.filter(file_node__project_id__in=project_ids).select_related('created_by')
+    
+    @action(detail=True, methods=['get'])
+    def content(self, request, pk=None):
+        """
+        Serve the content of a specific version.
+        A version never changes once uploaded, so it is cached as immutable.
+        """
+        return version_content_response(request, self.get_object(), IMMUTABLE_CACHE_CONTROL)
+    
+    @action(detail=True, methods=['get'], url_path='signed-url')
+    def signed_url(self, request, pk=None):
+        """Short-lived signed URL for this version's content (see files.signing)"""
+        version = self.get_object()
+        if not version.file:
+            return Response({"error": "File not found"}, status=404)
+        return Response(signing.signed_url_data(request, version.file.name, version.file_node.name))
     
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -107,22 +181,23 @@ class FileVersionViewSet(viewsets.ModelViewSet):
         if file_node_id:
             queryset = queryset.filter(file_node_id=file_node_id)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class FileCommentViewSet(viewsets.ModelViewSet):
     """
     API endpoint for file comments
     """
     serializer_class = FileCommentSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, HasProjectPermission]
     
     def get_queryset(self):
-        user = self.request.user
         # Get all projects that the user has access to
-        project_ids = RoleAccess.objects.filter(user=user).values_list('project_id', flat=True)
+        project_ids = memberships(self.request).project_ids
         # Return all comments from file nodes in these projects
-        return FileComment.objects.filter(file_node__project_id__in=project_ids)
+        return FileComment.objects.filter(file_node__project_id__in=project_ids).select_related('created_by')
     
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -132,22 +207,23 @@ class FileCommentViewSet(viewsets.ModelViewSet):
         if file_node_id:
             queryset = queryset.filter(file_node_id=file_node_id)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class WikiArticleViewSet(viewsets.ModelViewSet):
     """
     API endpoint for wiki articles
     """
     serializer_class = WikiArticleSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, HasProjectPermission]
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'content']
     
     def get_queryset(self):
-        user = self.request.user
         # Get all projects that the user has access to
-        project_ids = RoleAccess.objects.filter(user=user).values_list('project_id', flat=True)
+        project_ids = memberships(self.request).project_ids
         # By default, return only published articles that are not archived
         queryset = WikiArticle.objects.filter(
             project_id__in=project_ids,
@@ -157,10 +233,7 @@ class WikiArticleViewSet(viewsets.ModelViewSet):
         
         # Admin users can see all articles including unpublished and archived
         if self.request.query_params.get('show_all', 'false').lower() == 'true':
-            role_in_projects = RoleAccess.objects.filter(
-                user=user, 
-                role__in=[RoleAccess.PROJECT_LEADER, RoleAccess.MEMBER]
-            ).values_list('project_id', flat=True)
+            role_in_projects = memberships(self.request).with_roles(RoleAccess.PROJECT_LEADER, RoleAccess.MEMBER)
             
             # For projects where the user is a leader or member, show all articles
             # For others, show only published non-archived
@@ -169,7 +242,7 @@ class WikiArticleViewSet(viewsets.ModelViewSet):
                 Q(project_id__in=project_ids, is_published=True, is_archived=False)
             ).distinct()
             
-        return queryset
+        return queryset.select_related('created_by')
     
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -192,20 +265,21 @@ class WikiArticleViewSet(viewsets.ModelViewSet):
         if is_index and is_index.lower() == 'true':
             queryset = queryset.filter(is_index=True)
             
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 class ProjectDashboardViewSet(viewsets.ModelViewSet):
     """
     API endpoint for project dashboards
     """
     serializer_class = ProjectDashboardSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, HasProjectPermission]
     
     def get_queryset(self):
-        user = self.request.user
         # Get all projects that the user has access to
-        project_ids = RoleAccess.objects.filter(user=user).values_list('project_id', flat=True)
+        project_ids = memberships(self.request).project_ids
         # Return dashboards for these projects
         return ProjectDashboard.objects.filter(project_id__in=project_ids)
     
@@ -217,8 +291,9 @@ class ProjectDashboardViewSet(viewsets.ModelViewSet):
         if project_id:
             queryset = queryset.filter(project_id=project_id)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def for_project(self, request):
@@ -230,7 +305,7 @@ class ProjectDashboardViewSet(viewsets.ModelViewSet):
             return Response({"error": "Project ID is required"}, status=status.HTTP_400_BAD_REQUEST)
             
         # Check if user has access to the project
-        if not RoleAccess.objects.filter(user=request.user, project_id=project_id).exists():
+        if not memberships(request).has(project_id):
             return Response({"error": "You don't have access to this project"}, status=status.HTTP_403_FORBIDDEN)
             
         # Get or create dashboard
@@ -248,27 +323,29 @@ class PDFDocumentViewSet(viewsets.ModelViewSet):
     API endpoint for PDF documents
     """
     serializer_class = PDFDocumentSerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [permissions.IsAuthenticated, HasProjectPermission]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['title', 'description']
+    full_text_search = {SearchEntry.KIND_PDF_DOCUMENT: 'id', SearchEntry.KIND_PAGE: 'sha256'}  # Title, description and PDF text
     
     def get_queryset(self):
-        user = self.request.user
         # Get all projects that the user has access to
-        project_ids = RoleAccess.objects.filter(user=user).values_list('project_id', flat=True)
+        project_ids = memberships(self.request).project_ids
         # Return all PDFs from these projects
-        return PDFDocument.objects.filter(project_id__in=project_ids)
+        return PDFDocument.objects.filter(project_id__in=project_ids).select_related('uploaded_by')
     
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
         
         # Filter by project if specified
         project_id = self.request.query_params.get('project', None)
         if project_id:
             queryset = queryset.filter(project_id=project_id)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
         
     @action(detail=True, methods=['get'])
     @method_decorator(xframe_options_exempt)
@@ -278,6 +355,8 @@ class PDFDocumentViewSet(viewsets.ModelViewSet):
         
         Supports both session-based authentication and token-based authentication
         via a 'token' query parameter for direct access from PDF.js or iframe.
+        The token is checked against the database on every range request, so
+        viewers should prefer the URL from signed-url, which is not.
         """
         # Om token finns i query params, validera och autentisera användaren
         token = request.query_params.get('token')
@@ -313,35 +392,43 @@ class PDFDocumentViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": f"Kunde inte hämta PDF: {str(e)}"}, status=404)
             
-        from django.http import FileResponse
-        import os
-        
         # Lägg till extra säkerhet på filhantering
-        if not os.path.exists(pdf.file.path):
+        if not pdf.file or not pdf.file.storage.exists(pdf.file.name):
             return Response({"error": "File not found"}, status=404)
         
-        # Använd FileResponse för att hantera filer effektivt
-        response = FileResponse(
-            open(pdf.file.path, 'rb'),
+        # Stream the file with Range support so PDF.js can fetch it in chunks,
+        # from the linearized copy when there is one (?download=1 gives the original).
+        # The document's file can be replaced, so clients revalidate via ETag.
+        etag = etag_for(pdf)
+        response = viewing_response(
+            request, pdf.file, pdf.sha256, etag,
             content_type='application/pdf',
-            as_attachment=False
+            filename=f"{pdf.title}.pdf",
+            last_modified=pdf.updated_at.timestamp()
         )
+        response.setdefault('Cache-Control', REVALIDATE_CACHE_CONTROL)
         
         # Radera X-Frame-Options header helt för att tillåta embedding
         response.headers.pop('X-Frame-Options', None)
         
-        # Lägg till Content-Disposition header för att säkerställa inline-visning
-        response['Content-Disposition'] = f'inline; filename="{pdf.title}.pdf"'
         
         # Sätt CORS-headers för att tillåta åtkomst från frontend
         response['Access-Control-Allow-Origin'] = '*'
-        response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
+        response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Range, If-Range'
         
         # Tillåt embedding i iframe från alla domäner
         response['Content-Security-Policy'] = 'frame-ancestors *'
         
-        # Hjälp webbläsare att tolka innehållet korrekt
-        response['Content-Type'] = 'application/pdf'
-        
-        return response
\ No newline at end of file
+        return response
+    
+    @action(detail=True, methods=['get'], url_path='signed-url')
+    def signed_url(self, request, pk=None):
+        """
+        Short-lived signed URL for the document's current content (see files.signing).
+        Range requests against it are served without authentication or database access.
+        """
+        pdf = self.get_object()
+        if not pdf.file:
+            return Response({"error": "File not found"}, status=404)
+        return Response(signing.signed_url_data(request, pdf.file.name, f"{pdf.title}.pdf"))
\ No newline at end of file
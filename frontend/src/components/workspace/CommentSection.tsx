@@ -13,6 +13,7 @@ import {
 } from '@mui/joy';
 import SendIcon from '@mui/icons-material/Send';
 import axios from 'axios';
+import { fetchAllPages } from '../../utils/pagination';
 import { format } from 'date-fns';
 
 interface FileVersion {
@@ -57,12 +58,9 @@ const CommentSection: React.FC<CommentSectionProps> = ({ fileVersion }) => {
       
       setLoading(true);
       try {
-        const response = await axios.get('/api/workspace/comments/', {
-          params: {
-            file_version: fileVersion.id
-          }
-        });
-        setComments(response.data);
+        setComments(await fetchAllPages('/api/workspace/comments/', {
+          file_version: fileVersion.id
+        }));
         setError(null);
       } catch (err) {
         console.error('Error fetching comments:', err);
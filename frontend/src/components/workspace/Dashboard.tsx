@@ -95,30 +95,30 @@ const Dashboard: React.FC<DashboardProps> = ({ projectId }) => {
           params: {
             project: projectId,
             ordering: '-updated_at',
-            limit: 5
+            page_size: 5
           }
         });
-        setRecentFiles(filesResponse.data.slice(0, 5));
+        setRecentFiles(filesResponse.data.results.slice(0, 5));
         
         // Get recent wiki articles (top 5)
         const wikiResponse = await axios.get('/api/workspace/wiki/', {
           params: {
             project: projectId,
             ordering: '-updated_at',
-            limit: 5
+            page_size: 5
           }
         });
-        setRecentWiki(wikiResponse.data.slice(0, 5));
+        setRecentWiki(wikiResponse.data.results.slice(0, 5));
         
         // Get recent PDFs (top 5)
         const pdfResponse = await axios.get('/api/workspace/pdf/', {
           params: {
             project: projectId,
             ordering: '-updated_at',
-            limit: 5
+            page_size: 5
           }
         });
-        setRecentPdfs(pdfResponse.data.slice(0, 5));
+        setRecentPdfs(pdfResponse.data.results.slice(0, 5));
         
         // For activities, in a real app we would fetch from an activity log
         // Here we'll create some sample activities based on the actual data
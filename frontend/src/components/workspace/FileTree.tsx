@@ -27,6 +27,7 @@ import MoreVertIcon from '@mui/icons-material/MoreVert';
 import CreateNewFolderIcon from '@mui/icons-material/CreateNewFolder';
 import UploadFileIcon from '@mui/icons-material/UploadFile';
 import axios from 'axios';
+import { fetchAllPages } from '../../utils/pagination';
 import { format } from 'date-fns';
 
 interface FileNode {
@@ -70,12 +71,10 @@ const FileTree: React.FC<FileTreeProps> = ({ projectId, onNodeSelect }) => {
     const fetchFiles = async () => {
       setLoading(true);
       try {
-        const response = await axios.get('/api/workspace/files/', {
-          params: { project: projectId }
-        });
+        const nodes = await fetchAllPages('/api/workspace/files/', { project: projectId });
         
         // Convert flat list to tree structure
-        const tree = buildFileTree(response.data);
+        const tree = buildFileTree(nodes);
         setNodes(tree);
         setError(null);
       } catch (err) {
@@ -187,11 +186,9 @@ const FileTree: React.FC<FileTreeProps> = ({ projectId, onNodeSelect }) => {
       });
       
       // Add new folder to tree
-      const updatedResponse = await axios.get('/api/workspace/files/', {
-        params: { project: projectId }
-      });
+      const updatedNodes = await fetchAllPages('/api/workspace/files/', { project: projectId });
       
-      const tree = buildFileTree(updatedResponse.data);
+      const tree = buildFileTree(updatedNodes);
       setNodes(tree);
       
       // Expand parent folder
@@ -240,11 +237,9 @@ const FileTree: React.FC<FileTreeProps> = ({ projectId, onNodeSelect }) => {
       });
       
       // Refresh tree
-      const response = await axios.get('/api/workspace/files/', {
-        params: { project: projectId }
-      });
+      const updatedNodes = await fetchAllPages('/api/workspace/files/', { project: projectId });
       
-      const tree = buildFileTree(response.data);
+      const tree = buildFileTree(updatedNodes);
       setNodes(tree);
       
       // Expand parent folder
@@ -277,11 +272,9 @@ const FileTree: React.FC<FileTreeProps> = ({ projectId, onNodeSelect }) => {
       await axios.delete(`/api/workspace/files/${selectedNode.id}/`);
       
       // Refresh tree
-      const response = await axios.get('/api/workspace/files/', {
-        params: { project: projectId }
-      });
+      const updatedNodes = await fetchAllPages('/api/workspace/files/', { project: projectId });
       
-      const tree = buildFileTree(response.data);
+      const tree = buildFileTree(updatedNodes);
       setNodes(tree);
       
       handleCloseMenu();
@@ -25,6 +25,7 @@ import AddIcon from '@mui/icons-material/Add';
 import CancelIcon from '@mui/icons-material/Cancel';
 import ArticleIcon from '@mui/icons-material/Article';
 import axios from 'axios';
+import { fetchAllPages } from '../../utils/pagination';
 import { format } from 'date-fns';
 import { useParams, useNavigate } from 'react-router-dom';
 
@@ -67,10 +68,7 @@ const WikiView: React.FC<WikiViewProps> = ({ projectId }) => {
     const fetchArticles = async () => {
       setLoading(true);
       try {
-        const response = await axios.get('/api/workspace/wiki/', {
-          params: { project: projectId }
-        });
-        setArticles(response.data);
+        setArticles(await fetchAllPages('/api/workspace/wiki/', { project: projectId }));
         setError(null);
       } catch (err) {
         console.error('Error fetching wiki articles:', err);
@@ -23,9 +23,9 @@ const Dashboard: React.FC = () => {
   useEffect(() => {
     const fetchProjects = async () => {
       try {
-        // Fetch from our sample endpoint
-        const response = await api.get('/project-sample/');
-        setProjects(response.data);
+        // First page of the user's projects with task and file counts
+        const response = await api.get('/project-summary/');
+        setProjects(response.data.results);
         setLoading(false);
       } catch (err) {
         console.error('Failed to fetch projects:', err);
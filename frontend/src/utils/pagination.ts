@@ -0,0 +1,25 @@
+import axios from 'axios';
+
+// Svar från en cursor-paginerad lista i backend
+interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+// Hämta alla sidor från en cursor-paginerad lista genom att följa `next`
+export async function fetchAllPages<T = any>(url: string, params: Record<string, any> = {}): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: string | null = null;
+
+  do {
+    const response = await axios.get<CursorPage<T>>(url, {
+      params: cursor ? { ...params, cursor } : params
+    });
+    items.push(...response.data.results);
+    // Bara cursorn tas från next, så att anropet går via samma proxy/host
+    cursor = response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null;
+  } while (cursor);
+
+  return items;
+}